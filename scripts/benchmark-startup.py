@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark du démarrage de la webapp
+Mesure le temps d'import de app.py (démarrage d'un worker) pour chaque mode
+DB_STARTUP_MODE, puis le délai de connexion des services en mode 'background'
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+WEBAPP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'webapp')
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+ready = app.db_manager.wait_until_ready(timeout={ready_timeout}) if app.DB_STARTUP_MODE == 'background' else None
+print('@@' + json.dumps({{
+    'import_seconds': imported,
+    'ready_seconds': time.perf_counter() - started if ready else None,
+    'startup': app.db_manager.startup_stats()
+}}))
+"""
+
+
+def measure(mode, runs, ready_timeout):
+    """Lance 'runs' processus neufs et retourne les mesures de chacun"""
+    env = dict(os.environ, DB_STARTUP_MODE=mode)
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(ready_timeout=ready_timeout)],
+            cwd=WEBAPP_DIR, env=env, capture_output=True, text=True
+        ).stdout
+        lines = [line for line in output.splitlines() if line.startswith('@@')]
+        if lines:
+            results.append(json.loads(lines[-1][2:]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage de LogStream Studio")
+    parser.add_argument('--runs', type=int, default=5, help="Nombre de démarrages par mode")
+    parser.add_argument('--modes', default='sync,lazy,background', help="Modes DB_STARTUP_MODE à comparer")
+    parser.add_argument('--ready-timeout', type=float, default=10, help="Attente maximale des services (background)")
+    args = parser.parse_args()
+
+    print("⏱️  Benchmark du démarrage (import de app.py)\n")
+    for mode in args.modes.split(','):
+        results = measure(mode, args.runs, args.ready_timeout)
+        if not results:
+            print(f"   {mode:<11} ❌ échec de l'import")
+            continue
+        imports = [r['import_seconds'] for r in results]
+        line = (f"   {mode:<11} import médian {statistics.median(imports) * 1000:>8.1f} ms"
+                f"   max {max(imports) * 1000:>8.1f} ms")
+        ready = [r['ready_seconds'] for r in results if r['ready_seconds'] is not None]
+        if ready:
+            line += f"   services prêts {statistics.median(ready) * 1000:>8.1f} ms"
+        print(line)
+        if mode == 'background':
+            for service, status in results[-1]['startup']['services'].items():
+                state = f"{status['ready_after_seconds']} s" if status['connected'] else 'non connecté'
+                print(f"      {service:<14} {state}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test de charge de l'API LogStream Studio
+Mesure le débit (requêtes/s) et les latences de /api/search et /api/stats, pour comparer
+plusieurs serveurs (ex. serveur de développement Flask vs gunicorn)
+
+Exemple :
+    python3 scripts/load-test.py --target flask=http://localhost:5000 --target gunicorn=http://localhost:8000
+
+Désactiver la limitation de débit sur le serveur testé (RATE_LIMIT_ENABLED=0),
+sinon une partie des requêtes /api/search sera refusée (429).
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ENDPOINTS = {
+    'search': ('/api/search', {'query': 'error', 'page': 1}),
+    'stats': ('/api/stats', None),
+}
+
+
+def login(base_url, username, password):
+    """Récupère un token JWT"""
+    response = requests.post(f'{base_url}/api/login', json={'username': username, 'password': password}, timeout=10)
+    response.raise_for_status()
+    return response.json()['token']
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def run_load(base_url, token, endpoint, concurrency, duration):
+    """
+    'concurrency' clients enchaînent les requêtes pendant 'duration' secondes
+
+    Returns:
+        dict: requests, errors, limited, rps, p50/p95/p99 (ms)
+    """
+    path, params = ENDPOINTS[endpoint]
+    latencies = []
+    counters = {'errors': 0, 'limited': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        session.headers['Authorization'] = f'Bearer {token}'
+        local = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = session.get(f'{base_url}{path}', params=params, timeout=30).status_code
+            except requests.RequestException:
+                status = None
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                if status == 200:
+                    local.append(elapsed)
+                elif status == 429:
+                    counters['limited'] += 1
+                else:
+                    counters['errors'] += 1
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': counters['errors'],
+        'limited': counters['limited'],
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50': round(statistics.median(latencies), 1) if latencies else 0.0,
+        'p95': round(percentile(latencies, 95), 1),
+        'p99': round(percentile(latencies, 99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de /api/search et /api/stats")
+    parser.add_argument('--target', action='append', required=True,
+                        help="nom=url du serveur testé (répétable pour comparer)")
+    parser.add_argument('--endpoints', default='search,stats', help="Endpoints testés (search, stats)")
+    parser.add_argument('--concurrency', type=int, default=32, help="Nombre de clients simultanés")
+    parser.add_argument('--duration', type=float, default=20, help="Durée de chaque mesure (secondes)")
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    args = parser.parse_args()
+
+    print(f"🚀 Test de charge : {args.concurrency} clients, {args.duration:.0f}s par mesure\n")
+    print(f"   {'serveur':<12} {'endpoint':<8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'erreurs':>8} {'429':>6}")
+    for target in args.target:
+        name, _, base_url = target.partition('=')
+        base_url = base_url.rstrip('/')
+        try:
+            token = login(base_url, args.username, args.password)
+        except requests.RequestException as e:
+            print(f"   {name:<12} ❌ connexion impossible: {e}")
+            continue
+        for endpoint in args.endpoints.split(','):
+            result = run_load(base_url, token, endpoint, args.concurrency, args.duration)
+            print(f"   {name:<12} {endpoint:<8} {result['rps']:>8} {result['p50']:>8} {result['p95']:>8} "
+                  f"{result['p99']:>8} {result['errors']:>8} {result['limited']:>6}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
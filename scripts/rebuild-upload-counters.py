@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Reconstruit les compteurs matérialisés des uploads (document 'upload_summary')
+à partir de la collection des uploads, puis affiche l'écart avec les anciens compteurs
+"""
+
+import argparse
+import os
+import sys
+
+import pymongo
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'webapp'))
+
+from upload_counters import UploadCounters, SUMMARY_COLLECTION  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruction des compteurs d'uploads")
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--db', default=os.environ.get('MONGO_DB', 'monitoring'))
+    parser.add_argument('--collection', default=os.environ.get('MONGO_COLLECTION', 'uploads'))
+    args = parser.parse_args()
+
+    db = pymongo.MongoClient(args.mongo_uri, serverSelectionTimeoutMS=5000)[args.db]
+    counters = UploadCounters(lambda: db[args.collection], lambda: db[SUMMARY_COLLECTION])
+
+    before = counters.get_summary()
+    after = counters.reconcile()
+    if after is None:
+        print("❌ Reconstruction impossible (MongoDB indisponible ?)")
+        return 1
+
+    print(f"✅ Compteurs reconstruits depuis '{args.db}.{args.collection}'\n")
+    for key in ('total_uploads', 'success_uploads', 'error_uploads'):
+        previous = before[key] if before else '-'
+        print(f"   {key:<16} {after[key]:>10}   (avant : {previous})")
+    print("\n   Par statut :")
+    for status, count in sorted(after['statuses'].items()):
+        print(f"      {status:<22} {count:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Installe le cycle de vie des index de logs dans Elasticsearch :
+politiques ILM, component templates, index templates composables et data streams
+
+- logs-saas-json / logs-saas-csv : data streams avec rollover (taille / âge), puis
+  force-merge et suppression (politique logs-rollover)
+- logs-ecommerce-YYYY.MM.dd : index journaliers conservés (nommage utilisé par la
+  sélection des index par date), force-merge et suppression (politique logs-daily)
+
+Les fichiers JSON sont lus dans elasticsearch/ (ilm/, component-templates/, index-templates/)
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import requests
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'elasticsearch')
+
+# Ancien template unique (elasticsearch/logs-saas-template.json), remplacé par les templates composables
+LEGACY_TEMPLATES = ['logs-saas-template']
+
+DAILY_PATTERN = 'logs-ecommerce-*'
+DAILY_POLICY = 'logs-daily'
+
+
+def load_dir(name):
+    """Fichiers JSON d'un sous-dossier : {nom sans extension: contenu}"""
+    folder = os.path.join(CONFIG_DIR, name)
+    items = {}
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith('.json'):
+            with open(os.path.join(folder, filename), encoding='utf-8') as f:
+                items[filename[:-5]] = json.load(f)
+    return items
+
+
+def apply_overrides(policies, args):
+    """Applique les durées / tailles passées en ligne de commande aux politiques ILM"""
+    for policy in policies.values():
+        phases = policy['policy']['phases']
+        rollover = phases.get('hot', {}).get('actions', {}).get('rollover')
+        if rollover is not None:
+            if args.rollover_size:
+                rollover['max_primary_shard_size'] = args.rollover_size
+            if args.rollover_age:
+                rollover['max_age'] = args.rollover_age
+        if args.warm_after and 'warm' in phases:
+            phases['warm']['min_age'] = args.warm_after
+        if args.retention and 'delete' in phases:
+            phases['delete']['min_age'] = args.retention
+    return policies
+
+
+class LifecycleSetup:
+    """Appels à l'API Elasticsearch (aucune écriture en mode --dry-run)"""
+
+    def __init__(self, es_url, dry_run=False):
+        self.es_url = es_url.rstrip('/')
+        self.dry_run = dry_run
+        self.errors = 0
+
+    def get(self, path):
+        response = requests.get(f"{self.es_url}/{path}", timeout=30)
+        return response.json() if response.status_code == 200 else None
+
+    def write(self, method, path, body=None, label=None):
+        """PUT/POST/DELETE ; retourne True si la requête a abouti (ou serait envoyée en dry-run)"""
+        label = label or f"{method} /{path}"
+        if self.dry_run:
+            print(f"   🔸 [dry-run] {label}")
+            return True
+        response = requests.request(method, f"{self.es_url}/{path}", json=body, timeout=120)
+        if response.status_code in (200, 201):
+            print(f"   ✅ {label}")
+            return True
+        self.errors += 1
+        print(f"   ❌ {label} : HTTP {response.status_code} {response.text[:300]}")
+        return False
+
+    # ------------------------------------------
+    #  Politiques et templates
+    # ------------------------------------------
+
+    def install(self, policies, components, templates):
+        print("\n📜 Politiques ILM")
+        for name, body in policies.items():
+            self.write('PUT', f"_ilm/policy/{name}", body, f"politique {name}")
+
+        print("\n🧩 Component templates")
+        for name, body in components.items():
+            self.write('PUT', f"_component_template/{name}", body, f"component template {name}")
+
+        print("\n📐 Index templates")
+        for name, body in templates.items():
+            self.write('PUT', f"_index_template/{name}", body,
+                       f"index template {name} ({', '.join(body['index_patterns'])})")
+
+        for name in LEGACY_TEMPLATES:
+            if self.get(f"_index_template/{name}") is not None:
+                self.write('DELETE', f"_index_template/{name}", label=f"suppression de l'ancien template {name}")
+
+    # ------------------------------------------
+    #  Data streams
+    # ------------------------------------------
+
+    def migrate(self, name):
+        """
+        Convertit un index classique en data stream : l'index est bloqué en écriture,
+        cloné en <nom>-legacy (toujours interrogé par logs-*), puis supprimé
+        """
+        settings = self.get(f"{name}/_settings") or {}
+        creation_date = settings.get(name, {}).get('settings', {}).get('index', {}).get('creation_date')
+        clone_settings = {'index.lifecycle.name': DAILY_POLICY, 'index.blocks.write': None}
+        if creation_date:
+            # Rétention comptée depuis la création de l'index d'origine, pas depuis le clone
+            clone_settings['index.lifecycle.origination_date'] = int(creation_date)
+
+        return (self.write('PUT', f"{name}/_block/write", label=f"blocage en écriture de {name}")
+                and self.write('POST', f"{name}/_clone/{name}-legacy?wait_for_active_shards=1",
+                               {'settings': clone_settings}, f"clone {name} -> {name}-legacy")
+                and self.write('DELETE', name, label=f"suppression de l'index {name}"))
+
+    def create_data_streams(self, templates, migrate=False):
+        print("\n🌊 Data streams")
+        for template in templates.values():
+            if 'data_stream' not in template:
+                continue
+            for name in template['index_patterns']:
+                if '*' in name:
+                    continue
+                if self.get(f"_data_stream/{name}") is not None:
+                    print(f"   ✔️  {name} existe déjà")
+                    continue
+                if self.get(name) is not None:
+                    if not migrate:
+                        print(f"   ⚠️  {name} est un index classique : relancer avec --migrate pour le convertir")
+                        continue
+                    if not self.migrate(name):
+                        continue
+                self.write('PUT', f"_data_stream/{name}", label=f"data stream {name}")
+
+    def attach_daily_indices(self):
+        """Rattache les index journaliers existants (créés avant le template) à la politique"""
+        print("\n📅 Index journaliers existants")
+        indices = self.get(f"{DAILY_PATTERN}/_settings/index.lifecycle.name") or {}
+        pending = sorted(name for name, body in indices.items()
+                         if body.get('settings', {}).get('index', {}).get('lifecycle', {}).get('name') != DAILY_POLICY)
+        if not pending:
+            print(f"   ✔️  {len(indices)} index déjà rattachés à {DAILY_POLICY}")
+            return
+        for name in pending:
+            self.write('PUT', f"{name}/_settings", {'index.lifecycle.name': DAILY_POLICY},
+                       f"{name} -> {DAILY_POLICY}")
+
+    # ------------------------------------------
+    #  Rapport
+    # ------------------------------------------
+
+    def report(self):
+        print("\n📊 État du cycle de vie")
+        streams = self.get('_data_stream/logs-*') or {}
+        for stream in streams.get('data_streams', []):
+            print(f"   🌊 {stream['name']:<28} {len(stream['indices']):>3} index   "
+                  f"ILM : {stream.get('ilm_policy', '-')}   santé : {stream.get('status', '?').lower()}")
+
+        explain = self.get('logs-*/_ilm/explain') or {}
+        phases = {}
+        for index in explain.get('indices', {}).values():
+            if index.get('managed'):
+                key = (index.get('policy'), index.get('phase', 'new'))
+                phases[key] = phases.get(key, 0) + 1
+            else:
+                phases[('non géré', '-')] = phases.get(('non géré', '-'), 0) + 1
+        for (policy, phase), count in sorted(phases.items()):
+            print(f"   📁 {policy:<16} {phase:<8} {count:>5} index")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cycle de vie des index de logs (ILM, templates, data streams)")
+    parser.add_argument('--es-url', default=os.environ.get('ELASTICSEARCH_URL', 'http://localhost:9200'))
+    parser.add_argument('--dry-run', action='store_true', help="Affiche les requêtes sans les envoyer")
+    parser.add_argument('--migrate', action='store_true',
+                        help="Convertit les index classiques logs-saas-json / logs-saas-csv en data streams")
+    parser.add_argument('--skip-existing', action='store_true',
+                        help="Ne rattache pas les index logs-ecommerce-* existants à la politique ILM")
+    parser.add_argument('--rollover-size', help="Taille maximale d'un shard primaire avant rollover (ex. 25gb)")
+    parser.add_argument('--rollover-age', help="Âge maximal d'un index avant rollover (ex. 1d)")
+    parser.add_argument('--warm-after', help="Passage en phase warm : force-merge (ex. 2d)")
+    parser.add_argument('--retention', help="Suppression des index après cette durée (ex. 30d)")
+    parser.add_argument('--report', action='store_true', help="Affiche uniquement l'état du cycle de vie")
+    args = parser.parse_args()
+
+    setup = LifecycleSetup(args.es_url, dry_run=args.dry_run)
+    try:
+        requests.get(setup.es_url, timeout=5)
+    except requests.RequestException as e:
+        print(f"❌ Elasticsearch injoignable ({setup.es_url}) : {e}")
+        return 1
+
+    if not args.report:
+        print(f"⚙️  Cycle de vie des index de logs sur {setup.es_url}")
+        templates = load_dir('index-templates')
+        setup.install(apply_overrides(load_dir('ilm'), args), load_dir('component-templates'), templates)
+        setup.create_data_streams(templates, migrate=args.migrate)
+        if not args.skip_existing:
+            setup.attach_daily_indices()
+
+    if not args.dry_run:
+        setup.report()
+
+    if setup.errors:
+        print(f"\n❌ {setup.errors} requête(s) en erreur")
+        return 1
+    print("\n✅ Terminé")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
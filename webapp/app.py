@@ -1,14 +1,31 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, make_response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, make_response, Response, stream_with_context
 from werkzeug.utils import secure_filename
 import os
 from datetime import datetime, timedelta
-import pymongo
+from bson import ObjectId
 import socket
-from elasticsearch import Elasticsearch
 from collections import defaultdict
-import redis
-import requests
-from auth import init_auth_manager, login_required, api_login_required, check_auth, get_current_user
+from password_hashing import HashingBusy
+from auth import init_auth_manager, login_required, api_login_required, admin_required, check_auth, get_current_user
+from database import db_manager
+from stats_engine import init_stats_engine
+from stats_rollups import init_stats_rollups
+from index_router import init_index_router
+from live_stream import live_hub
+from health_probes import (
+    init_health_prober,
+    probe_elasticsearch, probe_mongodb, probe_redis, probe_kibana, probe_logstash
+)
+from health_monitor import init_health_monitor
+from search_pagination import PAGE_SIZE, PIT_KEEP_ALIVE_SECONDS, CursorError, search_page, search_cursor, format_log_hit
+from search_cache import init_search_cache
+from search_history import init_search_history
+from query_builder import build_search_query, parse_multi
+from ingestion import StreamingIngestor, IngestError, ingest_format, iter_chunks
+from upload_jobs import init_upload_jobs
+from upload_counters import init_upload_counters, SUMMARY_COLLECTION
+from dashboard_stats import init_dashboard_stats
+from rate_limiter import init_rate_limiter, rate_limit, RateLimitRule, by_ip, by_user, by_login_username
 
 # Charger les variables d'environnement depuis .env manuellement
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
@@ -29,40 +46,153 @@ BASE_DIR = os.path.dirname(__file__)
 # Store uploads in /app/uploads inside container (mounted as volume)
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-ALLOWED_EXTENSIONS = {'csv', 'json', 'txt', 'log'}
+ALLOWED_EXTENSIONS = {'csv', 'json', 'ndjson', 'txt', 'log'}
 
-# MongoDB client
+# Ingestion des uploads : 'queue' (job en arrière-plan), 'direct' (pendant la requête) ou 'logstash'
+UPLOAD_INGEST_MODE = os.environ.get('UPLOAD_INGEST_MODE', 'queue')
+UPLOAD_PROGRESS_FIELDS = ['filename', 'status', 'uploaded_at', 'started_at', 'finished_at', 'ingest', 'ingest_error']
+# Archive des fichiers déjà indexés (hors du glob surveillé par Logstash)
+INGESTED_FOLDER = os.path.join(UPLOAD_FOLDER, 'ingested')
+os.makedirs(INGESTED_FOLDER, exist_ok=True)
+
+# Connexions partagées : pools MongoDB, Redis, Elasticsearch et HTTP (voir database.py)
 MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017')
 MONGO_DB = os.environ.get('MONGO_DB', 'monitoring')
 MONGO_COLLECTION = os.environ.get('MONGO_COLLECTION', 'uploads')
-try:
-    mongo_client = pymongo.MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
-    # trigger server selection to fail fast if unreachable
-    mongo_client.server_info()
-    mongo_db = mongo_client[MONGO_DB]
-    uploads_col = mongo_db[MONGO_COLLECTION]
-    users_col = mongo_db['users']  # Collection pour les utilisateurs
-except Exception as e:
-    # If Mongo is unavailable, set uploads_col to None and log via prints (Flask logging not configured here)
-    uploads_col = None
-    users_col = None
-    print(f"Warning: cannot connect to MongoDB at {MONGO_URI}: {e}")
+ES_HOST = os.environ.get('ELASTICSEARCH_HOST', os.environ.get('ES_HOST', 'http://localhost:9200'))
+# (.env est chargé après l'import de database.py)
+db_manager.mongo_uri = MONGO_URI
+db_manager.mongo_db_name = MONGO_DB
+db_manager.es_host = ES_HOST
+db_manager.redis_host = os.environ.get('REDIS_HOST', db_manager.redis_host)
+db_manager.redis_port = int(os.environ.get('REDIS_PORT', db_manager.redis_port))
+db_manager.load_pool_config()
+# Démarrage : 'background' (connexions en arrière-plan, import immédiat), 'lazy' (à la première
+# utilisation, dans la requête) ou 'sync' (bloquant). Un service indisponible est retenté avec backoff.
+DB_STARTUP_MODE = os.environ.get('DB_STARTUP_MODE', 'background')
+if DB_STARTUP_MODE == 'sync':
+    db_manager.connect_all()
+elif DB_STARTUP_MODE == 'background':
+    db_manager.start_warmup()
+
+
+def get_mongo_db():
+    """Base MongoDB partagée, ou None si MongoDB est indisponible"""
+    return db_manager.get_mongo_db()
+
+
+def get_uploads_col():
+    """Collection des uploads, ou None si MongoDB est indisponible"""
+    return db_manager.get_mongo_collection(MONGO_COLLECTION)
+
+
+def get_es_client():
+    """Client Elasticsearch partagé, ou None si Elasticsearch est indisponible"""
+    return db_manager.get_es_client()
+
+
+def get_redis_client():
+    """Client Redis partagé, ou None si Redis est indisponible"""
+    return db_manager.get_redis_client()
+
 
 # Initialiser l'AuthManager avec la collection users
-auth_manager = init_auth_manager(users_col)
+auth_manager = init_auth_manager(
+    users_getter=lambda: db_manager.get_mongo_collection('users'),
+    redis_getter=get_redis_client
+)
+
+# Index couvrant une plage de temps (index journaliers par leur nom, autres via _field_caps)
+index_router = init_index_router(get_es_client)
+
+# Timeline pré-agrégée (rollups horaires/journaliers mis à jour en arrière-plan)
+stats_rollups = (init_stats_rollups(get_es_client, get_redis_client, router=index_router)
+                 if os.environ.get('STATS_ROLLUPS_ENABLED', '1') == '1' else None)
+
+# Moteur de statistiques : une seule requête Elasticsearch par intervalle de cache
+stats_engine = init_stats_engine(
+    es_getter=get_es_client,
+    redis_getter=get_redis_client,
+    uploads_getter=get_uploads_col,
+    rollups=stats_rollups,
+    router=index_router
+)
+
+# Cache des résultats de /api/search
+search_cache = init_search_cache(get_redis_client)
+
+# Limitation de débit (compteurs Redis partagés entre workers)
+rate_limiter = init_rate_limiter(get_redis_client)
+LOGIN_RATE_LIMITS = [
+    RateLimitRule('login_ip', os.environ.get('RATE_LIMIT_LOGIN_IP', '20/60'), by_ip),
+    RateLimitRule('login_user', os.environ.get('RATE_LIMIT_LOGIN_USER', '10/300'), by_login_username),
+]
+SEARCH_RATE_LIMITS = [
+    RateLimitRule('search_user', os.environ.get('RATE_LIMIT_SEARCH_USER', '10/1'), by_user, 'token_bucket'),
+    RateLimitRule('search_ip', os.environ.get('RATE_LIMIT_SEARCH_IP', '30/1'), by_ip, 'token_bucket'),
+]
+
+# Historique de recherche : écrit par lots en arrière-plan
+search_history = init_search_history(lambda: db_manager.get_mongo_collection('search_history'))
+
+# Compteurs matérialisés du tableau de bord
+upload_counters = init_upload_counters(get_uploads_col, lambda: db_manager.get_mongo_collection(SUMMARY_COLLECTION))
+# Graphes du tableau de bord : une agrégation $facet sur la période affichée, cache court
+# (pas d'invalidation à chaque upload : les compteurs ci-dessus sont déjà à jour)
+dashboard_stats = init_dashboard_stats(get_uploads_col, get_redis_client)
+
+
+# Jobs d'ingestion des uploads (pool de processus)
+def on_upload_job_complete(job, result):
+    if result.get('status') == 'processed':
+        stats_engine.invalidate()
+    elif job.get('upload_id'):
+        # Processus d'ingestion interrompu avant d'avoir publié son statut final
+        upload_counters.update_status(job['upload_id'], {
+            'status': 'error',
+            'ingest_error': result.get('ingest_error'),
+            'finished_at': datetime.utcnow().isoformat() + 'Z'
+        }, only_from=('queued', 'processing'))
 
-# Elasticsearch client
-ES_HOST = os.environ.get('ELASTICSEARCH_HOST', os.environ.get('ES_HOST', 'http://localhost:9200'))
-try:
-    es_client = Elasticsearch([ES_HOST], request_timeout=5)
-    if es_client.ping():
-        print(f"Connected to Elasticsearch at {ES_HOST}")
-    else:
-        es_client = None
-        print(f"Warning: Elasticsearch ping failed at {ES_HOST}")
-except Exception as e:
-    es_client = None
-    print(f"Warning: cannot connect to Elasticsearch at {ES_HOST}: {e}")
+
+upload_jobs = init_upload_jobs(get_redis_client, on_complete=on_upload_job_complete)
+
+# Sondes de santé : clients du gestionnaire de connexions (pools partagés)
+KIBANA_HOST = os.environ.get('KIBANA_HOST', 'http://localhost:5601')
+LOGSTASH_HOST = os.environ.get('LOGSTASH_HOST', 'http://localhost:9600')
+REDIS_DISPLAY_URL = f'redis://{db_manager.redis_host}:{db_manager.redis_port}'
+
+
+def pool_probe(service, probe):
+    """Sonde d'un service du pool : un échec le marque indisponible jusqu'à la prochaine reconnexion"""
+    def run():
+        try:
+            result = probe()
+        except Exception:
+            db_manager.mark_unavailable(service)
+            raise
+        if result.get('status') != 'healthy':
+            db_manager.mark_unavailable(service)
+        return result
+    return run
+
+
+health_prober = init_health_prober()
+health_prober.register('elasticsearch', pool_probe(
+    'elasticsearch', lambda: probe_elasticsearch(get_es_client(), ES_HOST)), ES_HOST)
+health_prober.register('mongodb', pool_probe(
+    'mongodb', lambda: probe_mongodb(db_manager.mongo_client, get_mongo_db(), MONGO_URI, MONGO_DB)), MONGO_URI)
+health_prober.register('redis', pool_probe(
+    'redis', lambda: probe_redis(get_redis_client(), REDIS_DISPLAY_URL)), REDIS_DISPLAY_URL)
+health_prober.register('kibana', lambda: probe_kibana(db_manager.get_http_session(), KIBANA_HOST), KIBANA_HOST)
+health_prober.register('logstash', lambda: probe_logstash(db_manager.get_http_session(), LOGSTASH_HOST), LOGSTASH_HOST)
+
+# Moniteur : échantillonne les sondes en arrière-plan, /api/health répond depuis la mémoire
+health_monitor = init_health_monitor(health_prober.check_all)
+
+# Canaux du flux temps réel : calculés une fois par intervalle, quel que soit le nombre de clients
+live_hub.register('stats', lambda: stats_engine.get_stats(), float(os.environ.get('LIVE_STATS_INTERVAL', '1')))
+live_hub.register('health', lambda: health_monitor.latest(), float(os.environ.get('LIVE_HEALTH_INTERVAL', '10')))
 
 
 def allowed_file(filename):
@@ -91,6 +221,16 @@ def signup_page():
     return render_template('signup.html')
 
 
+def hashing_busy_response():
+    """Réponse 503 lorsque le service de hachage est saturé"""
+    response = jsonify({
+        'success': False,
+        'message': 'Serveur occupé, veuillez réessayer'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
 @app.route('/api/signup', methods=['POST'])
 def api_signup():
     """API d'inscription - Crée un nouveau compte utilisateur"""
@@ -127,6 +267,8 @@ def api_signup():
         else:
             return jsonify(result), 400
             
+    except HashingBusy:
+        return hashing_busy_response()
     except Exception as e:
         return jsonify({
             'success': False,
@@ -135,6 +277,7 @@ def api_signup():
 
 
 @app.route('/api/login', methods=['POST'])
+@rate_limit(*LOGIN_RATE_LIMITS)
 def api_login():
     """API de connexion - Génère un token JWT"""
     try:
@@ -183,6 +326,8 @@ def api_login():
         
         return response
         
+    except HashingBusy:
+        return hashing_busy_response()
     except Exception as e:
         return jsonify({
             'success': False,
@@ -199,6 +344,7 @@ def api_logout():
     }))
     
     # Supprimer le cookie
+    auth_manager.revoke_token(auth_manager.get_token_from_request())
     response.set_cookie('access_token', '', max_age=0)
     
     return response
@@ -259,143 +405,159 @@ def search():
 @app.route('/api/health')
 @api_login_required
 def api_health():
-    """API endpoint pour vérifier le statut de tous les services"""
-    services = {}
-    
-    # Check Elasticsearch
-    try:
-        if es_client is not None and es_client.ping():
-            cluster_health = es_client.cluster.health()
-            services['elasticsearch'] = {
-                'status': 'healthy',
-                'url': ES_HOST,
-                'cluster_status': cluster_health.get('status', 'unknown'),
-                'nodes': cluster_health.get('number_of_nodes', 0),
-                'response_time': 'OK'
-            }
-        else:
-            services['elasticsearch'] = {
-                'status': 'unhealthy',
-                'url': ES_HOST,
-                'error': 'Cannot ping Elasticsearch'
-            }
-    except Exception as e:
-        services['elasticsearch'] = {
-            'status': 'error',
-            'url': ES_HOST,
-            'error': str(e)
-        }
-    
-    # Check MongoDB
-    try:
-        if uploads_col is not None:
-            mongo_client.server_info()
-            db_stats = mongo_db.command('dbStats')
-            services['mongodb'] = {
-                'status': 'healthy',
-                'url': MONGO_URI,
-                'database': MONGO_DB,
-                'collections': db_stats.get('collections', 0),
-                'data_size': db_stats.get('dataSize', 0)
-            }
-        else:
-            services['mongodb'] = {
-                'status': 'unhealthy',
-                'url': MONGO_URI,
-                'error': 'Connection not established'
-            }
-    except Exception as e:
-        services['mongodb'] = {
-            'status': 'error',
-            'url': MONGO_URI,
-            'error': str(e)
-        }
-    
-    # Check Redis
-    try:
-        redis_host = os.environ.get('REDIS_HOST', 'localhost')
-        redis_port = int(os.environ.get('REDIS_PORT', 6379))
-        redis_client = redis.Redis(host=redis_host, port=redis_port, socket_connect_timeout=2)
-        redis_info = redis_client.info()
-        services['redis'] = {
-            'status': 'healthy',
-            'url': f'redis://{redis_host}:{redis_port}',
-            'version': redis_info.get('redis_version', 'unknown'),
-            'used_memory': redis_info.get('used_memory_human', 'unknown'),
-            'connected_clients': redis_info.get('connected_clients', 0)
-        }
-    except Exception as e:
-        redis_host = os.environ.get('REDIS_HOST', 'localhost')
-        redis_port = int(os.environ.get('REDIS_PORT', 6379))
-        services['redis'] = {
-            'status': 'error',
-            'url': f'redis://{redis_host}:{redis_port}',
-            'error': str(e)
-        }
-    
-    # Check Kibana
-    try:
-        kibana_host = os.environ.get('KIBANA_HOST', 'http://localhost:5601')
-        kibana_response = requests.get(f'{kibana_host}/api/status', timeout=3)
-        if kibana_response.status_code == 200:
-            kibana_data = kibana_response.json()
-            services['kibana'] = {
-                'status': 'healthy',
-                'url': kibana_host,
-                'version': kibana_data.get('version', {}).get('number', 'unknown'),
-                'state': kibana_data.get('status', {}).get('overall', {}).get('state', 'unknown')
-            }
-        else:
-            services['kibana'] = {
-                'status': 'unhealthy',
-                'url': kibana_host,
-                'error': f'HTTP {kibana_response.status_code}'
-            }
-    except Exception as e:
-        kibana_host = os.environ.get('KIBANA_HOST', 'http://localhost:5601')
-        services['kibana'] = {
-            'status': 'error',
-            'url': kibana_host,
-            'error': str(e)
-        }
-    
-    # Check Logstash
+    """API endpoint pour vérifier le statut de tous les services (dernier échantillon du moniteur)"""
+    return jsonify(health_monitor.latest())
+
+
+@app.route('/api/health/history')
+@api_login_required
+def api_health_history():
+    """
+    Historique des échantillons de santé (sparklines)
+
+    Paramètres : ?service=redis&limit=60
+    """
+    service = request.args.get('service', '').strip() or None
     try:
-        logstash_host = os.environ.get('LOGSTASH_HOST', 'http://localhost:9600')
-        logstash_response = requests.get(logstash_host, timeout=3)
-        if logstash_response.status_code == 200:
-            services['logstash'] = {
-                'status': 'healthy',
-                'url': logstash_host,
-                'response': 'API responding'
-            }
-        else:
-            services['logstash'] = {
-                'status': 'unhealthy',
-                'url': logstash_host,
-                'error': f'HTTP {logstash_response.status_code}'
-            }
-    except Exception as e:
-        logstash_host = os.environ.get('LOGSTASH_HOST', 'http://localhost:9600')
-        services['logstash'] = {
-            'status': 'error',
-            'url': logstash_host,
-            'error': str(e)
-        }
-    
-    # Overall health
-    healthy_count = sum(1 for s in services.values() if s.get('status') == 'healthy')
-    total_count = len(services)
-    
+        limit = int(request.args.get('limit', 60))
+    except ValueError:
+        limit = 60
+
+    # Démarre le moniteur si ce n'est pas déjà fait
+    health_monitor.latest()
+
     return jsonify({
-        'timestamp': datetime.utcnow().isoformat() + 'Z',
-        'overall_status': 'healthy' if healthy_count == total_count else 'degraded',
-        'healthy_services': healthy_count,
-        'total_services': total_count,
-        'services': services
+        'interval_seconds': health_monitor.interval,
+        'history_size': health_monitor.history_size,
+        'services': health_monitor.get_history(service, limit)
     })
 
 
+def process_upload(stream, filename, mimetype=''):
+    """
+    Enregistre un fichier uploadé en le lisant par blocs
+
+    Selon UPLOAD_INGEST_MODE (csv, json, ndjson uniquement) :
+    - 'queue' : le fichier est archivé puis un job d'ingestion est mis en file
+    - 'direct' : le fichier est parsé et indexé pendant la lecture
+    Les fichiers ingérés par l'application sont archivés hors du dossier surveillé
+    par Logstash ; les autres formats sont déposés dans UPLOAD_FOLDER pour Logstash.
+
+    Returns:
+        tuple: (metadata, preview_lines)
+
+    Raises:
+        OSError: Si le fichier ne peut pas être écrit sur le disque
+    """
+    fmt = ingest_format(filename)
+    es_client = get_es_client()
+    mode = UPLOAD_INGEST_MODE if fmt is not None and es_client is not None else 'logstash'
+    if mode == 'logstash':
+        save_path = os.path.join(UPLOAD_FOLDER, filename)
+    else:
+        # Nom unique : un job en attente ne doit pas voir son fichier remplacé
+        stored_name = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f') + '_' + filename
+        save_path = os.path.join(INGESTED_FOLDER, stored_name)
+
+    ingest_stats = None
+    ingest_error = None
+    preview_lines = []
+    with open(save_path, 'wb') as sink:
+        if mode == 'direct':
+            ingestor = StreamingIngestor(es_client, fmt, source=filename, sink=sink)
+            try:
+                result = ingestor.run(iter_chunks(stream))
+                ingest_stats = result['stats']
+            except IngestError as e:
+                ingest_error = str(e)
+                ingest_stats = ingestor.stats()
+            preview_lines = ingestor.preview
+        # Archive complète même si l'ingestion s'est arrêtée en cours de route
+        for chunk in iter_chunks(stream):
+            sink.write(chunk)
+
+    if mode != 'direct':
+        # Read first 10 lines for preview (text preview)
+        try:
+            with open(save_path, 'r', encoding='utf-8', errors='replace') as f:
+                for i, line in enumerate(f):
+                    if i >= 10:
+                        break
+                    preview_lines.append(line.rstrip('\n'))
+        except Exception as e:
+            preview_lines = [f'Error reading file: {e}']
+
+    # Gather metadata
+    try:
+        size = os.path.getsize(save_path)
+    except Exception:
+        size = None
+
+    if ingest_error:
+        status = 'error'
+    elif mode == 'direct':
+        status = 'processed'
+    elif mode == 'queue':
+        status = 'queued'
+    else:
+        status = 'saved'
+
+    metadata = {
+        'filename': filename,
+        'size': size,
+        'uploaded_at': datetime.utcnow().isoformat() + 'Z',
+        'type': mimetype or '',
+        'extension': filename.rsplit('.', 1)[1].lower() if '.' in filename else '',
+        'status': status,
+        'uploader_host': socket.gethostname(),
+        'ingest_mode': mode,
+    }
+    if ingest_stats is not None:
+        metadata['ingest'] = ingest_stats
+    if ingest_error:
+        metadata['ingest_error'] = ingest_error
+
+    # Store metadata in MongoDB if available
+    uploads_col = get_uploads_col()
+    if uploads_col is not None:
+        try:
+            res = uploads_col.insert_one(metadata)
+            metadata['_id'] = str(res.inserted_id)
+            upload_counters.record_insert(metadata)
+        except Exception as e:
+            # record error in metadata but do not fail the upload itself
+            metadata['status'] = 'error_saving_metadata'
+            metadata['meta_error'] = str(e)
+    else:
+        metadata['status'] = 'mongo_unavailable'
+
+    if mode == 'queue':
+        metadata['job_id'] = upload_jobs.submit({
+            'upload_id': metadata.get('_id'),
+            'path': os.path.abspath(save_path),
+            'filename': filename,
+            'format': fmt,
+            'es_host': ES_HOST,
+            'mongo_uri': MONGO_URI if '_id' in metadata else None,
+            'mongo_db': MONGO_DB,
+            'collection': MONGO_COLLECTION
+        })
+        metadata['progress_url'] = url_for('api_upload_progress', upload_id=metadata['job_id'])
+    elif mode == 'direct' and ingest_stats and ingest_stats['rows_indexed']:
+        stats_engine.invalidate()
+
+    return metadata, preview_lines
+
+
+def upload_status_code(metadata):
+    """Code HTTP d'un upload : 422 si l'ingestion a échoué, 202 si elle est en file"""
+    if metadata.get('ingest_error'):
+        return 422
+    if metadata.get('job_id'):
+        return 202
+    return 200
+
+
 @app.route('/upload', methods=['GET', 'POST'])
 @login_required
 def upload():
@@ -426,243 +588,292 @@ def upload():
         return redirect(request.url)
 
     filename = secure_filename(file.filename)
-    save_path = os.path.join(UPLOAD_FOLDER, filename)
-    # Save file to disk
     try:
         file.stream.seek(0)
-        file.save(save_path)
-    except Exception as e:
+        metadata, preview_lines = process_upload(file.stream, filename, file.mimetype)
+    except OSError as e:
         msg = f'Error saving file: {e}'
         if request.is_json:
             return jsonify({'status': 'error', 'error': msg}), 500
         flash(msg)
         return redirect(request.url)
 
-    # Gather metadata
+    response = {'status': 'success', 'metadata': metadata, 'preview': preview_lines}
+    if metadata.get('ingest_error'):
+        response.update(status='error', error=metadata['ingest_error'])
+
+    # If AJAX/JS expects JSON
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.is_json:
+        return jsonify(response), upload_status_code(metadata)
+
+    # Otherwise render template with preview and metadata
+    return render_template('upload.html', preview=preview_lines, filename=filename, metadata=metadata)
+
+
+@app.route('/api/uploads/stream', methods=['POST'])
+@api_login_required
+def api_upload_stream():
+    """
+    Upload brut : le corps de la requête est le contenu du fichier
+    Le fichier est parsé et indexé pendant sa réception (pas de fichier temporaire multipart)
+    """
+    filename = secure_filename(request.args.get('filename') or request.headers.get('X-Filename', ''))
+    if not filename:
+        return jsonify({'status': 'error', 'error': 'Missing filename'}), 400
+    if not allowed_file(filename):
+        msg = 'Invalid file format. Allowed: ' + ','.join(sorted(ALLOWED_EXTENSIONS))
+        return jsonify({'status': 'error', 'error': msg}), 400
+
     try:
-        size = os.path.getsize(save_path)
-    except Exception:
-        size = None
+        metadata, preview_lines = process_upload(request.stream, filename, request.mimetype)
+    except OSError as e:
+        return jsonify({'status': 'error', 'error': f'Error saving file: {e}'}), 500
 
-    mtype = file.mimetype or ''
-    upload_time = datetime.utcnow().isoformat() + 'Z'
-    status = 'saved'
+    response = {'status': 'success', 'metadata': metadata, 'preview': preview_lines}
+    if metadata.get('ingest_error'):
+        response.update(status='error', error=metadata['ingest_error'])
+    return jsonify(response), upload_status_code(metadata)
 
-    metadata = {
-        'filename': filename,
-        'size': size,
-        'uploaded_at': upload_time,
-        'type': mtype,
-        'extension': filename.rsplit('.', 1)[1].lower() if '.' in filename else '',
-        'status': status,
-        'uploader_host': socket.gethostname(),
-    }
 
-    # Store metadata in MongoDB if available
-    inserted_id = None
-    if uploads_col is not None:
+@app.route('/api/uploads/<upload_id>/progress')
+@api_login_required
+def api_upload_progress(upload_id):
+    """Progression d'un job d'ingestion (lignes parsées/indexées, débit, erreurs)"""
+    progress = None
+    uploads_col = get_uploads_col()
+    if uploads_col is not None and ObjectId.is_valid(upload_id):
         try:
-            res = uploads_col.insert_one(metadata)
-            inserted_id = str(res.inserted_id)
-            metadata['_id'] = inserted_id
+            progress = uploads_col.find_one({'_id': ObjectId(upload_id)}, UPLOAD_PROGRESS_FIELDS)
         except Exception as e:
-            # record error in metadata but do not fail the upload itself
-            metadata['status'] = 'error_saving_metadata'
-            metadata['meta_error'] = str(e)
-    else:
-        metadata['status'] = 'mongo_unavailable'
+            print(f"Error fetching upload progress: {e}")
+        if progress is not None:
+            progress['_id'] = str(progress['_id'])
 
-    # Read first 10 lines for preview (text preview)
-    preview_lines = []
-    try:
-        with open(save_path, 'r', encoding='utf-8', errors='replace') as f:
-            for i, line in enumerate(f):
-                if i >= 10:
-                    break
-                preview_lines.append(line.rstrip('\n'))
-    except Exception as e:
-        preview_lines = [f'Error reading file: {e}']
+    # Fallback : état connu du processus (MongoDB indisponible)
+    if progress is None:
+        progress = upload_jobs.get_job(upload_id)
+    if progress is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
 
-    response = {'status': 'success', 'metadata': metadata, 'preview': preview_lines}
+    progress['done'] = progress.get('status') in ('processed', 'error')
+    return jsonify(progress)
 
-    # If AJAX/JS expects JSON
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.is_json:
-        return jsonify(response)
 
-    # Otherwise render template with preview and metadata
-    return render_template('upload.html', preview=preview_lines, filename=filename, metadata=metadata)
+@app.route('/api/admin/token-cache', methods=['GET'])
+@api_login_required
+@admin_required
+def api_token_cache_metrics():
+    """Compteurs du cache de vérification des tokens JWT"""
+    return jsonify(auth_manager.get_token_cache_metrics())
+
+
+@app.route('/api/admin/last-login', methods=['GET'])
+@api_login_required
+@admin_required
+def api_last_login_metrics():
+    """Compteurs des mises à jour différées de last_login"""
+    return jsonify(auth_manager.last_login_writer.get_metrics())
+
+
+@app.route('/api/admin/password-hashing', methods=['GET'])
+@api_login_required
+@admin_required
+def api_password_hashing_metrics():
+    """Compteurs du service de hachage des mots de passe"""
+    return jsonify(auth_manager.hasher.get_metrics())
+
+
+@app.route('/api/admin/indexes', methods=['GET'])
+@api_login_required
+@admin_required
+def api_mongo_indexes():
+    """Index MongoDB créés au démarrage et requêtes couvertes"""
+    mongo_db = get_mongo_db()
+    return jsonify({
+        'indexes': db_manager.index_status,
+        'queries': db_manager.index_coverage(mongo_db) if mongo_db is not None else []
+    })
+
+
+@app.route('/api/admin/pools')
+@api_login_required
+@admin_required
+def api_connection_pools():
+    """Utilisation des pools de connexions (MongoDB, Redis, Elasticsearch, HTTP) et état des reconnexions"""
+    return jsonify(db_manager.pool_stats())
+
+
+@app.route('/api/dashboard/stats')
+@api_login_required
+def api_dashboard_stats():
+    """Statistiques des uploads du tableau de bord (compteurs et graphes)"""
+    return jsonify(get_dashboard_data())
+
+
+@app.route('/api/admin/dashboard-stats', methods=['GET'])
+@api_login_required
+@admin_required
+def api_dashboard_stats_metrics():
+    """Compteurs du cache et latence de l'agrégation du tableau de bord"""
+    return jsonify(dashboard_stats.get_metrics())
+
+
+@app.route('/api/admin/upload-counters', methods=['GET'])
+@api_login_required
+@admin_required
+def api_upload_counters():
+    """Compteurs matérialisés des uploads (tableau de bord)"""
+    return jsonify(upload_counters.get_summary())
+
+
+@app.route('/api/admin/upload-counters/rebuild', methods=['POST'])
+@api_login_required
+@admin_required
+def api_rebuild_upload_counters():
+    """Reconstruit les compteurs à partir de la collection des uploads"""
+    summary = upload_counters.reconcile()
+    if summary is None:
+        return jsonify({'success': False, 'error': 'MongoDB unavailable'}), 503
+    return jsonify({'success': True, 'summary': summary})
+
+
+@app.route('/api/admin/users/<username>/revoke', methods=['POST'])
+@api_login_required
+@admin_required
+def api_revoke_user(username):
+    """Révoque tous les tokens émis pour un utilisateur (ex. changement de rôle)"""
+    auth_manager.revoke_user(username)
+    return jsonify({'success': True, 'username': username})
+
+
+@app.route('/api/admin/user-cache', methods=['GET'])
+@api_login_required
+@admin_required
+def api_user_cache_metrics():
+    """Compteurs du cache des profils et des révocations"""
+    return jsonify({
+        'profiles': auth_manager.user_cache.get_metrics() if auth_manager.user_cache else None,
+        'revocations': auth_manager.revocations.get_metrics() if auth_manager.revocations else None
+    })
+
+
+@app.route('/api/admin/rate-limits', methods=['GET'])
+@api_login_required
+@admin_required
+def api_rate_limit_metrics():
+    """Compteurs du limiteur de débit"""
+    return jsonify(rate_limiter.get_metrics())
+
+
+@app.route('/api/admin/upload-jobs', methods=['GET'])
+@api_login_required
+@admin_required
+def api_upload_jobs_metrics():
+    """Compteurs de la file d'ingestion"""
+    return jsonify(upload_jobs.get_metrics())
 
 
 @app.route('/api/stats')
 @api_login_required
 def api_stats():
     """API endpoint pour récupérer les statistiques en temps réel"""
-    stats = {
-        'total_logs': 0,
-        'logs_today': 0,
-        'errors': 0,
-        'files_uploaded': 0,
-        'timeline': []
-    }
-    
-    try:
-        # Statistiques Elasticsearch
-        if es_client is not None:
-            # Total logs
-            result = es_client.count(index='logs-*')
-            stats['total_logs'] = result.get('count', 0)
-            
-            # Logs récents (dernières 24h de données disponibles)
-            # Au lieu de chercher "aujourd'hui", on cherche les logs récents basés sur les données existantes
-            recent_query = {
-                'size': 0,
-                'aggs': {
-                    'max_date': {'max': {'field': '@timestamp'}},
-                    'min_date': {'min': {'field': '@timestamp'}}
-                }
-            }
-            result_dates = es_client.search(index='logs-*', body=recent_query)
-            max_date_ms = result_dates.get('aggregations', {}).get('max_date', {}).get('value', None)
-            
-            if max_date_ms:
-                # Calculer 24h avant la date la plus récente
-                from datetime import datetime, timedelta
-                max_date = datetime.fromtimestamp(max_date_ms / 1000)
-                one_day_before = max_date - timedelta(days=1)
-                
-                recent_logs_query = {
-                    'query': {
-                        'range': {
-                            '@timestamp': {
-                                'gte': one_day_before.isoformat()
-                            }
-                        }
-                    }
-                }
-                result_recent = es_client.count(index='logs-*', body=recent_logs_query)
-                stats['logs_today'] = result_recent.get('count', 0)
-            else:
-                stats['logs_today'] = 0
-            
-            # Erreurs (status failed)
-            error_query = {
-                'query': {
-                    'match': {
-                        'status': 'failed'
-                    }
-                }
-            }
-            result_errors = es_client.count(index='logs-*', body=error_query)
-            stats['errors'] = result_errors.get('count', 0)
-            
-            # Timeline de toutes les données disponibles (au lieu de seulement 7 derniers jours)
-            timeline_query = {
-                'size': 0,
-                'aggs': {
-                    'logs_over_time': {
-                        'date_histogram': {
-                            'field': '@timestamp',
-                            'calendar_interval': 'day',
-                            'format': 'yyyy-MM-dd'
-                        }
-                    }
-                }
-            }
-            result_timeline = es_client.search(index='logs-*', body=timeline_query)
-            buckets = result_timeline.get('aggregations', {}).get('logs_over_time', {}).get('buckets', [])
-            # Limiter à 30 derniers jours de données pour ne pas surcharger le graphe
-            stats['timeline'] = [{'date': b['key_as_string'], 'count': b['doc_count']} for b in buckets[-30:]]
-            
-    except Exception as e:
-        print(f"Error fetching Elasticsearch stats: {e}")
-    
-    # Fichiers uploadés depuis MongoDB
-    if uploads_col is not None:
-        try:
-            stats['files_uploaded'] = uploads_col.count_documents({})
-        except Exception as e:
-            print(f"Error fetching MongoDB stats: {e}")
-    
-    return jsonify(stats)
+    return jsonify(stats_engine.get_stats())
+
+
+@app.route('/api/stats/metrics')
+@api_login_required
+def api_stats_metrics():
+    """Compteurs du cache des statistiques (hits/misses, latence Elasticsearch)"""
+    return jsonify(stats_engine.get_metrics())
+
+
+@app.route('/api/admin/index-router', methods=['GET'])
+@api_login_required
+@admin_required
+def api_index_router():
+    """Catalogue des index de logs et compteurs de la sélection par plage de temps"""
+    return jsonify(index_router.get_metrics())
+
+
+@app.route('/api/admin/stats-rollups', methods=['GET'])
+@api_login_required
+@admin_required
+def api_stats_rollups():
+    """État des rollups de la timeline (watermark, passages, jours recalculés)"""
+    if stats_rollups is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(stats_rollups.get_metrics(), enabled=True))
+
+
+@app.route('/api/admin/stats-rollups/rebuild', methods=['POST'])
+@api_login_required
+@admin_required
+def api_rebuild_stats_rollups():
+    """Reconstruit les rollups depuis le plus ancien log"""
+    if stats_rollups is None or not stats_rollups.rebuild():
+        return jsonify({'success': False, 'error': 'Rollups unavailable'}), 503
+    stats_engine.invalidate()
+    return jsonify({'success': True, 'metrics': stats_rollups.get_metrics()})
+
+
+@app.route('/api/stream')
+@api_login_required
+def api_stream():
+    """
+    Flux Server-Sent Events des statistiques et du statut des services
+
+    Paramètre ?channels=stats,health (par défaut : tous les canaux)
+    """
+    # Plafond par worker (LIVE_STREAM_MAX_SUBSCRIBERS) : au-delà, le client bascule sur le polling
+    if not live_hub.reserve():
+        response = jsonify({'error': 'Too many live streams on this worker', 'code': 'STREAM_LIMIT'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    channels = request.args.get('channels', 'stats,health').split(',')
+    response = Response(
+        stream_with_context(live_hub.subscribe([c.strip() for c in channels], reserved=True)),
+        mimetype='text/event-stream'
+    )
+    # Place libérée à la fermeture de la réponse, même si le flux n'a jamais démarré
+    response.call_on_close(live_hub.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Désactiver le buffering de Nginx pour ce flux
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/admin/live-stream', methods=['GET'])
+@api_login_required
+@admin_required
+def api_live_stream_metrics():
+    """Abonnés SSE de ce worker, plafond et connexions refusées"""
+    return jsonify(live_hub.get_metrics())
 
 
 @app.route('/api/search')
 @api_login_required
+@rate_limit(*SEARCH_RATE_LIMITS)
 def api_search():
     """API endpoint pour rechercher dans les logs Elasticsearch"""
     # Récupérer les paramètres de recherche
     query_text = request.args.get('query', '').strip()
-    level = request.args.get('level', '').strip()
-    service = request.args.get('service', '').strip()
+    # Filtres multi-valeurs : ?service=a&service=b ou ?service=a,b
+    levels = parse_multi(request.args.getlist('level'))
+    services = parse_multi(request.args.getlist('service'))
+    level = ','.join(levels)
+    service = ','.join(services)
     date_from = request.args.get('date_from', '').strip()
     date_to = request.args.get('date_to', '').strip()
     page = int(request.args.get('page', 1))
-    page_size = 50
-    
-    # Construire la requête Elasticsearch
-    must_conditions = []
-    
-    # Recherche texte libre
-    if query_text:
-        must_conditions.append({
-            'multi_match': {
-                'query': query_text,
-                'fields': ['message', 'product', 'customer_name', 'payment_type'],
-                'type': 'best_fields',
-                'fuzziness': 'AUTO'
-            }
-        })
-    
-    # Filtre par niveau (status)
-    if level:
-        must_conditions.append({
-            'match': {
-                'status': level
-            }
-        })
-    
-    # Filtre par service
-    if service:
-        must_conditions.append({
-            'match': {
-                'service': service
-            }
-        })
-    
-    # Filtre par plage de dates
-    if date_from or date_to:
-        date_range = {}
-        if date_from:
-            date_range['gte'] = date_from
-        if date_to:
-            date_range['lte'] = date_to
-        
-        must_conditions.append({
-            'range': {
-                '@timestamp': date_range
-            }
-        })
-    
-    # Si aucun filtre, afficher tous les logs
-    if not must_conditions:
-        es_query = {
-            'query': {
-                'match_all': {}
-            }
-        }
-    else:
-        es_query = {
-            'query': {
-                'bool': {
-                    'must': must_conditions
-                }
-            }
-        }
+    page_size = PAGE_SIZE
+    # Pagination par curseur : ?paginate=cursor pour la première page, puis ?cursor=<jeton>
+    cursor = request.args.get('cursor', '').strip()
+    cursor_mode = bool(cursor) or request.args.get('paginate', '') == 'cursor'
     
-    # Ajouter tri et pagination
-    es_query['sort'] = [{'@timestamp': {'order': 'desc'}}]
-    es_query['from'] = (page - 1) * page_size
-    es_query['size'] = page_size
+    # Construire la requête Elasticsearch (filtres exacts en contexte filter)
+    es_query = build_search_query(query_text, levels, services, date_from, date_to)
     
     # Exécuter la recherche
     results = {
@@ -671,6 +882,7 @@ def api_search():
         'page': page,
         'page_size': page_size,
         'total_pages': 0,
+        'next_cursor': None,
         'logs': [],
         'query_params': {
             'query': query_text,
@@ -681,51 +893,56 @@ def api_search():
         }
     }
     
+    # Cache des résultats : clé canonique, plages touchant "now" jamais mises en cache
+    cache_key = search_cache.key_for(
+        query_text=query_text, levels=levels, services=services,
+        date_from=date_from, date_to=date_to, page=page, cursor=cursor,
+        mode='cursor' if cursor_mode else 'page'
+    )
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        results = dict(cached, cached=True)
+    
+    es_client = get_es_client() if cached is None else None
     try:
         if es_client is not None:
-            response = es_client.search(index='logs-*', body=es_query)
+            # Ajouter tri et pagination
+            if cursor_mode:
+                response, pagination = search_cursor(es_client, 'logs-*', es_query, cursor or None, page_size)
+            else:
+                response, pagination = search_page(es_client, 'logs-*', es_query, page, page_size)
             
-            total_hits = response['hits']['total']['value']
             results['success'] = True
-            results['total'] = total_hits
-            results['total_pages'] = (total_hits + page_size - 1) // page_size
+            results['total'] = pagination['total']
+            results['page'] = pagination['page']
+            results['total_pages'] = pagination['total_pages']
+            results['next_cursor'] = pagination['next_cursor']
             
             # Extraire les logs
-            for hit in response['hits']['hits']:
-                source = hit['_source']
-                log_entry = {
-                    'timestamp': source.get('@timestamp', ''),
-                    'level': source.get('status', source.get('level', 'info')),
-                    'service': source.get('service', 'unknown'),
-                    'message': source.get('message', ''),
-                    'product': source.get('product', ''),
-                    'customer': source.get('customer_name', ''),
-                    'payment_type': source.get('payment_type', ''),
-                    'amount': source.get('amount', ''),
-                    'category': source.get('category', '')
-                }
-                results['logs'].append(log_entry)
+            results['logs'] = [format_log_hit(hit) for hit in response['hits']['hits']]
             
-            # Sauvegarder l'historique de recherche dans MongoDB
-            if uploads_col is not None:
-                try:
-                    history_collection = mongo_db['search_history']
-                    history_entry = {
-                        'timestamp': datetime.utcnow(),
-                        'query_text': query_text,
-                        'level': level,
-                        'service': service,
-                        'date_from': date_from,
-                        'date_to': date_to,
-                        'results_count': total_hits,
-                        'ip_address': request.remote_addr
-                    }
-                    history_collection.insert_one(history_entry)
-                except Exception as e:
-                    print(f"Error saving search history: {e}")
+            # Les curseurs ne survivent pas au point-in-time
+            search_cache.set(cache_key, results, ttl=PIT_KEEP_ALIVE_SECONDS if cursor_mode else None)
         
-        else:
+        elif cached is None:
             results['error'] = 'Elasticsearch client not available'
+        
+        # Sauvegarder l'historique de recherche dans MongoDB (écriture différée, par lots)
+        if results['success']:
+            search_history.record({
+                'timestamp': datetime.utcnow(),
+                'query_text': query_text,
+                'level': level,
+                'service': service,
+                'date_from': date_from,
+                'date_to': date_to,
+                'results_count': results['total'],
+                'ip_address': request.remote_addr
+            })
+    
+    except CursorError as e:
+        results['error'] = str(e)
+        return jsonify(results), 400
     
     except Exception as e:
         results['error'] = str(e)
@@ -734,39 +951,47 @@ def api_search():
     return jsonify(results)
 
 
+@app.route('/api/admin/search-history', methods=['GET'])
+@api_login_required
+@admin_required
+def api_search_history_metrics():
+    """Compteurs de l'écriture différée de l'historique (file, lots, abandons)"""
+    return jsonify(search_history.get_metrics())
+
+
+@app.route('/api/admin/search-cache', methods=['GET'])
+@api_login_required
+@admin_required
+def api_search_cache_metrics():
+    """Compteurs du cache de recherche (hit ratio, évictions...)"""
+    return jsonify(search_cache.get_metrics())
+
+
+@app.route('/api/admin/search-cache/flush', methods=['POST'])
+@api_login_required
+@admin_required
+def api_search_cache_flush():
+    """Vide le cache de recherche"""
+    removed = search_cache.flush()
+    return jsonify({'success': True, 'removed': removed})
+
+
+def get_dashboard_data():
+    """Compteurs matérialisés (une lecture) et graphes de la période (agrégation en cache)"""
+    # Reconstruits une seule fois s'ils n'existent pas encore
+    summary = upload_counters.get_summary() or upload_counters.reconcile()
+    data = {'total_uploads': 0, 'success_uploads': 0, 'error_uploads': 0, 'statuses': {}, 'uploads': []}
+    if summary is not None:
+        for key in data:
+            data[key] = summary[key]
+    data.update(dashboard_stats.get_stats())
+    return data
+
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Get statistics from MongoDB
-    stats = {
-        'total_uploads': 0,
-        'success_uploads': 0,
-        'error_uploads': 0,
-        'uploads': []
-    }
-    
-    if uploads_col is not None:
-        try:
-            # Total uploads
-            stats['total_uploads'] = uploads_col.count_documents({})
-            
-            # Success uploads
-            stats['success_uploads'] = uploads_col.count_documents({
-                'status': {'$in': ['saved', 'processed']}
-            })
-            
-            # Error uploads
-            stats['error_uploads'] = uploads_col.count_documents({
-                'status': 'error'
-            })
-            
-            # Recent uploads (last 10)
-            stats['uploads'] = list(uploads_col.find().sort('uploaded_at', -1).limit(10))
-            
-        except Exception as e:
-            print(f"Error fetching dashboard stats: {e}")
-    
-    return render_template('dashboard.html', **stats)
+    return render_template('dashboard.html', **get_dashboard_data())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,633 @@
+"""
+LogStream Studio - API asynchrone (ASGI)
+/api/search, /api/stats et /api/health sur une boucle asyncio : un worker sert des centaines
+de requêtes en attente d'Elasticsearch, MongoDB, Redis ou Kibana/Logstash
+
+Dépendances optionnelles (requirements-async.txt) : elasticsearch[async], motor, httpx, uvicorn
+(redis.asyncio est fourni par le paquet redis). Sans elles, le service concerné est vu
+comme indisponible, comme dans l'application Flask.
+
+Usage: gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker async_api:app
+Nginx envoie ces chemins vers ce service et tout le reste vers l'application Flask.
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+try:
+    from elasticsearch import AsyncElasticsearch
+except ImportError:
+    AsyncElasticsearch = None
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+from auth import AuthManager
+from database import db_manager
+from health_probes import (
+    unavailable, elasticsearch_status, mongodb_status, redis_status, kibana_status, logstash_status, summarize
+)
+from query_builder import build_search_query, parse_multi
+from rate_limiter import RateLimiter, RateLimitRule, client_ip
+from search_cache import SearchCache
+from search_history import init_search_history
+from user_cache import TokenRevocations
+from search_pagination import (
+    PAGE_SIZE, PIT_KEEP_ALIVE_SECONDS, CursorError, async_search_page, async_search_cursor, format_log_hit
+)
+from stats_engine import StatsEngine
+
+# Charger les variables d'environnement depuis .env manuellement (comme app.py)
+env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
+if os.path.exists(env_path):
+    with open(env_path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                os.environ.setdefault(key, value)
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017')
+MONGO_DB = os.environ.get('MONGO_DB', 'monitoring')
+MONGO_COLLECTION = os.environ.get('MONGO_COLLECTION', 'uploads')
+ES_HOST = os.environ.get('ELASTICSEARCH_HOST', os.environ.get('ES_HOST', 'http://localhost:9200'))
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', '6379'))
+KIBANA_HOST = os.environ.get('KIBANA_HOST', 'http://localhost:5601')
+LOGSTASH_HOST = os.environ.get('LOGSTASH_HOST', 'http://localhost:9600')
+HEALTH_DEADLINE = float(os.environ.get('HEALTH_PROBE_DEADLINE', '5'))
+HEALTH_CACHE_TTL = float(os.environ.get('HEALTH_CACHE_TTL', '5'))
+
+# Statistiques calculées ici (sans rollups ni sélection des index) : clé distincte de
+# StatsEngine.CACHE_KEY, que seuls les workers Flask écrivent
+STATS_CACHE_KEY = 'logstream:stats:async'
+
+SEARCH_RATE_LIMITS = [
+    RateLimitRule('search_user', os.environ.get('RATE_LIMIT_SEARCH_USER', '10/1'), None, 'token_bucket'),
+    RateLimitRule('search_ip', os.environ.get('RATE_LIMIT_SEARCH_IP', '30/1'), None, 'token_bucket'),
+]
+
+
+class AsyncClients:
+    """Clients asynchrones créés à la première utilisation, dans la boucle du worker"""
+
+    def __init__(self, pool_config=None):
+        self.pool_config = pool_config or db_manager.pool_config
+        self._clients = {}
+        self.errors = {}
+
+    def _get(self, name, factory):
+        if name not in self._clients:
+            try:
+                self._clients[name] = factory()
+            except Exception as e:
+                # Dépendance absente (aiohttp, motor, httpx) ou configuration invalide
+                self._clients[name] = None
+                self.errors[name] = str(e)
+                print(f"Async client unavailable ({name}): {e}")
+        return self._clients[name]
+
+    def es(self):
+        def factory():
+            if AsyncElasticsearch is None:
+                raise ImportError('elasticsearch[async] is not installed')
+            config = self.pool_config['elasticsearch']
+            return AsyncElasticsearch(
+                [ES_HOST],
+                connections_per_node=config['connections_per_node'],
+                request_timeout=config['request_timeout'],
+                max_retries=config['max_retries']
+            )
+        return self._get('elasticsearch', factory)
+
+    def mongo_db(self):
+        def factory():
+            if AsyncIOMotorClient is None:
+                raise ImportError('motor is not installed')
+            config = self.pool_config['mongodb']
+            client = AsyncIOMotorClient(
+                MONGO_URI,
+                maxPoolSize=config['max_pool_size'],
+                maxIdleTimeMS=config['max_idle_time_ms'],
+                serverSelectionTimeoutMS=config['connect_timeout_ms'],
+                connectTimeoutMS=config['connect_timeout_ms'],
+                socketTimeoutMS=config['socket_timeout_ms']
+            )
+            return client[MONGO_DB]
+        return self._get('mongodb', factory)
+
+    def redis(self):
+        def factory():
+            if redis_asyncio is None:
+                raise ImportError('redis.asyncio is not available')
+            config = self.pool_config['redis']
+            return redis_asyncio.Redis(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                max_connections=config['max_connections'],
+                socket_connect_timeout=config['connect_timeout'],
+                socket_timeout=config['socket_timeout'],
+                socket_keepalive=True,
+                decode_responses=True
+            )
+        return self._get('redis', factory)
+
+    def http(self):
+        def factory():
+            if httpx is None:
+                raise ImportError('httpx is not installed')
+            size = self.pool_config['http']['pool_size']
+            return httpx.AsyncClient(limits=httpx.Limits(max_connections=size, max_keepalive_connections=size))
+        return self._get('http', factory)
+
+    async def close(self):
+        for name, client in list(self._clients.items()):
+            if client is None:
+                continue
+            try:
+                if name == 'mongodb':
+                    client.client.close()
+                elif name == 'redis':
+                    await client.close()
+                elif name == 'http':
+                    await client.aclose()
+                else:
+                    await client.close()
+            except Exception as e:
+                print(f"Error closing async client ({name}): {e}")
+        self._clients = {}
+
+
+class AsyncAPI:
+    """Application ASGI des endpoints dominés par les entrées/sorties"""
+
+    def __init__(self, clients=None, auth_manager=None, rate_limiter=None, search_history=None):
+        """
+        Args:
+            clients (AsyncClients): Clients asynchrones (créés à la demande par défaut)
+            auth_manager (AuthManager): Vérification des tokens (mêmes tokens et révocations que Flask)
+            rate_limiter (RateLimiter): Limiteur partagé avec les workers Flask (compteurs Redis)
+            search_history: Écrivain différé de l'historique de recherche
+        """
+        self.clients = clients or AsyncClients()
+        self.auth_manager = auth_manager
+        self.rate_limiter = rate_limiter
+        self.search_history = search_history
+
+        # Mêmes clés de cache de recherche que les workers Flask ; leurs statistiques sont lues, jamais écrites
+        self.search_cache = SearchCache()
+        self.stats_engine = StatsEngine(es_getter=lambda: None)
+
+        # Un seul calcul en cours par endpoint et par worker (les autres requêtes l'attendent)
+        self._inflight = {}
+        self._local = {}
+        # Redis en panne : le cache mémoire prend le relais pendant le backoff (pas d'attente par requête)
+        self._redis_down_until = 0.0
+        self._metrics = {'requests': 0, 'in_flight': 0, 'max_in_flight': 0, 'stats_computations': 0,
+                         'health_checks': 0, 'errors': 0}
+
+        self.routes = {
+            '/api/search': self.search,
+            '/api/stats': self.stats,
+            '/api/health': self.health,
+            '/api/async/metrics': self.metrics,
+        }
+
+    # ------------------------------------------
+    #  Outils
+    # ------------------------------------------
+
+    async def _single_flight(self, name, factory):
+        """Partage le résultat d'un calcul entre toutes les requêtes arrivées pendant celui-ci"""
+        task = self._inflight.get(name)
+        if task is None or task.done():
+            task = asyncio.ensure_future(factory())
+            self._inflight[name] = task
+        return await asyncio.shield(task)
+
+    def _local_get(self, name):
+        entry = self._local.get(name)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        return None
+
+    def _redis(self):
+        if time.time() < self._redis_down_until:
+            return None
+        return self.clients.redis()
+
+    async def _redis_call(self, method, *args, **kwargs):
+        redis_client = self._redis()
+        if redis_client is None:
+            return None
+        try:
+            return await getattr(redis_client, method)(*args, **kwargs)
+        except Exception as e:
+            self._redis_down_until = time.time() + self.clients.pool_config['reconnect']['min_backoff'] * 5
+            print(f"Async Redis error ({method}): {e}")
+            return None
+
+    # ------------------------------------------
+    #  /api/stats
+    # ------------------------------------------
+
+    async def stats(self, request):
+        """Statistiques du tableau de bord (cache partagé, sous-requêtes concurrentes)"""
+        cached = self._local_get('stats')
+        if cached is None:
+            # Résultat des workers Flask en priorité, sinon celui d'un autre worker asynchrone
+            values = await self._redis_call('mget', [StatsEngine.CACHE_KEY, STATS_CACHE_KEY]) or []
+            raw = next((value for value in values if value), None)
+            cached = json.loads(raw) if raw else None
+        if cached is None:
+            cached = await self._single_flight('stats', self.compute_stats)
+        return 200, cached
+
+    async def compute_stats(self):
+        """
+        Agrégation Elasticsearch et comptage MongoDB lancés en même temps (asyncio.gather),
+        puis comptage borné des dernières 24h (même plage que StatsEngine.count_recent)
+
+        Returns:
+            dict: Statistiques au format de /api/stats
+        """
+        self._metrics['stats_computations'] += 1
+        stats = {
+            'total_logs': 0,
+            'logs_today': 0,
+            'errors': 0,
+            'files_uploaded': 0,
+            'timeline': []
+        }
+
+        es_client = self.clients.es()
+        mongo_db = self.clients.mongo_db()
+
+        async def nothing():
+            return None
+
+        es_response, uploads_count = await asyncio.gather(
+            es_client.search(index=self.stats_engine.index, body=StatsEngine.build_query(timeline=True)) if es_client is not None else nothing(),
+            mongo_db[MONGO_COLLECTION].count_documents({}) if mongo_db is not None else nothing(),
+            return_exceptions=True
+        )
+
+        if isinstance(es_response, Exception):
+            print(f"Error fetching Elasticsearch stats: {es_response}")
+        elif es_response is not None:
+            stats.update(StatsEngine.parse_response(es_response))
+            stats['logs_today'] = await self._count_recent(es_client, es_response)
+        if isinstance(uploads_count, Exception):
+            print(f"Error fetching MongoDB stats: {uploads_count}")
+        elif uploads_count is not None:
+            stats['files_uploaded'] = uploads_count
+
+        ttl = self.stats_engine.ttl
+        self._local['stats'] = (time.time() + ttl, stats)
+        await self._redis_call('setex', STATS_CACHE_KEY, ttl, json.dumps(stats))
+        return stats
+
+    async def _count_recent(self, es_client, response):
+        """Logs des dernières 24h avant le plus récent, sur le pattern complet"""
+        max_date_ms = response.get('aggregations', {}).get('max_date', {}).get('value')
+        if not max_date_ms:
+            return 0
+        start, end = StatsEngine.recent_window(max_date_ms)
+        try:
+            result = await es_client.count(index=self.stats_engine.index, query=StatsEngine.recent_query(start, end))
+            return result['count']
+        except Exception as e:
+            print(f"Error counting recent logs: {e}")
+            return 0
+
+    # ------------------------------------------
+    #  /api/health
+    # ------------------------------------------
+
+    async def health(self, request):
+        """Statut de tous les services, sondés en parallèle avec un délai global"""
+        cached = self._local_get('health')
+        if cached is None:
+            cached = await self._single_flight('health', self.check_health)
+        return 200, cached
+
+    async def _probe_elasticsearch(self):
+        es_client = self.clients.es()
+        if es_client is None or not await es_client.ping():
+            return unavailable(ES_HOST, 'Cannot ping Elasticsearch')
+        return elasticsearch_status(await es_client.cluster.health(), ES_HOST)
+
+    async def _probe_mongodb(self):
+        mongo_db = self.clients.mongo_db()
+        if mongo_db is None:
+            return unavailable(MONGO_URI, 'Connection not established')
+        return mongodb_status(await mongo_db.command('dbStats'), MONGO_URI, MONGO_DB)
+
+    async def _probe_redis(self):
+        url = f'redis://{REDIS_HOST}:{REDIS_PORT}'
+        redis_client = self.clients.redis()
+        if redis_client is None:
+            return unavailable(url, 'Connection not established')
+        return redis_status(await redis_client.info(), url)
+
+    async def _probe_http(self, url, parse, path=''):
+        http = self.clients.http()
+        if http is None:
+            return unavailable(url, 'httpx is not installed')
+        return parse(await http.get(f'{url}{path}', timeout=3), url)
+
+    async def check_health(self):
+        """
+        Exécute toutes les sondes concurremment
+
+        Returns:
+            dict: Format de /api/health
+        """
+        self._metrics['health_checks'] += 1
+        started = time.perf_counter()
+        probes = {
+            'elasticsearch': (ES_HOST, self._probe_elasticsearch()),
+            'mongodb': (MONGO_URI, self._probe_mongodb()),
+            'redis': (f'redis://{REDIS_HOST}:{REDIS_PORT}', self._probe_redis()),
+            'kibana': (KIBANA_HOST, self._probe_http(KIBANA_HOST, kibana_status, '/api/status')),
+            'logstash': (LOGSTASH_HOST, self._probe_http(LOGSTASH_HOST, logstash_status)),
+        }
+
+        async def timed(url, probe):
+            probe_started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(probe, HEALTH_DEADLINE)
+            except asyncio.TimeoutError:
+                result = {'status': 'error', 'url': url, 'error': f'Timeout after {HEALTH_DEADLINE:g}s'}
+            except Exception as e:
+                result = {'status': 'error', 'url': url, 'error': str(e)}
+            result['latency_ms'] = round((time.perf_counter() - probe_started) * 1000, 2)
+            return result
+
+        results = await asyncio.gather(*(timed(url, probe) for url, probe in probes.values()))
+        health = summarize(dict(zip(probes, results)), started)
+        self._local['health'] = (time.time() + HEALTH_CACHE_TTL, health)
+        return health
+
+    # ------------------------------------------
+    #  /api/search
+    # ------------------------------------------
+
+    async def _cache_get(self, key):
+        if key is None:
+            return None
+        if self._redis() is None:
+            return self.search_cache.get(key)
+        cached = await self._redis_call('get', key)
+        if cached is None:
+            return None
+        await self._redis_call('zadd', SearchCache.INDEX_KEY, {key: time.time()})
+        return json.loads(cached)
+
+    async def _cache_set(self, key, result, ttl=None):
+        if key is None:
+            return
+        if self._redis() is None:
+            self.search_cache.set(key, result, ttl)
+            return
+        ttl = min(ttl, self.search_cache.ttl) if ttl else self.search_cache.ttl
+        await self._redis_call('setex', key, ttl, json.dumps(result, default=str))
+        await self._redis_call('zadd', SearchCache.INDEX_KEY, {key: time.time()})
+
+    async def search(self, request):
+        """Recherche dans les logs (même contrat que la route Flask /api/search)"""
+        args = request['args']
+        limited = await self._check_rate_limits(request)
+        if limited is not None:
+            return limited
+
+        query_text = args.get('query', [''])[0].strip()
+        levels = parse_multi(args.get('level', []))
+        services = parse_multi(args.get('service', []))
+        date_from = args.get('date_from', [''])[0].strip()
+        date_to = args.get('date_to', [''])[0].strip()
+        try:
+            page = int(args.get('page', ['1'])[0])
+        except ValueError:
+            page = 1
+        cursor = args.get('cursor', [''])[0].strip()
+        cursor_mode = bool(cursor) or args.get('paginate', [''])[0] == 'cursor'
+
+        es_query = build_search_query(query_text, levels, services, date_from, date_to)
+        results = {
+            'success': False,
+            'total': 0,
+            'page': page,
+            'page_size': PAGE_SIZE,
+            'total_pages': 0,
+            'next_cursor': None,
+            'logs': [],
+            'query_params': {
+                'query': query_text,
+                'level': ','.join(levels),
+                'service': ','.join(services),
+                'date_from': date_from,
+                'date_to': date_to
+            }
+        }
+
+        cache_key = self.search_cache.key_for(
+            query_text=query_text, levels=levels, services=services,
+            date_from=date_from, date_to=date_to, page=page, cursor=cursor,
+            mode='cursor' if cursor_mode else 'page'
+        )
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            return 200, dict(cached, cached=True)
+
+        es_client = self.clients.es()
+        if es_client is None:
+            results['error'] = 'Elasticsearch client not available'
+            return 200, results
+
+        try:
+            if cursor_mode:
+                response, pagination = await async_search_cursor(es_client, 'logs-*', es_query, cursor or None, PAGE_SIZE)
+            else:
+                response, pagination = await async_search_page(es_client, 'logs-*', es_query, page, PAGE_SIZE)
+        except CursorError as e:
+            results['error'] = str(e)
+            return 400, results
+        except Exception as e:
+            print(f"Error searching logs: {e}")
+            results['error'] = str(e)
+            return 200, results
+
+        results['success'] = True
+        results['total'] = pagination['total']
+        results['page'] = pagination['page']
+        results['total_pages'] = pagination['total_pages']
+        results['next_cursor'] = pagination['next_cursor']
+        results['logs'] = [format_log_hit(hit) for hit in response['hits']['hits']]
+        await self._cache_set(cache_key, results, ttl=PIT_KEEP_ALIVE_SECONDS if cursor_mode else None)
+
+        if self.search_history is not None:
+            self.search_history.record({
+                'timestamp': datetime.utcnow(),
+                'query_text': query_text,
+                'level': results['query_params']['level'],
+                'service': results['query_params']['service'],
+                'date_from': date_from,
+                'date_to': date_to,
+                'results_count': results['total'],
+                'ip_address': request['client_ip']
+            })
+        return 200, results
+
+    async def _check_rate_limits(self, request):
+        limiter = self.rate_limiter
+        if limiter is None or not limiter.enabled:
+            return None
+        identities = {'search_user': request['user'].get('username'), 'search_ip': request['client_ip']}
+        for rule in SEARCH_RATE_LIMITS:
+            identity = identities.get(rule.name)
+            if identity is None:
+                continue
+            # Script Lua Redis synchrone : exécuté hors de la boucle
+            result = await asyncio.to_thread(limiter.hit, rule, identity)
+            if not result.allowed:
+                return 429, {
+                    'success': False,
+                    'error': 'Too many requests',
+                    'code': 'RATE_LIMITED',
+                    'retry_after': result.retry_after
+                }, {'Retry-After': str(result.retry_after), 'X-RateLimit-Limit': str(rule.limit),
+                    'X-RateLimit-Remaining': '0'}
+        return None
+
+    async def metrics(self, request):
+        """Requêtes en cours sur ce worker (multiplexage) et clients disponibles"""
+        if request['user'].get('role') != 'admin':
+            return 403, {'success': False, 'error': 'Admin privileges required', 'code': 'ADMIN_REQUIRED'}
+        return 200, dict(self._metrics, client_errors=self.clients.errors)
+
+    # ------------------------------------------
+    #  ASGI
+    # ------------------------------------------
+
+    async def _authenticate(self, headers):
+        token = None
+        authorization = headers.get('authorization', '')
+        if authorization.startswith('Bearer '):
+            token = authorization.split(' ')[1]
+        elif headers.get('cookie'):
+            cookie = SimpleCookie()
+            cookie.load(headers['cookie'])
+            if 'access_token' in cookie:
+                token = cookie['access_token'].value
+        if not token or self.auth_manager is None:
+            return None, (401, {'success': False, 'error': 'Authentication required', 'code': 'AUTH_REQUIRED'})
+
+        # Vérification en cache LRU ; la révocation peut interroger Redis (synchrone)
+        payload = await asyncio.to_thread(self.auth_manager.verify_token, token)
+        if not payload:
+            return None, (401, {'success': False, 'error': 'Invalid or expired token', 'code': 'TOKEN_INVALID'})
+        return payload, None
+
+    async def handle(self, scope):
+        """
+        Traite une requête HTTP
+
+        Returns:
+            tuple: (statut, corps JSON, en-têtes supplémentaires)
+        """
+        handler = self.routes.get(scope['path'])
+        if handler is None:
+            return 404, {'success': False, 'error': 'Not found'}, {}
+        if scope['method'] not in ('GET', 'HEAD'):
+            return 405, {'success': False, 'error': 'Method not allowed'}, {}
+
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+        user, error = await self._authenticate(headers)
+        if error is not None:
+            return error[0], error[1], {}
+
+        remote = (scope.get('client') or ('unknown', 0))[0]
+        request = {
+            'args': parse_qs(scope.get('query_string', b'').decode('latin-1')),
+            'user': user,
+            'client_ip': client_ip(remote, headers.get('x-real-ip'))
+        }
+        result = await handler(request)
+        if len(result) == 2:
+            return result[0], result[1], {}
+        return result
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await self.clients.close()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+
+        if scope['type'] != 'http':
+            return
+
+        self._metrics['requests'] += 1
+        self._metrics['in_flight'] += 1
+        self._metrics['max_in_flight'] = max(self._metrics['max_in_flight'], self._metrics['in_flight'])
+        try:
+            status, body, extra_headers = await self.handle(scope)
+        except Exception as e:
+            self._metrics['errors'] += 1
+            print(f"Async API error on {scope.get('path')}: {e}")
+            status, body, extra_headers = 500, {'success': False, 'error': 'Internal server error'}, {}
+        finally:
+            self._metrics['in_flight'] -= 1
+
+        payload = json.dumps(body, default=str).encode('utf-8')
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]
+        headers += [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in extra_headers.items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': payload if scope['method'] != 'HEAD' else b''})
+
+
+def create_app():
+    """
+    Application ASGI configurée comme app.py : mêmes tokens, révocations, limites
+    de débit et caches Redis que les workers Flask
+    """
+    db_manager.mongo_uri = MONGO_URI
+    db_manager.mongo_db_name = MONGO_DB
+    db_manager.redis_host = REDIS_HOST
+    db_manager.redis_port = REDIS_PORT
+    db_manager.bootstrap_indexes = False
+    db_manager.load_pool_config()
+
+    # Vérification seule (pas de connexion ici) : l'instance globale de auth.py n'est pas remplacée
+    auth_manager = AuthManager(users_getter=lambda: db_manager.get_mongo_collection('users'))
+    auth_manager.revocations = TokenRevocations(db_manager.get_redis_client)
+    return AsyncAPI(
+        auth_manager=auth_manager,
+        rate_limiter=RateLimiter(db_manager.get_redis_client),
+        search_history=init_search_history(lambda: db_manager.get_mongo_collection('search_history'))
+    )
+
+
+app = create_app()
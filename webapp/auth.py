@@ -3,32 +3,72 @@ LogStream Studio - Module d'authentification JWT
 Système d'authentification sécurisé avec support MongoDB
 """
 
+import hashlib
 import jwt
 import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import request, jsonify, session, redirect, url_for
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import request, jsonify, session, redirect, url_for, g, has_request_context
+from pymongo.errors import DuplicateKeyError
+from login_activity import init_last_login_writer
+from password_hashing import PasswordHasher, admin_password_hash
+from user_cache import UserCache, TokenRevocations
 
 
 class AuthManager:
     """Gestionnaire d'authentification JWT avec MongoDB"""
     
-    def __init__(self, users_collection=None):
+    def __init__(self, users_collection=None, hasher=None, users_getter=None):
         # Clé secrète pour JWT (en production, utiliser une clé forte)
         self.secret_key = os.environ.get('JWT_SECRET_KEY', 'logstream-secret-key-change-in-production')
         self.algorithm = 'HS256'
         self.token_expiration = int(os.environ.get('JWT_EXPIRATION_HOURS', '24'))
         
-        # Collection MongoDB pour les utilisateurs
-        self.users_col = users_collection
+        # Collection MongoDB pour les utilisateurs (ou getter du gestionnaire de connexions)
+        self._users_col = users_collection
+        self._users_getter = users_getter
+
+        # Écriture différée de last_login (None : mise à jour synchrone)
+        self.last_login_writer = None
+
+        # Profils en cache Redis et révocations (None : lecture MongoDB, pas de révocation)
+        self.user_cache = None
+        self.revocations = None
         
+        # Hachage des mots de passe hors du thread de la requête
+        self.hasher = hasher or PasswordHasher()
+
         # Credentials admin (fallback si MongoDB indisponible)
         self.admin_username = os.environ.get('ADMIN_USERNAME', 'admin')
-        self.admin_password_hash = generate_password_hash(
-            os.environ.get('ADMIN_PASSWORD', 'admin123')
-        )
+
+        # Cache des tokens vérifiés (LRU borné, entrées expirées avec le token)
+        self.token_cache_size = int(os.environ.get('TOKEN_CACHE_SIZE', '10000'))
+        self.token_cache_ttl = int(os.environ.get('TOKEN_CACHE_TTL', '300'))
+        self._token_cache = OrderedDict()
+        self._token_cache_lock = threading.Lock()
+        self._token_metrics = {'memo_hits': 0, 'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
     
+    @property
+    def users_col(self):
+        """Collection users, résolue à chaque appel si un getter est fourni (reconnexion paresseuse)"""
+        if self._users_getter is not None:
+            return self._users_getter()
+        return self._users_col
+
+    @users_col.setter
+    def users_col(self, collection):
+        self._users_col = collection
+        self._users_getter = None
+
+    @property
+    def admin_password_hash(self):
+        """Hachage du mot de passe admin, calculé une seule fois par processus"""
+        return admin_password_hash(self.hasher.method)
+
     def create_user(self, username, email, password):
         """
         Crée un nouveau utilisateur dans MongoDB
@@ -60,7 +100,7 @@ class AuthManager:
         user_doc = {
             'username': username,
             'email': email,
-            'password_hash': generate_password_hash(password),
+            'password_hash': self.hasher.hash(password),
             'role': 'user',
             'created_at': datetime.utcnow(),
             'last_login': None,
@@ -69,11 +109,19 @@ class AuthManager:
         
         try:
             result = self.users_col.insert_one(user_doc)
+            if self.user_cache is not None:
+                # Supprime un éventuel « utilisateur inconnu » mis en cache
+                self.user_cache.invalidate(username)
             return {
                 'success': True,
                 'message': 'Compte créé avec succès',
                 'user_id': str(result.inserted_id)
             }
+        except DuplicateKeyError as e:
+            # Inscription concurrente : l'index unique a refusé le doublon
+            if 'email' in str(e):
+                return {'success': False, 'message': 'Cet email est déjà utilisé'}
+            return {'success': False, 'message': 'Ce nom d\'utilisateur est déjà utilisé'}
         except Exception as e:
             return {'success': False, 'message': f'Erreur lors de la création: {str(e)}'}
     
@@ -90,13 +138,19 @@ class AuthManager:
         """
         # Vérifier d'abord dans MongoDB si disponible
         if self.users_col is not None:
-            user = self.users_col.find_one({'username': username, 'is_active': True})
-            if user and check_password_hash(user['password_hash'], password):
-                # Mettre à jour last_login
-                self.users_col.update_one(
-                    {'_id': user['_id']},
-                    {'$set': {'last_login': datetime.utcnow()}}
-                )
+            user = self._find_credentials(username)
+            if user and self.hasher.verify(user['password_hash'], password):
+                # Mise à niveau transparente vers la méthode de hachage configurée
+                if self.hasher.needs_rehash(user['password_hash']):
+                    self._rehash_password(user, password)
+                # Mettre à jour last_login (en arrière-plan si possible)
+                if self.last_login_writer is not None:
+                    self.last_login_writer.record(user['_id'])
+                else:
+                    self.users_col.update_one(
+                        {'_id': user['_id']},
+                        {'$set': {'last_login': datetime.utcnow()}}
+                    )
                 return {
                     'valid': True,
                     'user': {
@@ -107,7 +161,7 @@ class AuthManager:
                 }
         
         # Fallback sur le compte admin par défaut
-        if username == self.admin_username and check_password_hash(self.admin_password_hash, password):
+        if username == self.admin_username and self.hasher.verify(self.admin_password_hash, password):
             return {
                 'valid': True,
                 'user': {
@@ -119,6 +173,33 @@ class AuthManager:
         
         return False
     
+    def _find_credentials(self, username):
+        """
+        Utilisateur actif avec son hachage, lu dans MongoDB (une seule lecture par connexion)
+
+        Seuls les identifiants inconnus ou désactivés sont mis en cache : une rafale
+        de tentatives sur un compte inexistant n'atteint MongoDB qu'une fois
+        """
+        if self.user_cache is not None and self.user_cache.is_unknown(username):
+            return None
+        user = self.users_col.find_one({'username': username, 'is_active': True})
+        if user is None and self.user_cache is not None:
+            self.user_cache.remember_unknown(username)
+        return user
+
+    def _rehash_password(self, user, password):
+        try:
+            self.users_col.update_one(
+                {'_id': user['_id'], 'password_hash': user['password_hash']},
+                {'$set': {'password_hash': self.hasher.hash(password)}}
+            )
+            self.hasher.record_rehash()
+            if self.user_cache is not None:
+                self.user_cache.invalidate(user['username'])
+        except Exception as e:
+            # L'ancien hachage reste valide : la mise à niveau sera retentée à la prochaine connexion
+            print(f"Error upgrading password hash: {e}")
+
     def generate_token(self, user_info):
         """
         Génère un token JWT pour l'utilisateur
@@ -134,7 +215,8 @@ class AuthManager:
             'email': user_info.get('email', ''),
             'role': user_info.get('role', 'user'),
             'exp': datetime.utcnow() + timedelta(hours=self.token_expiration),
-            'iat': datetime.utcnow()
+            'iat': datetime.utcnow(),
+            'jti': uuid.uuid4().hex
         }
         
         token = jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
@@ -144,19 +226,131 @@ class AuthManager:
         """
         Vérifie la validité d'un token JWT
         
+        Le résultat est mémorisé pour la requête courante, et les tokens valides
+        sont conservés dans un LRU du processus : la vérification HMAC n'est faite
+        qu'une fois par token (jusqu'à son expiration ou TOKEN_CACHE_TTL).
+        
         Args:
             token (str): Token JWT à vérifier
             
         Returns:
             dict: Payload du token si valide, None sinon
         """
+        if not token:
+            return None
+
+        # check_auth() et get_current_user() relisent le même token dans la requête
+        memo = None
+        if has_request_context():
+            memo = g.setdefault('_verified_tokens', {})
+            if token in memo:
+                self._record_token(memo_hits=1)
+                return memo[token]
+
+        payload = self._cached_token(token)
+        if payload is None:
+            payload = self._decode_token(token)
+
+        # Révocation vérifiée à chaque requête (Redis), y compris pour un token en cache
+        if payload is not None and self.revocations is not None:
+            if self.revocations.is_revoked(TokenRevocations.token_id(token, payload),
+                                           payload.get('username'), payload.get('iat')):
+                payload = None
+
+        if memo is not None:
+            memo[token] = payload
+        return payload
+
+    def _decode_token(self, token):
+        self._record_token(misses=1)
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
         except jwt.ExpiredSignatureError:
             return None  # Token expiré
         except jwt.InvalidTokenError:
             return None  # Token invalide
+
+        expires_at = time.time() + self.token_cache_ttl
+        if 'exp' in payload:
+            expires_at = min(expires_at, payload['exp'])
+        with self._token_cache_lock:
+            self._token_cache[self._token_key(token)] = (expires_at, payload)
+            while len(self._token_cache) > self.token_cache_size:
+                self._token_cache.popitem(last=False)
+                self._token_metrics['evictions'] += 1
+        return dict(payload)
+
+    def _cached_token(self, token):
+        key = self._token_key(token)
+        with self._token_cache_lock:
+            entry = self._token_cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._token_cache[key]
+                self._token_metrics['expired'] += 1
+                return None
+            self._token_cache.move_to_end(key)
+            self._token_metrics['hits'] += 1
+            return dict(entry[1])
+
+    @staticmethod
+    def _token_key(token):
+        # Le token complet est haché : un payload modifié ne peut pas réutiliser une entrée
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def _record_token(self, **values):
+        with self._token_cache_lock:
+            for key, value in values.items():
+                self._token_metrics[key] += value
+
+    def invalidate_token(self, token):
+        """Retire un token du cache de vérification"""
+        if not token:
+            return
+        with self._token_cache_lock:
+            self._token_cache.pop(self._token_key(token), None)
+        if has_request_context():
+            g.pop('_verified_tokens', None)
+
+    def revoke_token(self, token):
+        """
+        Révoque un token (déconnexion) jusqu'à son expiration
+        
+        Returns:
+            bool: True si un token valide a été révoqué
+        """
+        payload = self.verify_token(token)
+        self.invalidate_token(token)
+        if payload is None or self.revocations is None:
+            return False
+        expires_at = payload.get('exp', time.time() + self.token_expiration * 3600)
+        self.revocations.revoke_token(TokenRevocations.token_id(token, payload), expires_at)
+        return True
+
+    def revoke_user(self, username):
+        """Révoque tous les tokens d'un utilisateur et retire son profil du cache"""
+        if self.revocations is not None:
+            self.revocations.revoke_user(username)
+        if self.user_cache is not None:
+            self.user_cache.invalidate(username)
+
+    def get_token_cache_metrics(self):
+        """
+        Compteurs du cache de vérification des tokens
+        
+        Returns:
+            dict: memo_hits, hits, misses, hit_ratio, entries...
+        """
+        with self._token_cache_lock:
+            metrics = dict(self._token_metrics)
+            metrics['entries'] = len(self._token_cache)
+
+        lookups = metrics['memo_hits'] + metrics['hits'] + metrics['misses']
+        metrics['hit_ratio'] = round((metrics['memo_hits'] + metrics['hits']) / lookups, 4) if lookups else 0.0
+        metrics['max_entries'] = self.token_cache_size
+        metrics['ttl_seconds'] = self.token_cache_ttl
+        return metrics
     
     def get_token_from_request(self):
         """
@@ -182,10 +376,15 @@ class AuthManager:
 auth_manager = None
 
 
-def init_auth_manager(users_collection):
-    """Initialise l'AuthManager avec la collection MongoDB"""
+def init_auth_manager(users_collection=None, redis_getter=None, users_getter=None):
+    """Initialise l'AuthManager avec la collection MongoDB (ou son getter) et le client Redis"""
     global auth_manager
-    auth_manager = AuthManager(users_collection)
+    manager = AuthManager(users_collection, users_getter=users_getter)
+    manager.last_login_writer = init_last_login_writer(lambda: manager.users_col)
+    if redis_getter is not None:
+        manager.user_cache = UserCache(redis_getter, lambda: manager.users_col)
+        manager.revocations = TokenRevocations(redis_getter, token_ttl=manager.token_expiration * 3600)
+    auth_manager = manager
     return auth_manager
 
 
@@ -252,6 +451,27 @@ def api_login_required(f):
     return decorated_function
 
 
+def admin_required(f):
+    """
+    Décorateur pour les routes API réservées aux administrateurs
+    À placer après @api_login_required (utilise request.user)
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user = getattr(request, 'user', None) or {}
+
+        if user.get('role') != 'admin':
+            return jsonify({
+                'success': False,
+                'error': 'Admin role required',
+                'code': 'FORBIDDEN'
+            }), 403
+
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
 def check_auth():
     """
     Vérifie si l'utilisateur est authentifié (pour les templates)
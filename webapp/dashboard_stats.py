@@ -0,0 +1,230 @@
+"""
+LogStream Studio - Graphes des uploads pour /dashboard
+Une seule agrégation MongoDB ($facet), limitée aux uploads de la période affichée :
+extensions et volume par jour. Les totaux, statuts et derniers uploads viennent des
+compteurs matérialisés (upload_counters)
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from upload_counters import ERROR_STATUSES
+
+
+class DashboardStats:
+    """Calcule les graphes des uploads en un aller-retour MongoDB, avec un cache court"""
+
+    CACHE_KEY = 'logstream:dashboard:uploads'
+
+    def __init__(self, uploads_getter, redis_getter=None, ttl=None, days=None):
+        """
+        Args:
+            uploads_getter (callable): Retourne la collection MongoDB uploads (ou None)
+            redis_getter (callable): Retourne le client Redis (ou None)
+            ttl (int): Durée de vie du cache en secondes
+            days (int): Nombre de jours couverts par les graphes
+        """
+        self.uploads_getter = uploads_getter
+        self.redis_getter = redis_getter or (lambda: None)
+        self.ttl = ttl if ttl is not None else int(os.environ.get('DASHBOARD_STATS_TTL', '5'))
+        self.days = days or int(os.environ.get('DASHBOARD_STATS_DAYS', '30'))
+
+        # Cache local (fallback si Redis indisponible)
+        self._local_cache = None
+        self._local_expires_at = 0
+        self._refresh_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'queries': 0,
+            'errors': 0,
+            'latency_ms_last': 0.0,
+            'latency_ms_max': 0.0
+        }
+
+    # ------------------------------------------
+    #  Agrégation
+    # ------------------------------------------
+
+    def build_pipeline(self, now=None):
+        """
+        Pipeline des graphes : le $match sur uploaded_at (index uploaded_at_desc) borne
+        l'agrégation aux uploads de la période, quelle que soit la taille de la collection
+
+        Args:
+            now (datetime): Date de référence de la période (UTC)
+
+        Returns:
+            list: Étapes de l'agrégation
+        """
+        since = ((now or datetime.utcnow()) - timedelta(days=self.days - 1)).strftime('%Y-%m-%d')
+        size = {'$ifNull': ['$size', 0]}
+        return [
+            {'$match': {'uploaded_at': {'$gte': since}}},
+            # Projection avant $facet : les champs volumineux (ingest, erreurs) ne sont pas lus
+            {'$project': {'extension': 1, 'size': 1, 'status': 1, 'uploaded_at': 1}},
+            {'$facet': {
+                'by_extension': [
+                    {'$group': {'_id': '$extension', 'count': {'$sum': 1}, 'bytes': {'$sum': size}}},
+                    {'$sort': {'count': -1, '_id': 1}},
+                    {'$limit': 10}
+                ],
+                # uploaded_at est une date ISO 8601 : ses 10 premiers caractères donnent le jour
+                'by_day': [
+                    {'$group': {
+                        '_id': {'$substrBytes': ['$uploaded_at', 0, 10]},
+                        'count': {'$sum': 1},
+                        'errors': {'$sum': {'$cond': [{'$in': ['$status', list(ERROR_STATUSES)]}, 1, 0]}},
+                        'bytes': {'$sum': size}
+                    }},
+                    {'$sort': {'_id': 1}}
+                ]
+            }}
+        ]
+
+    @staticmethod
+    def parse_result(result):
+        """
+        Transforme le document retourné par $facet au format de dashboard.html
+
+        Args:
+            result (dict): Unique document produit par build_pipeline()
+
+        Returns:
+            dict: by_extension, by_day
+        """
+        return {
+            'by_extension': [{'extension': row['_id'] or '', 'count': row['count'], 'bytes': row['bytes']}
+                             for row in result.get('by_extension', [])],
+            'by_day': [{'date': row['_id'], 'count': row['count'], 'errors': row['errors'], 'bytes': row['bytes']}
+                       for row in result.get('by_day', [])]
+        }
+
+    @staticmethod
+    def empty():
+        return {'by_extension': [], 'by_day': []}
+
+    def compute(self):
+        """
+        Exécute l'agrégation sans passer par le cache
+
+        Returns:
+            dict: Graphes (voir parse_result), ou None si MongoDB est indisponible
+        """
+        uploads_col = self.uploads_getter()
+        if uploads_col is None:
+            return None
+
+        start = time.perf_counter()
+        try:
+            result = next(iter(uploads_col.aggregate(self.build_pipeline(), allowDiskUse=True)), {})
+            return self.parse_result(result)
+        except Exception as e:
+            self._record(errors=1)
+            print(f"Error fetching dashboard stats: {e}")
+            return None
+        finally:
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+            with self._metrics_lock:
+                self._metrics['queries'] += 1
+                self._metrics['latency_ms_last'] = elapsed_ms
+                self._metrics['latency_ms_max'] = max(self._metrics['latency_ms_max'], elapsed_ms)
+
+    # ------------------------------------------
+    #  Cache
+    # ------------------------------------------
+
+    def _record(self, **values):
+        with self._metrics_lock:
+            for key, value in values.items():
+                self._metrics[key] += value
+
+    def _cache_get(self):
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                cached = redis_client.get(self.CACHE_KEY)
+                return json.loads(cached) if cached else None
+            except Exception as e:
+                print(f"Dashboard cache read error (Redis): {e}")
+
+        if self._local_cache is not None and time.time() < self._local_expires_at:
+            return self._local_cache
+        return None
+
+    def _cache_set(self, stats):
+        self._local_cache = stats
+        self._local_expires_at = time.time() + self.ttl
+
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                redis_client.setex(self.CACHE_KEY, self.ttl, json.dumps(stats))
+            except Exception as e:
+                print(f"Dashboard cache write error (Redis): {e}")
+
+    def get_stats(self):
+        """
+        Graphes depuis le cache, ou recalculés une seule fois par processus
+
+        Returns:
+            dict: Graphes (voir parse_result)
+        """
+        cached = self._cache_get()
+        if cached is not None:
+            self._record(cache_hits=1)
+            return cached
+
+        with self._refresh_lock:
+            cached = self._cache_get()
+            if cached is not None:
+                self._record(cache_hits=1)
+                return cached
+            self._record(cache_misses=1)
+            stats = self.compute()
+            if stats is None:
+                return self.empty()
+            self._cache_set(stats)
+            return stats
+
+    def invalidate(self):
+        """Vide le cache (local et Redis)"""
+        self._local_cache = None
+        self._local_expires_at = 0
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                redis_client.delete(self.CACHE_KEY)
+            except Exception:
+                pass
+
+    def get_metrics(self):
+        """
+        Compteurs du cache et latence de l'agrégation
+
+        Returns:
+            dict: Métriques courantes
+        """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        lookups = metrics['cache_hits'] + metrics['cache_misses']
+        metrics['hit_ratio'] = round(metrics['cache_hits'] / lookups, 4) if lookups else 0.0
+        metrics['ttl_seconds'] = self.ttl
+        metrics['backend'] = 'redis' if self.redis_getter() is not None else 'memory'
+        return metrics
+
+
+# Instance globale (sera initialisée dans app.py avec les accesseurs)
+dashboard_stats = None
+
+
+def init_dashboard_stats(uploads_getter, redis_getter=None, **kwargs):
+    """Initialise le service des graphes du tableau de bord"""
+    global dashboard_stats
+    dashboard_stats = DashboardStats(uploads_getter, redis_getter, **kwargs)
+    return dashboard_stats
@@ -1,20 +1,133 @@
 """
 LogStream Studio - Database Module
-Gestion centralisée des connexions MongoDB et Redis
+Gestion centralisée des connexions : pools MongoDB, Redis, Elasticsearch et HTTP,
+reconnexion paresseuse après une panne et statistiques d'utilisation des pools
 """
 
 import os
 import sys
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+import threading
+import time
+from pymongo import MongoClient, ASCENDING, DESCENDING, monitoring
+from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, OperationFailure
 import redis
+from elasticsearch import Elasticsearch
 from redis.exceptions import ConnectionError as RedisConnectionError
 from datetime import datetime
 
 
+UPLOADS_COLLECTION = os.environ.get('MONGO_COLLECTION', 'uploads')
+
+# Index créés au démarrage (idempotent : un index existant identique est conservé)
+INDEX_SPECS = [
+    {'collection': 'users', 'keys': [('username', ASCENDING)], 'name': 'username_unique', 'unique': True},
+    {'collection': 'users', 'keys': [('email', ASCENDING)], 'name': 'email_unique', 'unique': True,
+     'partialFilterExpression': {'email': {'$type': 'string'}}},
+    {'collection': UPLOADS_COLLECTION, 'keys': [('uploaded_at', DESCENDING)], 'name': 'uploaded_at_desc'},
+    {'collection': UPLOADS_COLLECTION, 'keys': [('status', ASCENDING)], 'name': 'status'},
+    {'collection': 'search_history', 'keys': [('timestamp', DESCENDING)], 'name': 'timestamp_desc'},
+]
+
+# Requêtes de l'application dont la couverture par un index est vérifiée (explain)
+INDEXED_QUERIES = [
+    {'name': 'create_user: username or email exists', 'collection': 'users',
+     'filter': {'$or': [{'username': 'x'}, {'email': 'x'}]}},
+    {'name': 'verify_credentials: active user by username', 'collection': 'users',
+     'filter': {'username': 'x', 'is_active': True}},
+    {'name': 'dashboard: recent uploads', 'collection': UPLOADS_COLLECTION,
+     'filter': {}, 'sort': [('uploaded_at', DESCENDING)], 'limit': 10},
+    {'name': 'dashboard: uploads by status', 'collection': UPLOADS_COLLECTION,
+     'filter': {'status': {'$in': ['saved', 'processed']}}},
+    {'name': 'search history: latest searches', 'collection': 'search_history',
+     'filter': {}, 'sort': [('timestamp', DESCENDING)], 'limit': 50},
+]
+
+
+def plan_stages(plan):
+    """Liste les étapes d'un plan d'exécution MongoDB (winningPlan)"""
+    stages = [plan.get('stage', '')]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages.extend(plan_stages(plan[key]))
+    for child in plan.get('inputStages', []):
+        stages.extend(plan_stages(child))
+    return stages
+
+
+class MongoPoolStats(monitoring.ConnectionPoolListener):
+    """Compteurs du pool de connexions MongoDB (événements CMAP du driver)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {'created': 0, 'closed': 0, 'checked_out': 0, 'max_checked_out': 0,
+                      'checkouts': 0, 'checkout_failures': 0, 'pool_clears': 0}
+
+    def _update(self, name, delta=1):
+        with self._lock:
+            self.stats[name] += delta
+            if name == 'checked_out':
+                self.stats['max_checked_out'] = max(self.stats['max_checked_out'], self.stats['checked_out'])
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['open'] = stats['created'] - stats['closed']
+        return stats
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update('pool_clears')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update('created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update('closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._update('checkout_failures')
+
+    def connection_checked_out(self, event):
+        self._update('checkouts')
+        self._update('checked_out')
+
+    def connection_checked_in(self, event):
+        self._update('checked_out', -1)
+
+
+def _urllib3_pool_stats(pools):
+    """Connexions créées / inactives / requêtes pour une liste de pools urllib3"""
+    stats = {'pools': 0, 'connections_created': 0, 'idle': 0, 'requests': 0, 'max_size': 0}
+    for pool in pools:
+        stats['pools'] += 1
+        stats['connections_created'] += getattr(pool, 'num_connections', 0)
+        stats['requests'] += getattr(pool, 'num_requests', 0)
+        queue = getattr(pool, 'pool', None)
+        if queue is not None:
+            stats['idle'] += queue.qsize()
+            stats['max_size'] += queue.maxsize
+    return stats
+
+
 class DatabaseManager:
     """Gestionnaire centralisé des connexions aux bases de données"""
     
+    SERVICES = ('mongodb', 'redis', 'elasticsearch')
+    
     def __init__(self):
         # Configuration MongoDB
         self.mongo_uri = os.environ.get('MONGO_URI', 'mongodb://mongodb:27017')
@@ -28,9 +141,91 @@ class DatabaseManager:
         self.redis_db = int(os.environ.get('REDIS_DB', '0'))
         self.redis_client = None
         
+        # Configuration Elasticsearch et HTTP (Kibana, Logstash)
+        self.es_host = os.environ.get('ELASTICSEARCH_HOST', os.environ.get('ES_HOST', 'http://elasticsearch:9200'))
+        self.es_client = None
+        self.http_session = None
+        
+        # Pools : tailles, keep-alive et délais
+        self.load_pool_config()
+        self.mongo_pool_stats = MongoPoolStats()
+        
+        # Index créés à la première connexion MongoDB
+        self.bootstrap_indexes = True
+        self.index_status = []
+        
         # État des connexions
         self.mongo_connected = False
         self.redis_connected = False
+        self.es_connected = False
+        
+        self.warmup_enabled = False
+        self._reset_state()
+    
+    def _reset_state(self):
+        """État de reconnexion et de préchauffage (verrous neufs, aucun thread)"""
+        # Reconnexion paresseuse : une tentative au plus par intervalle (backoff exponentiel)
+        self._reconnect_locks = {service: threading.Lock() for service in self.SERVICES}
+        self._reconnect_state = {service: {'failures': 0, 'next_attempt': 0.0, 'last_error': None}
+                                 for service in self.SERVICES}
+        
+        # Préchauffage en arrière-plan : un thread par service, les requêtes n'attendent jamais
+        self.started_at = time.time()
+        self.connected_at = {service: None for service in self.SERVICES}
+        self._warmup_threads = {}
+        self._warmup_wakeup = {service: threading.Event() for service in self.SERVICES}
+        self._warmup_stop = threading.Event()
+        self._warmup_lock = threading.Lock()
+    
+    def reset_after_fork(self):
+        """
+        À appeler dans un processus fils (worker gunicorn, pool de processus) : les clients
+        et verrous hérités du parent ne sont pas réutilisables, ils sont recréés à la demande.
+        Le préchauffage n'est pas relancé (voir start_warmup).
+        """
+        self.mongo_client = None
+        self.mongo_db = None
+        self.redis_client = None
+        self.es_client = None
+        self.http_session = None
+        self.mongo_connected = False
+        self.redis_connected = False
+        self.es_connected = False
+        self.warmup_enabled = False
+        self.mongo_pool_stats = MongoPoolStats()
+        self._reset_state()
+    
+    def load_pool_config(self):
+        """Lit la configuration des pools depuis l'environnement"""
+        env = os.environ.get
+        self.pool_config = {
+            'mongodb': {
+                'max_pool_size': int(env('MONGO_MAX_POOL_SIZE', '50')),
+                'min_pool_size': int(env('MONGO_MIN_POOL_SIZE', '0')),
+                'max_idle_time_ms': int(env('MONGO_MAX_IDLE_TIME_MS', '60000')),
+                'wait_queue_timeout_ms': int(env('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000')),
+                'connect_timeout_ms': int(env('MONGO_CONNECT_TIMEOUT_MS', '2000')),
+                'socket_timeout_ms': int(env('MONGO_SOCKET_TIMEOUT_MS', '5000')),
+            },
+            'redis': {
+                'max_connections': int(env('REDIS_MAX_CONNECTIONS', '50')),
+                'connect_timeout': float(env('REDIS_CONNECT_TIMEOUT', '2')),
+                'socket_timeout': float(env('REDIS_SOCKET_TIMEOUT', '5')),
+                'health_check_interval': int(env('REDIS_HEALTH_CHECK_INTERVAL', '30')),
+            },
+            'elasticsearch': {
+                'connections_per_node': int(env('ES_CONNECTIONS_PER_NODE', '10')),
+                'request_timeout': float(env('ES_REQUEST_TIMEOUT', '5')),
+                'max_retries': int(env('ES_MAX_RETRIES', '1')),
+            },
+            'http': {
+                'pool_size': int(env('HTTP_POOL_SIZE', '10')),
+            },
+            'reconnect': {
+                'min_backoff': float(env('DB_RECONNECT_MIN_BACKOFF', '1')),
+                'max_backoff': float(env('DB_RECONNECT_MAX_BACKOFF', '60')),
+            }
+        }
     
     def connect_mongodb(self):
         """
@@ -41,12 +236,20 @@ class DatabaseManager:
         """
         try:
             print(f"🔄 Connexion à MongoDB: {self.mongo_uri}...")
-            self.mongo_client = MongoClient(
-                self.mongo_uri,
-                serverSelectionTimeoutMS=5000,
-                connectTimeoutMS=5000,
-                socketTimeoutMS=5000
-            )
+            if self.mongo_client is None:
+                # Le client (et son pool) est conservé : il se reconnecte de lui-même après une panne
+                config = self.pool_config['mongodb']
+                self.mongo_client = MongoClient(
+                    self.mongo_uri,
+                    maxPoolSize=config['max_pool_size'],
+                    minPoolSize=config['min_pool_size'],
+                    maxIdleTimeMS=config['max_idle_time_ms'],
+                    waitQueueTimeoutMS=config['wait_queue_timeout_ms'],
+                    serverSelectionTimeoutMS=config['connect_timeout_ms'],
+                    connectTimeoutMS=config['connect_timeout_ms'],
+                    socketTimeoutMS=config['socket_timeout_ms'],
+                    event_listeners=[self.mongo_pool_stats]
+                )
             
             # Test de la connexion
             self.mongo_client.server_info()
@@ -54,7 +257,8 @@ class DatabaseManager:
             self.mongo_connected = True
             
             print(f"✅ MongoDB connecté: {self.mongo_db_name}")
-            print(f"   Collections disponibles: {self.mongo_db.list_collection_names()}")
+            if self.bootstrap_indexes:
+                self.index_status = self.ensure_indexes(self.mongo_db)
             return True
             
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
@@ -75,14 +279,20 @@ class DatabaseManager:
         """
         try:
             print(f"🔄 Connexion à Redis: {self.redis_host}:{self.redis_port}...")
-            self.redis_client = redis.Redis(
-                host=self.redis_host,
-                port=self.redis_port,
-                db=self.redis_db,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-                decode_responses=True
-            )
+            if self.redis_client is None:
+                config = self.pool_config['redis']
+                pool = redis.ConnectionPool(
+                    host=self.redis_host,
+                    port=self.redis_port,
+                    db=self.redis_db,
+                    max_connections=config['max_connections'],
+                    socket_connect_timeout=config['connect_timeout'],
+                    socket_timeout=config['socket_timeout'],
+                    socket_keepalive=True,
+                    health_check_interval=config['health_check_interval'],
+                    decode_responses=True
+                )
+                self.redis_client = redis.Redis(connection_pool=pool)
             
             # Test de la connexion
             self.redis_client.ping()
@@ -102,6 +312,36 @@ class DatabaseManager:
             print(f"❌ Erreur Redis inattendue: {e}")
             return False
     
+    def connect_elasticsearch(self):
+        """
+        Établit la connexion à Elasticsearch
+        
+        Returns:
+            bool: True si connexion réussie, False sinon
+        """
+        try:
+            print(f"🔄 Connexion à Elasticsearch: {self.es_host}...")
+            if self.es_client is None:
+                config = self.pool_config['elasticsearch']
+                self.es_client = Elasticsearch(
+                    [self.es_host],
+                    connections_per_node=config['connections_per_node'],
+                    request_timeout=config['request_timeout'],
+                    max_retries=config['max_retries'],
+                    retry_on_timeout=False
+                )
+            
+            if not self.es_client.ping():
+                raise ConnectionError(f'ping failed at {self.es_host}')
+            self.es_connected = True
+            print(f"✅ Elasticsearch connecté: {self.es_host}")
+            return True
+            
+        except Exception as e:
+            self.es_connected = False
+            print(f"❌ Erreur de connexion Elasticsearch: {e}")
+            return False
+    
     def connect_all(self):
         """
         Établit toutes les connexions aux bases de données
@@ -113,13 +353,15 @@ class DatabaseManager:
         print("🚀 Initialisation des connexions base de données")
         print("="*60)
         
-        mongo_status = self.connect_mongodb()
-        redis_status = self.connect_redis()
+        mongo_status = self._attempt('mongodb')
+        redis_status = self._attempt('redis')
+        es_status = self._attempt('elasticsearch')
         
         print("\n" + "="*60)
         print("📊 Résumé des connexions:")
-        print(f"   MongoDB: {'✅ Connecté' if mongo_status else '❌ Déconnecté'}")
-        print(f"   Redis:   {'✅ Connecté' if redis_status else '❌ Déconnecté'}")
+        print(f"   MongoDB:       {'✅ Connecté' if mongo_status else '❌ Déconnecté'}")
+        print(f"   Redis:         {'✅ Connecté' if redis_status else '❌ Déconnecté'}")
+        print(f"   Elasticsearch: {'✅ Connecté' if es_status else '❌ Déconnecté'}")
         print("="*60 + "\n")
         
         return {
@@ -132,9 +374,263 @@ class DatabaseManager:
                 'connected': redis_status,
                 'host': self.redis_host,
                 'port': self.redis_port
+            },
+            'elasticsearch': {
+                'connected': es_status,
+                'host': self.es_host
             }
         }
     
+    # ------------------------------------------
+    #  Reconnexion paresseuse
+    # ------------------------------------------
+    
+    def is_connected(self, service):
+        return {
+            'mongodb': self.mongo_connected,
+            'redis': self.redis_connected,
+            'elasticsearch': self.es_connected
+        }[service]
+    
+    def _attempt(self, service):
+        """Tente une connexion et planifie la suivante (backoff exponentiel) en cas d'échec"""
+        connect = {
+            'mongodb': self.connect_mongodb,
+            'redis': self.connect_redis,
+            'elasticsearch': self.connect_elasticsearch
+        }[service]
+        state = self._reconnect_state[service]
+        backoff = self.pool_config['reconnect']
+        
+        if connect():
+            state['failures'] = 0
+            state['next_attempt'] = 0.0
+            state['last_error'] = None
+            if self.connected_at[service] is None:
+                self.connected_at[service] = time.time()
+            return True
+        
+        state['failures'] += 1
+        delay = min(backoff['min_backoff'] * (2 ** (state['failures'] - 1)), backoff['max_backoff'])
+        state['next_attempt'] = time.time() + delay
+        state['last_error'] = datetime.utcnow().isoformat()
+        return False
+    
+    def ensure_connected(self, service):
+        """
+        Retourne l'état de connexion, en retentant la connexion si l'échéance du backoff
+        est passée. Un seul thread tente à la fois ; les autres ne sont jamais bloqués.
+        
+        Returns:
+            bool: True si le service est connecté
+        """
+        if self.is_connected(service):
+            return True
+        if self.warmup_enabled:
+            # La connexion est confiée au thread de préchauffage
+            self._kick_warmup(service)
+            return False
+        if time.time() < self._reconnect_state[service]['next_attempt']:
+            return False
+        lock = self._reconnect_locks[service]
+        if not lock.acquire(blocking=False):
+            return False
+        try:
+            if self.is_connected(service):
+                return True
+            return self._attempt(service)
+        finally:
+            lock.release()
+    
+    def mark_unavailable(self, service):
+        """Signale une panne constatée par l'appelant : la prochaine utilisation passera par le backoff"""
+        if service == 'mongodb':
+            self.mongo_connected = False
+        elif service == 'redis':
+            self.redis_connected = False
+        elif service == 'elasticsearch':
+            self.es_connected = False
+        state = self._reconnect_state[service]
+        state['next_attempt'] = max(state['next_attempt'], time.time() + self.pool_config['reconnect']['min_backoff'])
+        if self.warmup_enabled:
+            self._kick_warmup(service)
+    
+    # ------------------------------------------
+    #  Préchauffage en arrière-plan
+    # ------------------------------------------
+    
+    def start_warmup(self, services=None):
+        """
+        Connecte les services en arrière-plan (avec backoff) sans bloquer le démarrage.
+        Tant qu'un service n'est pas prêt, son getter retourne None immédiatement.
+        """
+        self.warmup_enabled = True
+        self._warmup_stop.clear()
+        for service in services or self.SERVICES:
+            self._kick_warmup(service)
+    
+    def stop_warmup(self):
+        self.warmup_enabled = False
+        self._warmup_stop.set()
+        for event in self._warmup_wakeup.values():
+            event.set()
+    
+    def _kick_warmup(self, service):
+        with self._warmup_lock:
+            thread = self._warmup_threads.get(service)
+            if thread is not None and thread.is_alive():
+                self._warmup_wakeup[service].set()
+                return
+            # Aussi après un fork : le thread du processus parent n'existe plus
+            thread = threading.Thread(target=self._warmup_loop, args=(service,),
+                                      name=f'db-warmup-{service}', daemon=True)
+            self._warmup_threads[service] = thread
+            thread.start()
+    
+    def _warmup_loop(self, service):
+        lock = self._reconnect_locks[service]
+        wakeup = self._warmup_wakeup[service]
+        while not self._warmup_stop.is_set():
+            with self._warmup_lock:
+                if self.is_connected(service):
+                    self._warmup_threads.pop(service, None)
+                    return
+            
+            delay = self._reconnect_state[service]['next_attempt'] - time.time()
+            if delay <= 0 and lock.acquire(blocking=False):
+                try:
+                    if not self.is_connected(service):
+                        self._attempt(service)
+                finally:
+                    lock.release()
+                continue
+            
+            wakeup.wait(min(max(delay, 0.05), self.pool_config['reconnect']['max_backoff']))
+            wakeup.clear()
+    
+    def wait_until_ready(self, services=None, timeout=10):
+        """
+        Attend la connexion des services (scripts, benchmark)
+        
+        Returns:
+            bool: True si tous les services demandés sont connectés
+        """
+        services = services or self.SERVICES
+        deadline = time.time() + timeout
+        while True:
+            if all(self.is_connected(service) for service in services):
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+    
+    def startup_stats(self):
+        """
+        Délai de mise à disposition de chaque service depuis le démarrage
+        
+        Returns:
+            dict: {'warmup': bool, 'services': {service: {'connected', 'ready_after_seconds'}}}
+        """
+        return {
+            'warmup': self.warmup_enabled,
+            'services': {
+                service: {
+                    'connected': self.is_connected(service),
+                    'ready_after_seconds': round(self.connected_at[service] - self.started_at, 3)
+                    if self.connected_at[service] is not None else None
+                }
+                for service in self.SERVICES
+            }
+        }
+    
+    def ensure_indexes(self, db=None):
+        """
+        Crée les index de l'application s'ils n'existent pas (idempotent)
+        
+        Args:
+            db (Database): Base MongoDB (par défaut celle du gestionnaire)
+            
+        Returns:
+            list: Résultat par index {'collection', 'name', 'status', 'error'}
+        """
+        db = db if db is not None else self.mongo_db
+        if db is None:
+            print("⚠️  MongoDB non connecté, index non créés")
+            return []
+        
+        results = []
+        for spec in INDEX_SPECS:
+            options = {k: v for k, v in spec.items() if k not in ('collection', 'keys')}
+            result = {'collection': spec['collection'], 'name': spec['name']}
+            try:
+                db[spec['collection']].create_index(spec['keys'], **options)
+                result['status'] = 'ok'
+            except OperationFailure as e:
+                # Doublons existants (index unique) ou index de même nom avec d'autres options
+                result['status'] = 'error'
+                result['error'] = str(e)
+                print(f"❌ Index {spec['collection']}.{spec['name']}: {e}")
+            except Exception as e:
+                result['status'] = 'error'
+                result['error'] = str(e)
+            results.append(result)
+        
+        created = sum(1 for r in results if r['status'] == 'ok')
+        print(f"✅ Index MongoDB: {created}/{len(results)} en place")
+        return results
+    
+    def index_coverage(self, db=None):
+        """
+        Indique quelles requêtes de l'application utilisent un index (explain)
+        
+        Returns:
+            list: {'query', 'collection', 'covered', 'stages', 'indexes'} par requête
+        """
+        db = db if db is not None else self.mongo_db
+        if db is None:
+            return []
+        
+        report = []
+        for query in INDEXED_QUERIES:
+            entry = {'query': query['name'], 'collection': query['collection']}
+            try:
+                cursor = db[query['collection']].find(query['filter'])
+                if 'sort' in query:
+                    cursor = cursor.sort(query['sort'])
+                if 'limit' in query:
+                    cursor = cursor.limit(query['limit'])
+                plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+                stages = plan_stages(plan)
+                entry['stages'] = stages
+                entry['covered'] = 'COLLSCAN' not in stages and any('IXSCAN' in stage for stage in stages)
+                entry['indexes'] = sorted(set(self._plan_indexes(plan)))
+            except Exception as e:
+                entry['covered'] = False
+                entry['error'] = str(e)
+            report.append(entry)
+        return report
+    
+    @classmethod
+    def _plan_indexes(cls, plan):
+        names = [plan['indexName']] if 'indexName' in plan else []
+        for key in ('inputStage', 'queryPlan'):
+            if key in plan:
+                names.extend(cls._plan_indexes(plan[key]))
+        for child in plan.get('inputStages', []):
+            names.extend(cls._plan_indexes(child))
+        return names
+    
+    def get_mongo_db(self):
+        """
+        Récupère la base MongoDB (reconnexion paresseuse)
+        
+        Returns:
+            Database: Base MongoDB ou None si non connecté
+        """
+        if not self.ensure_connected('mongodb'):
+            return None
+        return self.mongo_db
+    
     def get_mongo_collection(self, collection_name):
         """
         Récupère une collection MongoDB
@@ -145,25 +641,97 @@ class DatabaseManager:
         Returns:
             Collection: Collection MongoDB ou None si non connecté
         """
-        if not self.mongo_connected or self.mongo_db is None:
-            print(f"⚠️  MongoDB non connecté, impossible d'accéder à {collection_name}")
+        db = self.get_mongo_db()
+        if db is None:
             return None
         
-        return self.mongo_db[collection_name]
+        return db[collection_name]
     
     def get_redis_client(self):
         """
-        Récupère le client Redis
+        Récupère le client Redis (reconnexion paresseuse)
         
         Returns:
             Redis: Client Redis ou None si non connecté
         """
-        if not self.redis_connected or self.redis_client is None:
-            print("⚠️  Redis non connecté")
+        if not self.ensure_connected('redis'):
             return None
         
         return self.redis_client
     
+    def get_es_client(self):
+        """
+        Récupère le client Elasticsearch (reconnexion paresseuse)
+        
+        Returns:
+            Elasticsearch: Client Elasticsearch ou None si non connecté
+        """
+        if not self.ensure_connected('elasticsearch'):
+            return None
+        
+        return self.es_client
+    
+    def get_http_session(self):
+        """
+        Session HTTP partagée (keep-alive) pour Kibana et Logstash
+        
+        Returns:
+            requests.Session: Session avec pool de connexions
+        """
+        if self.http_session is None:
+            from health_probes import create_http_session
+            self.http_session = create_http_session(self.pool_config['http']['pool_size'])
+        return self.http_session
+    
+    def pool_stats(self):
+        """
+        Utilisation des pools de connexions
+        
+        Returns:
+            dict: Par service : configuration, connexions ouvertes / utilisées / inactives
+        """
+        stats = {}
+        
+        mongo = {'connected': self.mongo_connected, 'config': self.pool_config['mongodb']}
+        mongo.update(self.mongo_pool_stats.snapshot())
+        stats['mongodb'] = mongo
+        
+        redis_stats = {'connected': self.redis_connected, 'config': self.pool_config['redis']}
+        if self.redis_client is not None:
+            pool = self.redis_client.connection_pool
+            redis_stats['created'] = getattr(pool, '_created_connections', 0)
+            redis_stats['idle'] = len(getattr(pool, '_available_connections', []))
+            redis_stats['in_use'] = len(getattr(pool, '_in_use_connections', []))
+        stats['redis'] = redis_stats
+        
+        es_stats = {'connected': self.es_connected, 'config': self.pool_config['elasticsearch']}
+        if self.es_client is not None:
+            try:
+                nodes = list(self.es_client.transport.node_pool.all())
+                es_stats['nodes'] = len(nodes)
+                es_stats.update(_urllib3_pool_stats([getattr(node, 'pool', None) for node in nodes
+                                                     if getattr(node, 'pool', None) is not None]))
+            except Exception as e:
+                es_stats['error'] = str(e)
+        stats['elasticsearch'] = es_stats
+        
+        http_stats = {'config': self.pool_config['http']}
+        if self.http_session is not None:
+            adapter = self.http_session.get_adapter('http://')
+            pools = [adapter.poolmanager.pools[key] for key in list(adapter.poolmanager.pools.keys())]
+            http_stats.update(_urllib3_pool_stats(pools))
+        stats['http'] = http_stats
+        stats['startup'] = self.startup_stats()
+        
+        for service in self.SERVICES:
+            state = self._reconnect_state[service]
+            stats[service]['reconnect'] = {
+                'failures': state['failures'],
+                'next_attempt_in': round(max(state['next_attempt'] - time.time(), 0), 1),
+                'last_error': state['last_error']
+            }
+        return stats
+    
     def health_check(self):
         """
         Vérifie l'état de santé des connexions
@@ -226,6 +794,7 @@ class DatabaseManager:
     def close_all(self):
         """Ferme toutes les connexions"""
         print("\n🔌 Fermeture des connexions...")
+        self.stop_warmup()
         
         if self.mongo_client:
             self.mongo_client.close()
@@ -235,12 +804,23 @@ class DatabaseManager:
             self.redis_client.close()
             print("   ✅ Redis déconnecté")
         
+        if self.es_client:
+            self.es_client.close()
+            print("   ✅ Elasticsearch déconnecté")
+        
+        if self.http_session:
+            self.http_session.close()
+        
         print("👋 Toutes les connexions ont été fermées\n")
 
 
 # Instance globale du gestionnaire de base de données
 db_manager = DatabaseManager()
 
+# Les clients MongoDB/Elasticsearch ne supportent pas fork() : chaque fils repart de zéro
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=db_manager.reset_after_fork)
+
 
 def init_databases():
     """
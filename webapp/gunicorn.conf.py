@@ -0,0 +1,87 @@
+"""
+LogStream Studio - Configuration gunicorn (serveur de production)
+Usage: gunicorn -c gunicorn.conf.py wsgi:app
+
+Les routes passent l'essentiel de leur temps à attendre Elasticsearch, MongoDB et Redis :
+workers 'gthread' (plusieurs threads par processus) par défaut, 'gevent' si installé.
+"""
+
+import multiprocessing
+import os
+
+
+# ============================================
+#  ÉCOUTE ET WORKERS
+# ============================================
+
+bind = os.environ.get('WEB_BIND', f"0.0.0.0:{os.environ.get('FLASK_RUN_PORT', '8000')}")
+workers = int(os.environ.get('WEB_WORKERS', str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('WEB_THREADS', '8'))
+# Un abonné SSE (/api/stream) occupe un thread pendant toute la connexion : avec gthread,
+# LIVE_STREAM_MAX_SUBSCRIBERS (défaut : threads / 2) plafonne les flux par worker, au-delà
+# le client reçoit un 503 et bascule sur le polling. Pour des centaines de tableaux de bord
+# ouverts, servir /api/stream par une instance gevent (WEB_WORKER_CLASS=gevent, sans plafond).
+# gevent : nombre de greenlets simultanés par worker
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', '1000'))
+
+# Keep-alive derrière nginx (doit rester inférieur au keepalive_timeout du proxy)
+keepalive = int(os.environ.get('WEB_KEEPALIVE', '5'))
+# Les flux SSE (/api/stream) gardent la connexion : le délai ne concerne que les workers bloqués
+timeout = int(os.environ.get('WEB_TIMEOUT', '60'))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30'))
+
+# Recyclage des workers (fuites mémoire), étalé pour ne pas tous les redémarrer en même temps
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', '500'))
+
+# Import de l'application une seule fois dans le maître (mémoire partagée copy-on-write).
+# Les connexions sont recréées dans chaque worker (voir post_fork).
+preload_app = os.environ.get('WEB_PRELOAD', '1') == '1'
+# Rechargement à chaque modification du code (développement, incompatible avec preload)
+reload = os.environ.get('WEB_RELOAD', '0') == '1'
+if reload:
+    preload_app = False
+
+# Le maître n'ouvre aucune connexion : le mode de démarrage choisi s'applique dans les workers
+STARTUP_MODE = os.environ.get('DB_STARTUP_MODE', 'background')
+if preload_app:
+    os.environ['DB_STARTUP_MODE'] = 'lazy'
+
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
+proc_name = 'logstream-webapp'
+# Adresse du client transmise par nginx
+forwarded_allow_ips = os.environ.get('WEB_FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+# ============================================
+#  HOOKS
+# ============================================
+
+def when_ready(server):
+    from live_stream import default_max_subscribers
+
+    max_streams = os.environ.get('LIVE_STREAM_MAX_SUBSCRIBERS', str(default_max_subscribers()))
+    server.log.info(f"LogStream Studio: {workers} workers {worker_class} "
+                    f"({threads} threads), keep-alive {keepalive}s, preload={preload_app}, "
+                    f"SSE max/worker={max_streams if max_streams != '0' else 'unlimited'}")
+
+
+def post_fork(server, worker):
+    """Chaque worker ouvre ses propres pools de connexions (jamais ceux hérités du maître)"""
+    from database import db_manager
+
+    # Les clients hérités ont déjà été écartés par os.register_at_fork (database.py)
+    if STARTUP_MODE == 'background':
+        db_manager.start_warmup()
+    elif STARTUP_MODE == 'sync':
+        db_manager.connect_all()
+
+
+def worker_exit(server, worker):
+    """Arrêt du préchauffage (les écritures différées sont vidées par leurs handlers atexit)"""
+    from database import db_manager
+
+    db_manager.stop_warmup()
@@ -0,0 +1,172 @@
+"""
+LogStream Studio - Moniteur de santé en arrière-plan
+Échantillonnage périodique des services et historique circulaire (latence, statut) par service
+"""
+
+import math
+import os
+import threading
+import time
+from array import array
+from datetime import datetime
+
+
+# Encodage compact des statuts dans l'historique
+STATUS_CODES = {'healthy': 0, 'unhealthy': 1, 'error': 2, 'disconnected': 3}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+UNKNOWN_STATUS = 9
+
+
+class SampleRing:
+    """Tampon circulaire de taille fixe stocké dans des tableaux typés"""
+
+    def __init__(self, size):
+        self.size = size
+        self.timestamps = array('d', [0.0] * size)
+        self.latencies = array('d', [0.0] * size)
+        self.statuses = array('b', [0] * size)
+        self.count = 0
+        self.head = 0  # prochaine position d'écriture
+
+    def append(self, timestamp, latency_ms, status):
+        self.timestamps[self.head] = timestamp
+        self.latencies[self.head] = latency_ms
+        self.statuses[self.head] = STATUS_CODES.get(status, UNKNOWN_STATUS)
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def last(self, n=None):
+        """
+        Derniers échantillons, du plus ancien au plus récent
+
+        Args:
+            n (int): Nombre d'échantillons (par défaut : tout l'historique)
+
+        Returns:
+            list: [{'timestamp', 'latency_ms', 'status'}]
+        """
+        n = self.count if n is None else max(0, min(n, self.count))
+        samples = []
+        for i in range(n):
+            idx = (self.head - n + i) % self.size
+            latency = self.latencies[idx]
+            samples.append({
+                'timestamp': datetime.utcfromtimestamp(self.timestamps[idx]).isoformat() + 'Z',
+                'latency_ms': None if math.isnan(latency) else latency,
+                'status': STATUS_NAMES.get(self.statuses[idx], 'unknown')
+            })
+        return samples
+
+
+class HealthMonitor:
+    """Échantillonne la santé des services à intervalle régulier dans un thread dédié"""
+
+    def __init__(self, sampler, interval=None, history_size=None):
+        """
+        Args:
+            sampler (callable): Retourne un dict contenant 'services' (ex. HealthProber.check_all
+                ou DatabaseManager.health_check)
+            interval (float): Période d'échantillonnage en secondes
+            history_size (int): Nombre d'échantillons conservés par service
+        """
+        self.sampler = sampler
+        self.interval = interval if interval is not None else float(os.environ.get('HEALTH_MONITOR_INTERVAL', '15'))
+        self.history_size = history_size if history_size is not None else int(os.environ.get('HEALTH_HISTORY_SIZE', '240'))
+
+        self.history = {}
+        self._latest = None
+        self._lock = threading.Lock()
+        self._first_sample_lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        """
+        Exécute un échantillonnage et l'enregistre dans l'historique
+
+        Returns:
+            dict: Résultat complet du sampler
+        """
+        snapshot = self.sampler()
+        now = time.time()
+
+        with self._lock:
+            for name, service in snapshot.get('services', {}).items():
+                ring = self.history.get(name)
+                if ring is None:
+                    ring = self.history[name] = SampleRing(self.history_size)
+                latency = service.get('latency_ms')
+                ring.append(now, float('nan') if latency is None else latency, service.get('status'))
+            self._latest = snapshot
+
+        return snapshot
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            started = time.time()
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Health monitor error: {e}")
+            self._stop_event.wait(max(0.0, self.interval - (time.time() - started)))
+
+    def start(self):
+        """Démarre le thread d'échantillonnage (sans effet s'il tourne déjà)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest(self):
+        """
+        Dernier état connu, sans interroger les services
+
+        Le premier appel échantillonne de façon synchrone et démarre le moniteur.
+
+        Returns:
+            dict: Résultat du dernier échantillonnage
+        """
+        if self._latest is None:
+            with self._first_sample_lock:
+                if self._latest is None:
+                    self.sample()
+        self.start()
+        return self._latest
+
+    def get_history(self, service=None, limit=None):
+        """
+        Historique des échantillons
+
+        Args:
+            service (str): Service demandé (par défaut : tous)
+            limit (int): Nombre maximal d'échantillons par service
+
+        Returns:
+            dict: Service -> liste d'échantillons
+        """
+        with self._lock:
+            names = [service] if service else list(self.history)
+            return {
+                name: self.history[name].last(limit)
+                for name in names
+                if name in self.history
+            }
+
+
+# Instance globale (sampler fourni dans app.py)
+health_monitor = None
+
+
+def init_health_monitor(sampler, **kwargs):
+    """Initialise le moniteur de santé avec la fonction d'échantillonnage"""
+    global health_monitor
+    health_monitor = HealthMonitor(sampler, **kwargs)
+    return health_monitor
@@ -0,0 +1,265 @@
+"""
+LogStream Studio - Sondes de santé des services
+Exécution concurrente avec délai global, clients réutilisés et cache court par service
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def create_http_session(pool_size=10):
+    """
+    Session HTTP avec pool de connexions keep-alive (Kibana, Logstash)
+
+    Returns:
+        requests.Session: Session partagée
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# ============================================
+#  SONDES
+# ============================================
+
+def unavailable(url, error):
+    return {
+        'status': 'unhealthy',
+        'url': url,
+        'error': error
+    }
+
+
+def elasticsearch_status(cluster_health, url):
+    return {
+        'status': 'healthy',
+        'url': url,
+        'cluster_status': cluster_health.get('status', 'unknown'),
+        'nodes': cluster_health.get('number_of_nodes', 0),
+        'response_time': 'OK'
+    }
+
+
+def mongodb_status(db_stats, url, db_name):
+    return {
+        'status': 'healthy',
+        'url': url,
+        'database': db_name,
+        'collections': db_stats.get('collections', 0),
+        'data_size': db_stats.get('dataSize', 0)
+    }
+
+
+def redis_status(redis_info, url):
+    return {
+        'status': 'healthy',
+        'url': url,
+        'version': redis_info.get('redis_version', 'unknown'),
+        'used_memory': redis_info.get('used_memory_human', 'unknown'),
+        'connected_clients': redis_info.get('connected_clients', 0)
+    }
+
+
+def kibana_status(response, url):
+    """Statut Kibana depuis la réponse de /api/status (requests ou httpx)"""
+    if response.status_code == 200:
+        data = response.json()
+        return {
+            'status': 'healthy',
+            'url': url,
+            'version': data.get('version', {}).get('number', 'unknown'),
+            'state': data.get('status', {}).get('overall', {}).get('state', 'unknown')
+        }
+    return unavailable(url, f'HTTP {response.status_code}')
+
+
+def logstash_status(response, url):
+    """Statut Logstash depuis la réponse de l'API de monitoring (requests ou httpx)"""
+    if response.status_code == 200:
+        return {
+            'status': 'healthy',
+            'url': url,
+            'response': 'API responding'
+        }
+    return unavailable(url, f'HTTP {response.status_code}')
+
+
+def probe_elasticsearch(es_client, url):
+    """Vérifie Elasticsearch (ping + santé du cluster)"""
+    if es_client is not None and es_client.ping():
+        return elasticsearch_status(es_client.cluster.health(), url)
+    return unavailable(url, 'Cannot ping Elasticsearch')
+
+
+def probe_mongodb(mongo_client, mongo_db, url, db_name):
+    """Vérifie MongoDB (server_info + dbStats)"""
+    if mongo_client is None or mongo_db is None:
+        return unavailable(url, 'Connection not established')
+    mongo_client.server_info()
+    return mongodb_status(mongo_db.command('dbStats'), url, db_name)
+
+
+def probe_redis(redis_client, url):
+    """Vérifie Redis (INFO)"""
+    if redis_client is None:
+        return unavailable(url, 'Connection not established')
+    return redis_status(redis_client.info(), url)
+
+
+def probe_kibana(session, url, timeout=3):
+    """Vérifie Kibana (/api/status)"""
+    return kibana_status(session.get(f'{url}/api/status', timeout=timeout), url)
+
+
+def probe_logstash(session, url, timeout=3):
+    """Vérifie Logstash (API de monitoring)"""
+    return logstash_status(session.get(url, timeout=timeout), url)
+
+
+def summarize(services, started):
+    """
+    Statut global au format de /api/health
+
+    Args:
+        services (dict): Résultat par service
+        started (float): time.perf_counter() au début des vérifications
+    """
+    healthy_count = sum(1 for s in services.values() if s.get('status') == 'healthy')
+    total_count = len(services)
+
+    return {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'overall_status': 'healthy' if healthy_count == total_count else 'degraded',
+        'healthy_services': healthy_count,
+        'total_services': total_count,
+        'check_duration_ms': round((time.perf_counter() - started) * 1000, 2),
+        'services': services
+    }
+
+
+# ============================================
+#  EXÉCUTION CONCURRENTE
+# ============================================
+
+class HealthProber:
+    """Lance toutes les sondes en parallèle et met en cache le dernier résultat par service"""
+
+    def __init__(self, deadline=None, ttl=None, max_workers=8):
+        """
+        Args:
+            deadline (float): Délai global en secondes pour l'ensemble des sondes
+            ttl (float): Durée de validité d'un résultat en cache (secondes)
+            max_workers (int): Taille du pool de threads
+        """
+        self.deadline = deadline if deadline is not None else float(os.environ.get('HEALTH_PROBE_DEADLINE', '5'))
+        self.ttl = ttl if ttl is not None else float(os.environ.get('HEALTH_CACHE_TTL', '5'))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='health-probe')
+
+        # Sondes : nom -> (fonction, url)
+        self.probes = {}
+        # Dernier résultat par service : nom -> (horodatage, résultat)
+        self._cache = {}
+        # Sondes encore en cours (ne pas en relancer une seconde)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, probe, url):
+        """
+        Déclare une sonde
+
+        Args:
+            name (str): Nom du service
+            probe (callable): Fonction sans argument retournant un dict avec 'status'
+            url (str): URL affichée en cas d'erreur
+        """
+        self.probes[name] = (probe, url)
+
+    def _run_probe(self, name):
+        probe, url = self.probes[name]
+        started = time.perf_counter()
+        try:
+            result = probe()
+        except Exception as e:
+            result = {
+                'status': 'error',
+                'url': url,
+                'error': str(e)
+            }
+        result['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        with self._lock:
+            self._cache[name] = (time.time(), result)
+        return result
+
+    def check(self, names=None):
+        """
+        Exécute les sondes (en parallèle) dont le résultat en cache a expiré
+
+        Args:
+            names (list): Services à vérifier (par défaut : tous)
+
+        Returns:
+            dict: Résultat par service, dans l'ordre d'enregistrement
+        """
+        names = names or list(self.probes)
+        now = time.time()
+        results = {}
+        futures = {}
+
+        with self._lock:
+            for name in names:
+                cached = self._cache.get(name)
+                if cached and now - cached[0] < self.ttl:
+                    results[name] = dict(cached[1], cached=True)
+                    continue
+                future = self._inflight.get(name)
+                if future is None or future.done():
+                    future = self.executor.submit(self._run_probe, name)
+                    self._inflight[name] = future
+                futures[name] = future
+
+        if futures:
+            wait(futures.values(), timeout=self.deadline)
+
+        for name, future in futures.items():
+            if future.done():
+                results[name] = dict(future.result(), cached=False)
+            else:
+                results[name] = {
+                    'status': 'error',
+                    'url': self.probes[name][1],
+                    'error': f'Timeout after {self.deadline:g}s',
+                    'latency_ms': round(self.deadline * 1000, 2),
+                    'cached': False
+                }
+
+        return {name: results[name] for name in names}
+
+    def check_all(self):
+        """
+        Vérifie tous les services et calcule le statut global
+
+        Returns:
+            dict: Statut global et détail par service (format de /api/health)
+        """
+        started = time.perf_counter()
+        return summarize(self.check(), started)
+
+
+# Instance globale (sondes déclarées dans app.py)
+health_prober = None
+
+
+def init_health_prober(**kwargs):
+    """Initialise le gestionnaire de sondes"""
+    global health_prober
+    health_prober = HealthProber(**kwargs)
+    return health_prober
@@ -0,0 +1,219 @@
+"""
+LogStream Studio - Sélection des index par plage de temps
+Résout une plage de dates en liste minimale d'index concrets : index journaliers
+logs-ecommerce-YYYY.MM.dd par leur nom, autres index (et data streams) via _field_caps
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+# Nommage des index journaliers de Logstash (pipeline/ecommerce-pipeline.conf : logs-ecommerce-%{+YYYY.MM.dd})
+DAILY_INDEX_RE = re.compile(r'^(?P<prefix>.+)-(?P<day>\d{4}\.\d{2}\.\d{2})$')
+
+
+def iso(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.') + f'{value.microsecond // 1000:03d}Z'
+
+
+class IndexRouter:
+    """Index à interroger pour une plage de @timestamp, à partir de métadonnées mises en cache"""
+
+    def __init__(self, es_getter, pattern='logs-*', ttl=None, min_refresh=None):
+        """
+        Args:
+            es_getter (callable): Retourne le client Elasticsearch (ou None)
+            pattern (str): Pattern des index de logs
+            ttl (int): Durée de vie (secondes) de la liste des index et des résultats _field_caps
+            min_refresh (float): Délai minimal entre deux rechargements anticipés de la liste
+                (plage atteignant un jour dont l'index journalier n'est pas encore connu)
+        """
+        self.es_getter = es_getter
+        self.pattern = pattern
+        self.ttl = ttl if ttl is not None else int(os.environ.get('INDEX_ROUTER_TTL', '60'))
+        self.min_refresh = min_refresh if min_refresh is not None else float(os.environ.get('INDEX_ROUTER_MIN_REFRESH', '5'))
+
+        # Liste des index : {'daily': {nom: jour}, 'other': [noms]}
+        self._catalog = None
+        self._catalog_expires_at = 0
+        self._catalog_loaded_at = 0
+        # Résultats _field_caps : (début, fin) -> (expiration, index)
+        self._field_caps = {}
+        self._lock = threading.Lock()
+        self._metrics = {'catalog_refreshes': 0, 'field_caps_calls': 0, 'resolutions': 0, 'fallbacks': 0}
+
+    def _record(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self._metrics[key] += value
+
+    # ------------------------------------------
+    #  Métadonnées
+    # ------------------------------------------
+
+    @staticmethod
+    def classify(names):
+        """
+        Sépare les index journaliers (jour lu dans le nom) des autres
+
+        Returns:
+            dict: {'daily': {nom: datetime du jour}, 'other': [noms]}
+        """
+        daily, other = {}, []
+        for name in names:
+            match = DAILY_INDEX_RE.match(name)
+            if match:
+                try:
+                    daily[name] = datetime.strptime(match.group('day'), '%Y.%m.%d')
+                    continue
+                except ValueError:
+                    pass
+            other.append(name)
+        return {'daily': daily, 'other': sorted(other)}
+
+    def catalog(self):
+        """
+        Index concrets correspondant au pattern (data streams remplacés par leurs index de stockage)
+
+        Returns:
+            dict: Voir classify(), ou None si Elasticsearch est indisponible
+        """
+        if self._catalog is not None and time.time() < self._catalog_expires_at:
+            return self._catalog
+        es_client = self.es_getter()
+        if es_client is None:
+            return None
+        try:
+            resolved = es_client.indices.resolve_index(name=self.pattern)
+        except Exception as e:
+            print(f"Index catalog error: {e}")
+            return None
+
+        names = [index['name'] for index in resolved.get('indices', []) if 'data_stream' not in index]
+        for stream in resolved.get('data_streams', []):
+            names.extend(stream.get('backing_indices', []))
+        catalog = self.classify(names)
+        with self._lock:
+            self._catalog = catalog
+            self._catalog_loaded_at = time.time()
+            self._catalog_expires_at = self._catalog_loaded_at + self.ttl
+            self._field_caps = {}
+        self._record(catalog_refreshes=1)
+        return catalog
+
+    def _other_indices(self, es_client, names, start, end):
+        """Index non journaliers pouvant contenir des documents de la plage (_field_caps + index_filter)"""
+        if not names:
+            return []
+        # Résultat réutilisé pendant le TTL pour une plage arrondie à l'heure
+        key = (start.replace(minute=0, second=0, microsecond=0), end.replace(minute=0, second=0, microsecond=0))
+        cached = self._field_caps.get(key)
+        if cached is not None and time.time() < cached[0]:
+            return cached[1]
+
+        # Plage élargie aux heures entières : le résultat en cache couvre toute plage de même clé
+        response = es_client.field_caps(
+            index=','.join(names),
+            fields='@timestamp',
+            index_filter={'range': {'@timestamp': {'gte': iso(key[0]), 'lt': iso(key[1] + timedelta(hours=1))}}},
+            ignore_unavailable=True
+        )
+        indices = sorted(response.get('indices', []))
+        self._record(field_caps_calls=1)
+        with self._lock:
+            # Borne la mémoire : les plages glissantes produisent de nouvelles clés
+            if len(self._field_caps) >= 256:
+                self._field_caps = {}
+            self._field_caps[key] = (time.time() + self.ttl, indices)
+        return indices
+
+    # ------------------------------------------
+    #  Résolution
+    # ------------------------------------------
+
+    def resolve(self, start, end):
+        """
+        Index concrets pouvant contenir des documents avec start <= @timestamp <= end
+
+        Args:
+            start (datetime): Début de la plage (UTC)
+            end (datetime): Fin de la plage (UTC)
+
+        Returns:
+            list: Noms d'index (vide si aucun), ou None si les métadonnées sont indisponibles
+                  (l'appelant interroge alors le pattern complet)
+        """
+        catalog = self.catalog()
+        es_client = self.es_getter()
+        if catalog is None or es_client is None:
+            self._record(fallbacks=1)
+            return None
+
+        # Nouvel index journalier créé depuis le chargement de la liste (changement de jour)
+        latest_day = max(catalog['daily'].values(), default=None)
+        horizon = min(end, datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+        if latest_day is not None and latest_day < horizon and time.time() - self._catalog_loaded_at >= self.min_refresh:
+            self.invalidate()
+            catalog = self.catalog() or catalog
+
+        # Un index journalier contient les documents de [jour, jour + 1)
+        first_day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        indices = [name for name, day in catalog['daily'].items() if first_day <= day <= end]
+        try:
+            indices += self._other_indices(es_client, catalog['other'], start, end)
+        except Exception as e:
+            print(f"Index routing error (field_caps): {e}")
+            self._record(fallbacks=1)
+            return None
+        self._record(resolutions=1)
+        return sorted(set(indices))
+
+    def target(self, start, end):
+        """
+        Cible de recherche pour la plage : liste d'index séparés par des virgules
+
+        Returns:
+            str: Index à interroger (le pattern complet si la résolution est impossible),
+                 ou None si aucun index ne couvre la plage
+        """
+        indices = self.resolve(start, end)
+        if indices is None:
+            return self.pattern
+        return ','.join(indices) or None
+
+    def invalidate(self):
+        """Force le rechargement de la liste des index (ex. après création d'index)"""
+        with self._lock:
+            self._catalog = None
+            self._catalog_expires_at = 0
+            self._field_caps = {}
+
+    def get_metrics(self):
+        """
+        Compteurs et contenu du catalogue
+
+        Returns:
+            dict: catalog_refreshes, field_caps_calls, resolutions, fallbacks, index counts
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            catalog = self._catalog
+        metrics['pattern'] = self.pattern
+        metrics['ttl_seconds'] = self.ttl
+        metrics['daily_indices'] = len(catalog['daily']) if catalog else None
+        metrics['other_indices'] = catalog['other'] if catalog else None
+        return metrics
+
+
+# Instance globale (sera initialisée dans app.py avec le client)
+index_router = None
+
+
+def init_index_router(es_getter, **kwargs):
+    """Initialise la sélection des index par plage de temps"""
+    global index_router
+    index_router = IndexRouter(es_getter, **kwargs)
+    return index_router
@@ -0,0 +1,337 @@
+"""
+LogStream Studio - Ingestion des fichiers uploadés
+Lecture par blocs, parsing incrémental (CSV, JSON, NDJSON) et indexation directe via _bulk
+"""
+
+import codecs
+import csv
+import json
+import os
+import time
+from datetime import datetime
+
+
+CHUNK_SIZE = 64 * 1024
+
+# Formats ingérés directement et index cibles (mêmes index que les pipelines Logstash)
+INGEST_INDEX = {
+    'csv': os.environ.get('INGEST_CSV_INDEX', 'logs-saas-csv'),
+    'json': os.environ.get('INGEST_JSON_INDEX', 'logs-saas-json'),
+    'ndjson': os.environ.get('INGEST_JSON_INDEX', 'logs-saas-json'),
+}
+
+# Un enregistrement JSON plus gros que cette limite est considéré comme invalide
+MAX_RECORD_BYTES = 10 * 1024 * 1024
+
+
+class IngestError(Exception):
+    """Erreur bloquante pendant l'ingestion (format illisible, Elasticsearch indisponible)"""
+
+
+def ingest_format(filename):
+    """
+    Format d'ingestion directe d'un fichier
+
+    Returns:
+        str: 'csv', 'json' ou 'ndjson', None si le fichier n'est pas ingérable directement
+    """
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    return extension if extension in INGEST_INDEX else None
+
+
+def iter_chunks(stream, chunk_size=CHUNK_SIZE):
+    """Lit un flux binaire par blocs de taille fixe"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_lines(text_chunks):
+    """Découpe un flux de texte en lignes (fin de ligne conservée)"""
+    pending = ''
+    for text in text_chunks:
+        pending += text
+        lines = pending.split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+def iter_json_array(text_chunks):
+    """
+    Parse un tableau JSON élément par élément sans le charger entièrement
+
+    Raises:
+        IngestError: Si le flux n'est pas un tableau JSON valide
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    started = False
+
+    for text in text_chunks:
+        buffer = buffer[pos:] + text
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise IngestError('Expected a JSON array')
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Élément incomplet : attendre le bloc suivant
+                if len(buffer) - pos > MAX_RECORD_BYTES:
+                    raise IngestError('JSON record too large or malformed')
+                break
+            yield obj
+
+    if buffer[pos:].strip():
+        raise IngestError('Truncated JSON array')
+
+
+class BulkIndexer:
+    """Accumule des documents et les envoie à Elasticsearch par lots (_bulk)"""
+
+    def __init__(self, es_client, index, batch_docs=None, batch_bytes=None, on_flush=None):
+        """
+        Args:
+            es_client: Client Elasticsearch
+            index (str): Index (ou data stream) cible
+            batch_docs (int): Nombre de documents par requête _bulk
+            batch_bytes (int): Taille maximale d'une requête _bulk en octets
+            on_flush (callable): Appelée après chaque lot avec (indexés, erreurs)
+        """
+        self.es_client = es_client
+        self.index = index
+        self.batch_docs = batch_docs or int(os.environ.get('INGEST_BULK_DOCS', '1000'))
+        self.batch_bytes = batch_bytes or int(os.environ.get('INGEST_BULK_BYTES', str(5 * 1024 * 1024)))
+        self.on_flush = on_flush
+
+        self._lines = []
+        self._docs = 0
+        self._bytes = 0
+        self.indexed = 0
+        self.errors = 0
+        self.batches = 0
+        self.error_samples = []
+
+    def add(self, doc):
+        # 'create' fonctionne aussi bien avec un index classique qu'avec un data stream
+        source = json.dumps(doc, default=str)
+        self._lines.append('{"create":{}}')
+        self._lines.append(source)
+        self._docs += 1
+        self._bytes += len(source) + 14
+        if self._docs >= self.batch_docs or self._bytes >= self.batch_bytes:
+            self.flush()
+
+    def flush(self):
+        if not self._lines:
+            return
+        try:
+            response = self.es_client.bulk(operations=self._lines, index=self.index)
+        except Exception as e:
+            raise IngestError(f'Bulk indexing failed: {e}')
+
+        failed = 0
+        if response.get('errors'):
+            for item in response.get('items', []):
+                result = next(iter(item.values()))
+                if result.get('error'):
+                    failed += 1
+                    if len(self.error_samples) < 10:
+                        self.error_samples.append(str(result['error'].get('reason', result['error'])))
+        indexed = self._docs - failed
+
+        self.indexed += indexed
+        self.errors += failed
+        self.batches += 1
+        self._lines = []
+        self._docs = 0
+        self._bytes = 0
+        if self.on_flush:
+            self.on_flush(indexed, failed)
+
+
+class StreamingIngestor:
+    """Lit un fichier par blocs, le parse au fil de l'eau et l'indexe par lots"""
+
+    def __init__(self, es_client, fmt, index=None, source=None, sink=None, preview_lines=10,
+                 on_progress=None, **bulk_options):
+        """
+        Args:
+            es_client: Client Elasticsearch
+            fmt (str): 'csv', 'json' ou 'ndjson'
+            index (str): Index cible (par défaut selon le format)
+            source (str): Nom du fichier, ajouté à chaque document
+            sink (file): Fichier binaire recevant une copie des octets lus (archive)
+            preview_lines (int): Nombre de lignes de prévisualisation
+            on_progress (callable): Appelée après chaque lot avec les statistiques courantes
+        """
+        self.fmt = fmt
+        self.source = source
+        self.sink = sink
+        self.preview_lines = preview_lines
+        self.on_progress = on_progress
+
+        self.preview = []
+        self._preview_pending = ''
+        self.bytes_read = 0
+        self.rows_parsed = 0
+        self.parse_errors = 0
+        self.started_at = None
+        self.ingested_at = datetime.utcnow().isoformat() + 'Z'
+
+        self.indexer = BulkIndexer(es_client, index or INGEST_INDEX[fmt], on_flush=self._flushed, **bulk_options)
+
+    # ------------------------------------------
+    #  Lecture
+    # ------------------------------------------
+
+    def _read(self, chunks):
+        """Compte les octets, alimente l'archive et décode en texte"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        first = True
+        for chunk in chunks:
+            self.bytes_read += len(chunk)
+            if self.sink is not None:
+                self.sink.write(chunk)
+            text = decoder.decode(chunk)
+            if first:
+                text = text.lstrip('\ufeff')
+                first = False
+            self._tap_preview(text)
+            yield text
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            self._tap_preview(tail)
+            yield tail
+        if self._preview_pending and len(self.preview) < self.preview_lines:
+            self.preview.append(self._preview_pending.rstrip('\r'))
+            self._preview_pending = ''
+
+    def _tap_preview(self, text):
+        """Capture les premières lignes au passage (pas de seconde lecture du fichier)"""
+        if len(self.preview) >= self.preview_lines:
+            return
+        self._preview_pending += text
+        lines = self._preview_pending.split('\n')
+        self._preview_pending = lines.pop()[:4096]
+        for line in lines:
+            if len(self.preview) >= self.preview_lines:
+                break
+            self.preview.append(line.rstrip('\r'))
+
+    # ------------------------------------------
+    #  Parsing
+    # ------------------------------------------
+
+    def _records(self, texts):
+        if self.fmt == 'csv':
+            for row in csv.DictReader(iter_lines(texts)):
+                yield row
+            return
+
+        # JSON : tableau si le premier caractère significatif est '[', sinon NDJSON
+        texts = iter(texts)
+        head = ''
+        for text in texts:
+            head += text
+            if head.strip():
+                break
+
+        def replay():
+            yield head
+            yield from texts
+
+        if head.lstrip().startswith('['):
+            yield from iter_json_array(replay())
+            return
+
+        for line in iter_lines(replay()):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                self.parse_errors += 1
+
+    def _prepare(self, record):
+        doc = record if isinstance(record, dict) else {'message': record}
+        # Même convention que les pipelines Logstash : timestamp -> @timestamp
+        # (date d'ingestion à défaut : les data streams logs-saas-* exigent @timestamp)
+        if '@timestamp' not in doc:
+            doc['@timestamp'] = doc.get('timestamp') or self.ingested_at
+        if self.source:
+            doc['source_file'] = self.source
+        return doc
+
+    # ------------------------------------------
+    #  Exécution
+    # ------------------------------------------
+
+    def _flushed(self, indexed, failed):
+        if self.on_progress:
+            self.on_progress(self.stats())
+
+    def stats(self):
+        """
+        Statistiques courantes de l'ingestion
+
+        Returns:
+            dict: Octets lus, lignes parsées/indexées, erreurs, débit
+        """
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        return {
+            'format': self.fmt,
+            'index': self.indexer.index,
+            'bytes_read': self.bytes_read,
+            'rows_parsed': self.rows_parsed,
+            'rows_indexed': self.indexer.indexed,
+            'parse_errors': self.parse_errors,
+            'index_errors': self.indexer.errors,
+            'error_samples': list(self.indexer.error_samples),
+            'bulk_requests': self.indexer.batches,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.rows_parsed / elapsed, 1) if elapsed > 0 else 0.0
+        }
+
+    def run(self, chunks):
+        """
+        Ingère un flux de blocs binaires
+
+        Args:
+            chunks (iterable): Blocs d'octets (ex. iter_chunks(request.stream))
+
+        Returns:
+            dict: {'preview': [...], 'stats': {...}}
+
+        Raises:
+            IngestError: En cas d'erreur bloquante
+        """
+        self.started_at = time.time()
+        try:
+            for record in self._records(self._read(chunks)):
+                self.rows_parsed += 1
+                self.indexer.add(self._prepare(record))
+        except csv.Error as e:
+            raise IngestError(f'Invalid CSV: {e}')
+        self.indexer.flush()
+
+        stats = self.stats()
+        stats['finished_at'] = datetime.utcnow().isoformat() + 'Z'
+        return {'preview': self.preview, 'stats': stats}
@@ -0,0 +1,197 @@
+"""
+LogStream Studio - Flux temps réel (Server-Sent Events)
+Un producteur en arrière-plan par canal, diffusion des changements à tous les abonnés.
+Chaque abonné occupe un thread du worker pendant toute la connexion : leur nombre est
+plafonné par worker (workers gthread) pour laisser des threads aux autres requêtes
+"""
+
+import json
+import os
+import threading
+import time
+
+
+def default_max_subscribers():
+    """Moitié des threads d'un worker gthread ; pas de plafond pour gevent / eventlet (greenlets)"""
+    if os.environ.get('WEB_WORKER_CLASS', 'gthread') in ('gevent', 'eventlet'):
+        return 0
+    return max(1, int(os.environ.get('WEB_THREADS', '8')) // 2)
+
+
+class LiveStreamHub:
+    """Calcule chaque canal une seule fois par intervalle et le diffuse à tous les abonnés"""
+
+    def __init__(self, keepalive=None, max_subscribers=None):
+        """
+        Args:
+            keepalive (float): Délai entre deux commentaires keepalive sans changement
+            max_subscribers (int): Abonnés simultanés maximum dans ce processus (0 : pas de plafond)
+        """
+        # Canaux : nom -> {'producer', 'interval', 'thread'}
+        self.channels = {}
+        # Dernier état connu de chaque canal et sa version
+        self.snapshots = {}
+        self.versions = {}
+        self.keepalive = keepalive if keepalive is not None else int(os.environ.get('LIVE_STREAM_KEEPALIVE', '15'))
+        if max_subscribers is None:
+            max_subscribers = int(os.environ.get('LIVE_STREAM_MAX_SUBSCRIBERS', str(default_max_subscribers())))
+        self.max_subscribers = max_subscribers
+
+        self._condition = threading.Condition()
+        self._subscribers = 0
+        self._rejected = 0
+        self._stopped = False
+
+    def register(self, name, producer, interval):
+        """
+        Déclare un canal
+
+        Args:
+            name (str): Nom du canal (nom de l'événement SSE)
+            producer (callable): Fonction sans argument retournant un dict
+            interval (float): Période de calcul en secondes
+        """
+        self.channels[name] = {'producer': producer, 'interval': interval, 'thread': None}
+        self.versions[name] = 0
+
+    def _ensure_started(self, name):
+        channel = self.channels[name]
+        if channel['thread'] is not None and channel['thread'].is_alive():
+            return
+        thread = threading.Thread(target=self._run_producer, args=(name,), name=f'live-{name}', daemon=True)
+        channel['thread'] = thread
+        thread.start()
+
+    def _run_producer(self, name):
+        channel = self.channels[name]
+        while not self._stopped:
+            # Aucun calcul tant que personne n'écoute
+            with self._condition:
+                while self._subscribers == 0 and not self._stopped:
+                    self._condition.wait()
+            if self._stopped:
+                return
+
+            started = time.time()
+            try:
+                self.publish(name, channel['producer']())
+            except Exception as e:
+                print(f"Live stream producer error ({name}): {e}")
+
+            time.sleep(max(0.0, channel['interval'] - (time.time() - started)))
+
+    def publish(self, name, payload):
+        """Publie un nouvel état si différent du précédent et réveille les abonnés"""
+        with self._condition:
+            if self.snapshots.get(name) == payload:
+                return
+            self.snapshots[name] = payload
+            self.versions[name] += 1
+            self._condition.notify_all()
+
+    @staticmethod
+    def diff(previous, current):
+        """
+        Clés de premier niveau modifiées entre deux états
+
+        Returns:
+            dict: Sous-ensemble de current à envoyer au client
+        """
+        if not isinstance(previous, dict) or not isinstance(current, dict):
+            return current
+        return {k: v for k, v in current.items() if previous.get(k) != v}
+
+    @staticmethod
+    def format_event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    def reserve(self):
+        """
+        Réserve une place d'abonné avant d'ouvrir le flux
+
+        Returns:
+            bool: False si le plafond du processus est atteint (la place est à libérer par release())
+        """
+        with self._condition:
+            if self.max_subscribers and self._subscribers >= self.max_subscribers:
+                self._rejected += 1
+                return False
+            self._subscribers += 1
+            self._condition.notify_all()
+            return True
+
+    def release(self):
+        """Libère une place réservée par reserve()"""
+        with self._condition:
+            self._subscribers = max(self._subscribers - 1, 0)
+
+    def subscribe(self, names, reserved=False):
+        """
+        Générateur d'événements SSE pour un client
+
+        Args:
+            names (list): Canaux demandés
+            reserved (bool): Place déjà réservée par reserve() (libérée par l'appelant)
+
+        Yields:
+            str: Événements SSE (état complet puis différences)
+        """
+        names = [n for n in names if n in self.channels]
+        sent = {}
+        seen_versions = {}
+
+        if not reserved:
+            with self._condition:
+                self._subscribers += 1
+                self._condition.notify_all()
+        for name in names:
+            self._ensure_started(name)
+
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                pending = []
+                with self._condition:
+                    changed = [n for n in names if self.versions[n] != seen_versions.get(n)]
+                    if not changed:
+                        self._condition.wait(timeout=self.keepalive)
+                        changed = [n for n in names if self.versions[n] != seen_versions.get(n)]
+                    for name in changed:
+                        seen_versions[name] = self.versions[name]
+                        current = self.snapshots.get(name)
+                        if current is not None:
+                            pending.append((name, current))
+
+                if not pending:
+                    yield ": keepalive\n\n"
+                    continue
+
+                for name, current in pending:
+                    delta = self.diff(sent.get(name), current) if name in sent else current
+                    sent[name] = current
+                    if delta:
+                        yield self.format_event(name, delta)
+        finally:
+            if not reserved:
+                self.release()
+
+    @property
+    def subscriber_count(self):
+        return self._subscribers
+
+    def get_metrics(self):
+        with self._condition:
+            return {
+                'subscribers': self._subscribers,
+                'max_subscribers': self.max_subscribers,
+                'rejected': self._rejected
+            }
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+
+# Instance globale (canaux déclarés dans app.py)
+live_hub = LiveStreamHub()
@@ -0,0 +1,158 @@
+"""
+LogStream Studio - Écriture différée de last_login
+Les mises à jour sont regroupées par utilisateur et écrites par lots (bulk_write) en arrière-plan
+"""
+
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+
+class LastLoginWriter:
+    """Met à jour users.last_login hors du chemin de la connexion"""
+
+    def __init__(self, collection_getter, max_pending=None, batch_size=None, flush_interval=None):
+        """
+        Args:
+            collection_getter (callable): Retourne la collection users (ou None)
+            max_pending (int): Nombre maximal d'utilisateurs en attente (au-delà, les mises à jour sont abandonnées)
+            batch_size (int): Nombre d'utilisateurs en attente déclenchant une écriture
+            flush_interval (float): Délai maximal (secondes) avant écriture
+        """
+        self.collection_getter = collection_getter
+        self.max_pending = max_pending if max_pending is not None else int(os.environ.get('LAST_LOGIN_MAX_PENDING', '10000'))
+        self.batch_size = batch_size if batch_size is not None else int(os.environ.get('LAST_LOGIN_BATCH_SIZE', '500'))
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.environ.get('LAST_LOGIN_FLUSH_INTERVAL', '1'))
+
+        # user_id -> dernière connexion : plusieurs connexions du même utilisateur ne font qu'une écriture
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._metrics = {
+            'recorded': 0,
+            'coalesced': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0
+        }
+
+    def record(self, user_id, when=None):
+        """
+        Enregistre une connexion sans attendre MongoDB
+
+        Returns:
+            bool: False si la mise à jour a été abandonnée (file pleine)
+        """
+        when = when or datetime.utcnow()
+        with self._lock:
+            if user_id in self._pending:
+                self._pending[user_id] = max(self._pending[user_id], when)
+                self._metrics['coalesced'] += 1
+            elif len(self._pending) >= self.max_pending:
+                self._metrics['dropped'] += 1
+                return False
+            else:
+                self._pending[user_id] = when
+            self._metrics['recorded'] += 1
+            pending = len(self._pending)
+
+        self._ensure_started()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='last-login-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Écrit toutes les mises à jour en attente
+
+        Returns:
+            int: Nombre d'utilisateurs mis à jour
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        if not pending:
+            return 0
+
+        collection = self.collection_getter()
+        if collection is None:
+            with self._lock:
+                self._metrics['dropped'] += len(pending)
+            return 0
+
+        # $max : une écriture plus ancienne (autre worker) n'écrase jamais une plus récente
+        operations = [UpdateOne({'_id': user_id}, {'$max': {'last_login': when}})
+                      for user_id, when in pending.items()]
+        started = time.perf_counter()
+        written = 0
+        for i in range(0, len(operations), self.batch_size):
+            batch = operations[i:i + self.batch_size]
+            try:
+                collection.bulk_write(batch, ordered=False)
+                written += len(batch)
+                with self._lock:
+                    self._metrics['written'] += len(batch)
+                    self._metrics['batches'] += 1
+            except Exception as e:
+                with self._lock:
+                    self._metrics['failed'] += len(batch)
+                print(f"Error updating last_login: {e}")
+
+        with self._lock:
+            self._metrics['last_batch_size'] = len(operations)
+            self._metrics['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return written
+
+    def stop(self):
+        """Arrête le thread et écrit ce qui reste (appelé à l'arrêt du processus)"""
+        self._stop_event.set()
+        self._wakeup.set()
+        self.flush()
+
+    def get_metrics(self):
+        """
+        Compteurs des écritures différées
+
+        Returns:
+            dict: recorded, coalesced, written, dropped, pending...
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['pending'] = len(self._pending)
+        metrics['max_pending'] = self.max_pending
+        metrics['batch_size'] = self.batch_size
+        metrics['flush_interval_seconds'] = self.flush_interval
+        return metrics
+
+
+def init_last_login_writer(collection_getter, **kwargs):
+    """Crée l'écrivain de last_login et le vide à l'arrêt du processus"""
+    writer = LastLoginWriter(collection_getter, **kwargs)
+    atexit.register(writer.stop)
+    return writer
@@ -0,0 +1,213 @@
+"""
+LogStream Studio - Service de hachage des mots de passe
+Hachage et vérification dans un pool de processus dédié, avec limite de concurrence
+et mise à niveau transparente des anciens hachages
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+
+class HashingBusy(Exception):
+    """Trop de hachages en attente : la requête doit être réessayée plus tard"""
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+# Hachage du mot de passe admin par méthode (le mot de passe en clair n'est pas conservé)
+_admin_hashes = {}
+_admin_hashes_lock = threading.Lock()
+
+
+def admin_password_hash(method=DEFAULT_METHOD):
+    """
+    Hachage du mot de passe du compte admin de secours (ADMIN_PASSWORD) :
+    calculé une fois par processus et par méthode, même si plusieurs AuthManager sont créés
+    """
+    with _admin_hashes_lock:
+        if method not in _admin_hashes:
+            _admin_hashes[method] = generate_password_hash(os.environ.get('ADMIN_PASSWORD', 'admin123'), method=method)
+        return _admin_hashes[method]
+
+
+def method_of(password_hash):
+    """Partie 'méthode' d'un hachage Werkzeug (ex. 'pbkdf2:sha256:600000')"""
+    return password_hash.split('$', 1)[0] if password_hash else ''
+
+
+def normalize_method(method):
+    """
+    Forme complète d'une méthode, paramètres par défaut de Werkzeug inclus
+    ('pbkdf2' -> 'pbkdf2:sha256:600000', 'scrypt' -> 'scrypt:32768:8:1')
+    """
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        digest = parts[1] if len(parts) > 1 else 'sha256'
+        iterations = parts[2] if len(parts) > 2 else '600000'
+        return f'pbkdf2:{digest}:{iterations}'
+    if parts[0] == 'scrypt':
+        defaults = ['32768', '8', '1']
+        return 'scrypt:' + ':'.join(parts[1:] + defaults[len(parts) - 1:])
+    return method
+
+
+class PasswordHasher:
+    """Exécute les hachages hors du thread de la requête"""
+
+    def __init__(self, method=None, workers=None, max_concurrency=None, wait_timeout=None):
+        """
+        Args:
+            method (str): Méthode Werkzeug et paramètres de coût (ex. 'pbkdf2:sha256:600000', 'scrypt:32768:8:1')
+            workers (int): Nombre de processus (0 : hachage dans le thread appelant)
+            max_concurrency (int): Nombre maximal de hachages en cours ou en attente
+            wait_timeout (float): Attente maximale d'une place avant HashingBusy
+        """
+        self.method = method or os.environ.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        self.workers = workers if workers is not None else int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+        self.max_concurrency = max_concurrency or int(os.environ.get('PASSWORD_HASH_MAX_CONCURRENCY', str(max(self.workers, 1) * 4)))
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(os.environ.get('PASSWORD_HASH_WAIT_TIMEOUT', '5'))
+
+        # Forme complète de la méthode (paramètres par défaut inclus) pour comparer aux hachages stockés
+        self.method_signature = normalize_method(self.method)
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {'hashes': 0, 'verifications': 0, 'rejected': 0, 'rehashes': 0, 'busy_ms_total': 0.0}
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # Pas de fork depuis un worker multi-threadé (verrou copié pendant son utilisation)
+                default = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                context = multiprocessing.get_context(os.environ.get('PASSWORD_HASH_START_METHOD', default))
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            with self._metrics_lock:
+                self._metrics['rejected'] += 1
+            raise HashingBusy('Password hashing capacity exceeded')
+
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return func(*args)
+            try:
+                return self._get_pool().submit(func, *args).result()
+            except BrokenProcessPool:
+                # Processus tué : le pool est recréé et l'appel rejoué une fois
+                with self._pool_lock:
+                    self._pool = None
+                return self._get_pool().submit(func, *args).result()
+        finally:
+            self._slots.release()
+            with self._metrics_lock:
+                self._metrics['busy_ms_total'] += (time.perf_counter() - started) * 1000
+
+    def hash(self, password):
+        """
+        Hache un mot de passe avec la méthode configurée
+
+        Raises:
+            HashingBusy: Si la limite de concurrence est atteinte
+        """
+        with self._metrics_lock:
+            self._metrics['hashes'] += 1
+        return self._run(_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """
+        Vérifie un mot de passe contre un hachage stocké
+
+        Raises:
+            HashingBusy: Si la limite de concurrence est atteinte
+        """
+        with self._metrics_lock:
+            self._metrics['verifications'] += 1
+        return self._run(_verify, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Indique si le hachage stocké utilise une autre méthode ou d'autres paramètres de coût"""
+        return method_of(password_hash) != self.method_signature
+
+    def record_rehash(self):
+        with self._metrics_lock:
+            self._metrics['rehashes'] += 1
+
+    def get_metrics(self):
+        """
+        Compteurs du service de hachage
+
+        Returns:
+            dict: hashes, verifications, rejected, rehashes, avg_ms...
+        """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        calls = metrics['hashes'] + metrics['verifications']
+        metrics['avg_ms'] = round(metrics['busy_ms_total'] / calls, 2) if calls else 0.0
+        metrics['busy_ms_total'] = round(metrics['busy_ms_total'], 2)
+        metrics['method'] = self.method_signature
+        metrics['workers'] = self.workers
+        metrics['max_concurrency'] = self.max_concurrency
+        return metrics
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+def benchmark(methods, duration=2.0, password='benchmark-password'):
+    """
+    Mesure le nombre de hachages par seconde pour chaque méthode (un seul cœur)
+
+    Returns:
+        list: [{'method', 'hashes_per_second', 'ms_per_hash'}]
+    """
+    results = []
+    for method in methods:
+        count = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            generate_password_hash(password, method=method)
+            count += 1
+        elapsed = time.perf_counter() - started
+        results.append({
+            'method': method,
+            'hashes_per_second': round(count / elapsed, 2),
+            'ms_per_hash': round(elapsed / count * 1000, 2)
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print("⏱️  Benchmark du hachage des mots de passe\n")
+    settings = [
+        'pbkdf2:sha256:100000',
+        'pbkdf2:sha256:260000',
+        'pbkdf2:sha256:600000',
+        'scrypt:16384:8:1',
+        'scrypt:32768:8:1',
+    ]
+    for result in benchmark(settings):
+        print(f"   {result['method']:<24} {result['hashes_per_second']:>8.2f} hash/s   {result['ms_per_hash']:>8.2f} ms/hash")
+    print(f"\n   Par processus : multiplier par PASSWORD_HASH_WORKERS pour le débit total")
@@ -0,0 +1,126 @@
+"""
+LogStream Studio - Construction des requêtes Elasticsearch
+Filtres exacts en contexte filter (cache ES, pas de scoring), texte libre seul en contexte scoré
+"""
+
+
+# Champs exacts : sous-champ .keyword (mapping dynamique des index logs-ecommerce-*)
+# puis champ racine (déjà mappé en keyword dans le template logs-saas-*)
+FILTER_FIELDS = {
+    'level': ('status.keyword', 'status'),
+    'service': ('service.keyword', 'service'),
+}
+
+# Champs interrogés par la recherche texte libre
+TEXT_FIELDS = ['message', 'product', 'customer_name', 'payment_type']
+
+
+def parse_multi(values):
+    """
+    Normalise un filtre multi-valeurs (?service=a&service=b ou ?service=a,b)
+
+    Args:
+        values (list|str): Valeurs brutes
+
+    Returns:
+        list: Valeurs non vides, sans doublon, dans l'ordre d'apparition
+    """
+    if isinstance(values, str):
+        values = [values]
+    result = []
+    for value in values or []:
+        for part in value.split(','):
+            part = part.strip()
+            if part and part not in result:
+                result.append(part)
+    return result
+
+
+def terms_filter(name, values):
+    """
+    Filtre exact sur une ou plusieurs valeurs
+
+    Args:
+        name (str): Nom logique du filtre (clé de FILTER_FIELDS)
+        values (list|str): Valeur(s) acceptée(s)
+
+    Returns:
+        dict: Clause à placer dans bool.filter, None si aucune valeur
+    """
+    values = parse_multi(values)
+    if not values:
+        return None
+    fields = FILTER_FIELDS.get(name, (name,))
+    if len(fields) == 1:
+        return {'terms': {fields[0]: values}}
+    return {
+        'bool': {
+            'should': [{'terms': {field: values}} for field in fields],
+            'minimum_should_match': 1
+        }
+    }
+
+
+def range_filter(date_from=None, date_to=None, field='@timestamp'):
+    """
+    Filtre de plage de dates
+
+    Returns:
+        dict: Clause range, None si aucune borne
+    """
+    date_range = {}
+    if date_from:
+        date_range['gte'] = date_from
+    if date_to:
+        date_range['lte'] = date_to
+    if not date_range:
+        return None
+    return {'range': {field: date_range}}
+
+
+def text_query(query_text):
+    """Recherche texte libre (seule clause scorée)"""
+    return {
+        'multi_match': {
+            'query': query_text,
+            'fields': TEXT_FIELDS,
+            'type': 'best_fields',
+            'fuzziness': 'AUTO'
+        }
+    }
+
+
+def build_search_query(query_text='', levels=None, services=None, date_from=None, date_to=None):
+    """
+    Construit la requête de recherche des logs
+
+    Args:
+        query_text (str): Texte libre
+        levels (list): Statuts acceptés
+        services (list): Services acceptés
+        date_from (str): Borne inférieure de @timestamp
+        date_to (str): Borne supérieure de @timestamp
+
+    Returns:
+        dict: {'query': ...} à compléter par le tri et la pagination
+    """
+    must = [text_query(query_text)] if query_text else []
+    filters = [
+        clause for clause in (
+            terms_filter('level', levels),
+            terms_filter('service', services),
+            range_filter(date_from, date_to),
+        )
+        if clause is not None
+    ]
+
+    # Si aucun filtre, afficher tous les logs
+    if not must and not filters:
+        return {'query': {'match_all': {}}}
+
+    query = {'bool': {}}
+    if must:
+        query['bool']['must'] = must
+    if filters:
+        query['bool']['filter'] = filters
+    return {'query': query}
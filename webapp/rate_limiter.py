@@ -0,0 +1,287 @@
+"""
+LogStream Studio - Limitation de débit des API
+Fenêtre glissante et seau à jetons atomiques (scripts Lua Redis), fallback en mémoire
+"""
+
+import ipaddress
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, jsonify, make_response
+
+
+# Fenêtre glissante exacte : un ZSET des requêtes de la fenêtre
+SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now, ARGV[4])
+    redis.call('PEXPIRE', key, window)
+    return {1, limit - count - 1, 0}
+end
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return {0, 0, math.max(tonumber(oldest[2]) + window - now, 1)}
+"""
+
+# Seau à jetons : capacité = rafale autorisée, rechargé en continu
+TOKEN_BUCKET_LUA = """
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local data = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+if now > ts then
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    ts = now
+end
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', key, 'tokens', tokens, 'ts', ts)
+redis.call('PEXPIRE', key, math.ceil(capacity / rate) + 1000)
+return {allowed, math.floor(tokens), retry}
+"""
+
+
+class RateLimitRule:
+    """Limite appliquée à une route : 'limit' requêtes par 'period' secondes et par identité"""
+
+    def __init__(self, name, spec, key_func, strategy='sliding_window'):
+        """
+        Args:
+            name (str): Nom de la règle (préfixe des clés Redis)
+            spec (str): 'requêtes/secondes', ex. '20/60'
+            key_func (callable): Retourne l'identité limitée (IP, utilisateur) ou None pour ignorer
+            strategy (str): 'sliding_window' (strict) ou 'token_bucket' (autorise les rafales)
+        """
+        limit, period = spec.split('/')
+        self.name = name
+        self.limit = int(limit)
+        self.period = float(period)
+        self.key_func = key_func
+        self.strategy = strategy
+
+
+class RateLimitResult:
+    def __init__(self, allowed, remaining, retry_after_ms):
+        self.allowed = allowed
+        self.remaining = remaining
+        self.retry_after = max(int(math.ceil(retry_after_ms / 1000)), 1) if not allowed else 0
+
+
+class RateLimiter:
+    """Compte les requêtes dans Redis (partagé entre workers) ou en mémoire"""
+
+    KEY_PREFIX = 'logstream:ratelimit:'
+
+    def __init__(self, redis_getter=None, max_local_keys=10000):
+        """
+        Args:
+            redis_getter (callable): Retourne le client Redis (ou None)
+            max_local_keys (int): Nombre maximal d'identités suivies en mémoire
+        """
+        self.redis_getter = redis_getter or (lambda: None)
+        self.max_local_keys = max_local_keys
+        self.enabled = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+
+        self._scripts = {}
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {'allowed': 0, 'limited': 0, 'redis_errors': 0}
+
+    def _script(self, redis_client, strategy):
+        key = (id(redis_client), strategy)
+        if key not in self._scripts:
+            source = TOKEN_BUCKET_LUA if strategy == 'token_bucket' else SLIDING_WINDOW_LUA
+            self._scripts[key] = redis_client.register_script(source)
+        return self._scripts[key]
+
+    def hit(self, rule, identity):
+        """
+        Compte une requête pour une identité
+
+        Returns:
+            RateLimitResult: allowed, remaining, retry_after (secondes)
+        """
+        key = f'{self.KEY_PREFIX}{rule.name}:{identity}'
+        now_ms = int(time.time() * 1000)
+        window_ms = int(rule.period * 1000)
+
+        result = None
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                script = self._script(redis_client, rule.strategy)
+                if rule.strategy == 'token_bucket':
+                    args = [rule.limit, rule.limit / window_ms, now_ms]
+                else:
+                    args = [rule.limit, window_ms, now_ms, f'{now_ms}-{uuid.uuid4().hex[:8]}']
+                allowed, remaining, retry = script(keys=[key], args=args)
+                result = RateLimitResult(bool(allowed), int(remaining), int(retry))
+            except Exception as e:
+                with self._lock:
+                    self._metrics['redis_errors'] += 1
+                print(f"Rate limiter error (Redis), using local counters: {e}")
+
+        if result is None:
+            result = self._hit_local(rule, key, now_ms, window_ms)
+
+        with self._lock:
+            self._metrics['allowed' if result.allowed else 'limited'] += 1
+        return result
+
+    def _hit_local(self, rule, key, now_ms, window_ms):
+        with self._lock:
+            state = self._local.pop(key, None)
+            if rule.strategy == 'token_bucket':
+                rate = rule.limit / window_ms
+                tokens, ts = state or (float(rule.limit), now_ms)
+                tokens = min(rule.limit, tokens + max(now_ms - ts, 0) * rate)
+                if tokens >= 1:
+                    result = RateLimitResult(True, int(tokens - 1), 0)
+                    tokens -= 1
+                else:
+                    result = RateLimitResult(False, 0, math.ceil((1 - tokens) / rate))
+                state = (tokens, max(now_ms, ts))
+            else:
+                hits = [t for t in (state or []) if t > now_ms - window_ms]
+                if len(hits) < rule.limit:
+                    hits.append(now_ms)
+                    result = RateLimitResult(True, rule.limit - len(hits), 0)
+                else:
+                    result = RateLimitResult(False, 0, hits[0] + window_ms - now_ms)
+                state = hits
+
+            self._local[key] = state
+            while len(self._local) > self.max_local_keys:
+                self._local.popitem(last=False)
+        return result
+
+    def reset(self):
+        """Vide les compteurs locaux (tests)"""
+        with self._lock:
+            self._local.clear()
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['local_keys'] = len(self._local)
+        metrics['enabled'] = self.enabled
+        metrics['backend'] = 'redis' if self.redis_getter() is not None else 'memory'
+        return metrics
+
+
+# ============================================
+#  IDENTITÉS
+# ============================================
+
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(network.strip())
+    for network in os.environ.get(
+        'RATE_LIMIT_TRUSTED_PROXIES', '127.0.0.0/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16'
+    ).split(',') if network.strip()
+]
+
+
+def client_ip(remote, real_ip=None):
+    """Adresse du client : X-Real-IP uniquement si la connexion vient du proxy nginx"""
+    remote = remote or 'unknown'
+    try:
+        trusted = any(ipaddress.ip_address(remote) in network for network in TRUSTED_PROXIES)
+    except ValueError:
+        trusted = False
+    if trusted and real_ip:
+        return real_ip
+    return remote
+
+
+def by_ip():
+    """Adresse du client de la requête Flask"""
+    return client_ip(request.remote_addr, request.headers.get('X-Real-IP'))
+
+
+def by_user():
+    """Utilisateur authentifié (à placer après @api_login_required)"""
+    user = getattr(request, 'user', None) or {}
+    return user.get('username')
+
+
+def by_login_username():
+    """Compte visé par une tentative de connexion (protège contre le brute-force réparti)"""
+    data = request.get_json(silent=True) or {}
+    username = data.get('username')
+    return str(username).lower() if username else None
+
+
+# Instance globale (sera initialisée dans app.py avec le client Redis)
+rate_limiter = None
+
+
+def init_rate_limiter(redis_getter=None, **kwargs):
+    """Initialise le limiteur de débit"""
+    global rate_limiter
+    rate_limiter = RateLimiter(redis_getter, **kwargs)
+    return rate_limiter
+
+
+def rate_limit(*rules):
+    """
+    Décorateur appliquant une ou plusieurs règles à une route API
+
+    Usage:
+        @app.route('/api/search')
+        @api_login_required
+        @rate_limit(RateLimitRule('search_user', '10/1', by_user, 'token_bucket'))
+        def api_search():
+            ...
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limiter = rate_limiter
+            if limiter is None or not limiter.enabled:
+                return f(*args, **kwargs)
+
+            remaining = None
+            for rule in rules:
+                identity = rule.key_func()
+                if identity is None:
+                    continue
+                result = limiter.hit(rule, identity)
+                if not result.allowed:
+                    response = jsonify({
+                        'success': False,
+                        'error': 'Too many requests',
+                        'code': 'RATE_LIMITED',
+                        'retry_after': result.retry_after
+                    })
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(result.retry_after)
+                    response.headers['X-RateLimit-Limit'] = str(rule.limit)
+                    response.headers['X-RateLimit-Remaining'] = '0'
+                    return response
+                remaining = result.remaining if remaining is None else min(remaining, result.remaining)
+
+            response = make_response(f(*args, **kwargs))
+            if remaining is not None:
+                response.headers['X-RateLimit-Remaining'] = str(remaining)
+            return response
+
+        return decorated_function
+    return decorator
@@ -0,0 +1,247 @@
+"""
+LogStream Studio - Cache des résultats de recherche
+Clé canonique des paramètres de recherche, stockage Redis (TTL + éviction LRU) ou mémoire
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+
+class SearchCache:
+    """Cache des réponses de /api/search, borné en taille et en durée de vie"""
+
+    KEY_PREFIX = 'logstream:search:'
+    INDEX_KEY = 'logstream:search:lru'
+
+    def __init__(self, redis_getter=None, ttl=None, max_entries=None, now_slack=None):
+        """
+        Args:
+            redis_getter (callable): Retourne le client Redis (ou None)
+            ttl (int): Durée de vie d'une entrée en secondes
+            max_entries (int): Nombre maximal d'entrées (les moins récemment lues sont évincées)
+            now_slack (int): Une plage se terminant moins de now_slack secondes avant
+                maintenant est considérée comme « touchant now » et n'est pas mise en cache
+        """
+        self.redis_getter = redis_getter or (lambda: None)
+        self.ttl = ttl if ttl is not None else int(os.environ.get('SEARCH_CACHE_TTL', '300'))
+        self.max_entries = max_entries if max_entries is not None else int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', '1000'))
+        self.now_slack = now_slack if now_slack is not None else int(os.environ.get('SEARCH_CACHE_NOW_SLACK', '60'))
+
+        # Fallback en mémoire : clé -> (expiration, résultat), ordre = récence
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0, 'evictions': 0, 'flushes': 0}
+
+    # ------------------------------------------
+    #  Clé canonique
+    # ------------------------------------------
+
+    @staticmethod
+    def normalize(query_text='', levels=None, services=None, date_from='', date_to='', page=1, cursor='', mode='page'):
+        """
+        Forme canonique des paramètres (casse, espaces et ordre des filtres ignorés)
+
+        Returns:
+            dict: Paramètres normalisés
+        """
+        return {
+            'q': ' '.join((query_text or '').lower().split()),
+            'levels': sorted(set(levels or [])),
+            'services': sorted(set(services or [])),
+            'from': (date_from or '').strip(),
+            'to': (date_to or '').strip(),
+            'mode': mode,
+            'page': cursor or int(page or 1)
+        }
+
+    def make_key(self, params):
+        raw = json.dumps(params, sort_keys=True, separators=(',', ':'))
+        return self.KEY_PREFIX + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _parse_date(self, value):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        # Sans fuseau, Elasticsearch interprète la date en UTC
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
+    def touches_now(self, params):
+        """
+        Indique si la plage de dates inclut l'instant présent (résultats encore changeants)
+
+        Les pages suivantes d'une pagination par curseur lisent un point-in-time figé :
+        elles sont toujours cacheables.
+        """
+        if isinstance(params['page'], str):
+            return False
+        if 'now' in params['from'] or 'now' in params['to']:
+            return True
+        if not params['to']:
+            return True
+        date_to = self._parse_date(params['to'])
+        if date_to is None:
+            return True
+        return date_to >= datetime.utcnow() - timedelta(seconds=self.now_slack)
+
+    def key_for(self, **kwargs):
+        """
+        Clé de cache des paramètres de recherche
+
+        Returns:
+            str: Clé Redis, None si la recherche ne doit pas être mise en cache
+        """
+        params = self.normalize(**kwargs)
+        if self.touches_now(params):
+            self._record('bypassed')
+            return None
+        return self.make_key(params)
+
+    # ------------------------------------------
+    #  Lecture / écriture
+    # ------------------------------------------
+
+    def _record(self, name, value=1):
+        with self._lock:
+            self._metrics[name] += value
+
+    def get(self, key):
+        """Retourne le résultat en cache ou None"""
+        if key is None:
+            return None
+
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                cached = redis_client.get(key)
+                if cached is not None:
+                    # Mise à jour de la récence (LRU)
+                    redis_client.zadd(self.INDEX_KEY, {key: time.time()})
+                    self._record('hits')
+                    return json.loads(cached)
+                self._record('misses')
+                return None
+            except Exception as e:
+                print(f"Search cache read error (Redis): {e}")
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._local.move_to_end(key)
+                self._metrics['hits'] += 1
+                return entry[1]
+            if entry is not None:
+                del self._local[key]
+            self._metrics['misses'] += 1
+        return None
+
+    def set(self, key, result, ttl=None):
+        """
+        Stocke un résultat et évince les entrées les moins récemment lues
+
+        Args:
+            ttl (int): Durée de vie spécifique (ex. bornée par l'expiration d'un point-in-time)
+        """
+        if key is None:
+            return
+        ttl = min(ttl, self.ttl) if ttl else self.ttl
+
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline()
+                pipe.setex(key, ttl, json.dumps(result, default=str))
+                pipe.zadd(self.INDEX_KEY, {key: time.time()})
+                pipe.zcard(self.INDEX_KEY)
+                size = pipe.execute()[-1]
+                self._record('stores')
+                if size > self.max_entries:
+                    self._evict_redis(redis_client, size - self.max_entries)
+                return
+            except Exception as e:
+                print(f"Search cache write error (Redis): {e}")
+
+        with self._lock:
+            self._local[key] = (time.time() + ttl, result)
+            self._local.move_to_end(key)
+            self._metrics['stores'] += 1
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+                self._metrics['evictions'] += 1
+
+    def _evict_redis(self, redis_client, count):
+        oldest = redis_client.zrange(self.INDEX_KEY, 0, count - 1)
+        if oldest:
+            pipe = redis_client.pipeline()
+            pipe.delete(*oldest)
+            pipe.zrem(self.INDEX_KEY, *oldest)
+            pipe.execute()
+            self._record('evictions', len(oldest))
+
+    def flush(self):
+        """
+        Vide le cache
+
+        Returns:
+            int: Nombre d'entrées supprimées
+        """
+        removed = 0
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                keys = redis_client.zrange(self.INDEX_KEY, 0, -1)
+                if keys:
+                    removed += redis_client.delete(*keys)
+                redis_client.delete(self.INDEX_KEY)
+            except Exception as e:
+                print(f"Search cache flush error (Redis): {e}")
+
+        with self._lock:
+            removed += len(self._local)
+            self._local.clear()
+            self._metrics['flushes'] += 1
+        return removed
+
+    def get_metrics(self):
+        """
+        Compteurs du cache
+
+        Returns:
+            dict: hits, misses, bypassed, hit_ratio...
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            local_entries = len(self._local)
+
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_ratio'] = round(metrics['hits'] / lookups, 4) if lookups else 0.0
+        metrics['ttl_seconds'] = self.ttl
+        metrics['max_entries'] = self.max_entries
+
+        redis_client = self.redis_getter()
+        metrics['backend'] = 'redis' if redis_client is not None else 'memory'
+        metrics['entries'] = local_entries
+        if redis_client is not None:
+            try:
+                metrics['entries'] = redis_client.zcard(self.INDEX_KEY)
+            except Exception:
+                pass
+        return metrics
+
+
+# Instance globale (sera initialisée dans app.py avec le client Redis)
+search_cache = None
+
+
+def init_search_cache(redis_getter=None, **kwargs):
+    """Initialise le cache de recherche"""
+    global search_cache
+    search_cache = SearchCache(redis_getter, **kwargs)
+    return search_cache
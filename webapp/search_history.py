@@ -0,0 +1,158 @@
+"""
+LogStream Studio - Historique de recherche asynchrone
+File bornée en mémoire vidée par un thread d'écriture MongoDB (insert_many par lots)
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+
+
+class SearchHistoryWriter:
+    """Enregistre l'historique de recherche hors du chemin de la requête"""
+
+    def __init__(self, collection_getter, max_queue=None, batch_size=None, flush_interval=None):
+        """
+        Args:
+            collection_getter (callable): Retourne la collection search_history (ou None)
+            max_queue (int): Taille maximale de la file (au-delà, les entrées sont abandonnées)
+            batch_size (int): Nombre d'entrées déclenchant une écriture
+            flush_interval (float): Délai maximal (secondes) avant écriture d'un lot incomplet
+        """
+        self.collection_getter = collection_getter
+        self.max_queue = max_queue if max_queue is not None else int(os.environ.get('SEARCH_HISTORY_QUEUE_SIZE', '10000'))
+        self.batch_size = batch_size if batch_size is not None else int(os.environ.get('SEARCH_HISTORY_BATCH_SIZE', '100'))
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.environ.get('SEARCH_HISTORY_FLUSH_INTERVAL', '2'))
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0
+        }
+
+    def _record(self, **values):
+        with self._metrics_lock:
+            for key, value in values.items():
+                self._metrics[key] += value
+
+    def record(self, entry):
+        """
+        Ajoute une entrée à la file sans jamais bloquer la requête
+
+        Returns:
+            bool: False si l'entrée a été abandonnée (file pleine)
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._record(dropped=1)
+            return False
+        self._record(enqueued=1)
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='search-history-writer', daemon=True)
+            self._thread.start()
+
+    def _drain(self, max_items, timeout):
+        """Récupère jusqu'à max_items entrées, en attendant au plus timeout secondes"""
+        batch = []
+        deadline = time.time() + timeout
+        while len(batch) < max_items:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        collection = self.collection_getter()
+        if collection is None:
+            self._record(dropped=len(batch))
+            return
+
+        started = time.perf_counter()
+        try:
+            collection.insert_many(batch, ordered=False)
+            self._record(written=len(batch), batches=1)
+        except Exception as e:
+            self._record(failed=len(batch))
+            print(f"Error saving search history: {e}")
+        with self._metrics_lock:
+            self._metrics['last_batch_size'] = len(batch)
+            self._metrics['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._write(self._drain(self.batch_size, self.flush_interval))
+
+    def flush(self, timeout=5.0):
+        """
+        Écrit immédiatement tout ce qui reste dans la file (appelé à l'arrêt)
+
+        Args:
+            timeout (float): Durée maximale consacrée au vidage
+        """
+        deadline = time.time() + timeout
+        while not self._queue.empty() and time.time() < deadline:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def stop(self):
+        self._stop_event.set()
+        self.flush()
+
+    def get_metrics(self):
+        """
+        Compteurs de la file et des écritures
+
+        Returns:
+            dict: enqueued, written, dropped, failed, queue_depth...
+        """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics['queue_depth'] = self._queue.qsize()
+        metrics['max_queue'] = self.max_queue
+        metrics['batch_size'] = self.batch_size
+        metrics['flush_interval_seconds'] = self.flush_interval
+        return metrics
+
+
+# Instance globale (sera initialisée dans app.py avec la collection)
+search_history = None
+
+
+def init_search_history(collection_getter, **kwargs):
+    """Initialise l'écrivain d'historique et le vide à l'arrêt du processus"""
+    global search_history
+    search_history = SearchHistoryWriter(collection_getter, **kwargs)
+    atexit.register(search_history.stop)
+    return search_history
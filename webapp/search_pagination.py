@@ -0,0 +1,281 @@
+"""
+LogStream Studio - Pagination de la recherche
+Pagination classique (from/size) et pagination par curseur (point-in-time + search_after)
+"""
+
+import base64
+import hashlib
+import json
+import os
+
+
+PAGE_SIZE = 50
+PIT_KEEP_ALIVE = os.environ.get('SEARCH_PIT_KEEP_ALIVE', '2m')
+
+
+def duration_seconds(value):
+    """Convertit une durée Elasticsearch ('30s', '2m', '1h') en secondes"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    value = value.strip()
+    if value and value[-1] in units:
+        return int(value[:-1]) * units[value[-1]]
+    return int(value)
+
+
+PIT_KEEP_ALIVE_SECONDS = duration_seconds(PIT_KEEP_ALIVE)
+
+# Tri stable : @timestamp puis _shard_doc (départage implicite fourni par le point-in-time)
+CURSOR_SORT = [
+    {'@timestamp': {'order': 'desc'}},
+    {'_shard_doc': {'order': 'desc'}}
+]
+
+
+class CursorError(ValueError):
+    """Curseur illisible ou ne correspondant pas à la requête"""
+
+
+def query_fingerprint(query):
+    """Empreinte courte de la requête, pour vérifier qu'un curseur lui appartient"""
+    raw = json.dumps(query, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def encode_cursor(state):
+    """
+    Sérialise l'état de pagination en jeton opaque (base64 url-safe)
+
+    Args:
+        state (dict): pit, after, page, total, q
+
+    Returns:
+        str: Jeton transmis à search.html
+    """
+    raw = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Décode un jeton produit par encode_cursor
+
+    Raises:
+        CursorError: Si le jeton est invalide
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise CursorError('Invalid cursor')
+    if not isinstance(state, dict) or not {'pit', 'after', 'page'} <= set(state):
+        raise CursorError('Invalid cursor')
+    return state
+
+
+def page_body(es_query, page, page_size=PAGE_SIZE):
+    """Corps de la requête from/size d'une page"""
+    body = dict(es_query)
+    body['sort'] = [{'@timestamp': {'order': 'desc'}}]
+    body['from'] = (page - 1) * page_size
+    body['size'] = page_size
+    return body
+
+
+def page_metadata(response, page, page_size=PAGE_SIZE):
+    """Métadonnées de pagination d'une réponse from/size"""
+    total = response['hits']['total']['value']
+    return {
+        'mode': 'page',
+        'page': page,
+        'total': total,
+        'total_pages': (total + page_size - 1) // page_size,
+        'next_cursor': None
+    }
+
+
+def search_page(es_client, index, es_query, page, page_size=PAGE_SIZE):
+    """
+    Pagination classique from/size (limitée à la fenêtre de 10 000 résultats)
+
+    Returns:
+        tuple: (réponse Elasticsearch, métadonnées de pagination)
+    """
+    response = es_client.search(index=index, body=page_body(es_query, page, page_size))
+    return response, page_metadata(response, page, page_size)
+
+
+async def async_search_page(es_client, index, es_query, page, page_size=PAGE_SIZE):
+    """search_page pour AsyncElasticsearch"""
+    response = await es_client.search(index=index, body=page_body(es_query, page, page_size))
+    return response, page_metadata(response, page, page_size)
+
+
+def resume_cursor(cursor, fingerprint):
+    """
+    État de pagination d'un curseur existant
+
+    Raises:
+        CursorError: Si le curseur est invalide ou appartient à une autre requête
+    """
+    state = decode_cursor(cursor)
+    if state.get('q') != fingerprint:
+        raise CursorError('Cursor does not match the current query')
+    return state
+
+
+def first_page_body(es_query, page_size=PAGE_SIZE):
+    """Corps de la recherche simple de la première page, avec le total exact (au-delà de 10 000)"""
+    body = page_body(es_query, 1, page_size)
+    body['track_total_hits'] = True
+    return body
+
+
+def first_page_metadata(response, pit_id, fingerprint, page_size=PAGE_SIZE):
+    """
+    Métadonnées de la première page (recherche simple)
+
+    Les valeurs de tri de la recherche simple n'ont pas le départage _shard_doc :
+    la page 2 est lue sur le point-in-time avec un décalage d'une page, puis les
+    suivantes reprennent par search_after.
+    """
+    metadata = dict(page_metadata(response, 1, page_size), mode='cursor')
+    if pit_id is not None:
+        metadata['next_cursor'] = encode_cursor({
+            'pit': pit_id,
+            'after': None,
+            'page': 2,
+            'total': metadata['total'],
+            'q': fingerprint
+        })
+    return metadata
+
+
+def cursor_body(es_query, state, page_size=PAGE_SIZE, keep_alive=PIT_KEEP_ALIVE):
+    """Corps de la requête search_after d'une page"""
+    body = dict(es_query)
+    body['pit'] = {'id': state['pit'], 'keep_alive': keep_alive}
+    body['sort'] = CURSOR_SORT
+    body['size'] = page_size
+    # Le total exact est calculé par la recherche de la première page puis transporté par le curseur
+    body['track_total_hits'] = False
+    if state['after'] is not None:
+        body['search_after'] = state['after']
+    else:
+        body['from'] = (state['page'] - 1) * page_size
+    return body
+
+
+def cursor_metadata(response, state, page_size=PAGE_SIZE):
+    """Métadonnées de pagination et curseur de la page suivante"""
+    total = state['total']
+    total_pages = (total + page_size - 1) // page_size
+    hits = response['hits']['hits']
+    pit_id = response.get('pit_id', state['pit'])
+
+    # Pas de page suivante : l'appelant ferme le point-in-time (les pages déjà
+    # consultées restent servies par le cache de recherche)
+    next_cursor = None
+    if hits and state['page'] < total_pages:
+        next_cursor = encode_cursor({
+            'pit': pit_id,
+            'after': hits[-1]['sort'],
+            'page': state['page'] + 1,
+            'total': total,
+            'q': state['q']
+        })
+
+    return {
+        'mode': 'cursor',
+        'page': state['page'],
+        'total': total,
+        'total_pages': total_pages,
+        'next_cursor': next_cursor
+    }
+
+
+def close_pit(es_client, pit_id):
+    """Libère le contexte de lecture d'un point-in-time (expire de toute façon après keep_alive)"""
+    try:
+        es_client.close_point_in_time(id=pit_id)
+    except Exception as e:
+        print(f"Error closing point-in-time: {e}")
+
+
+def search_cursor(es_client, index, es_query, cursor=None, page_size=PAGE_SIZE, keep_alive=PIT_KEEP_ALIVE):
+    """
+    Pagination par curseur : coût constant quelle que soit la profondeur de page
+
+    La première page est une recherche simple qui calcule le total exact ; un
+    point-in-time n'est ouvert que si elle ne contient pas tous les résultats. Les
+    pages suivantes reprennent après les valeurs de tri du dernier résultat
+    (search_after), une seule recherche par page, et le point-in-time est fermé à
+    la dernière page.
+
+    Args:
+        es_client: Client Elasticsearch
+        index (str): Pattern d'index (recherche simple et ouverture du point-in-time)
+        es_query (dict): Corps de la requête (clé 'query')
+        cursor (str): Jeton renvoyé par l'appel précédent, None pour la première page
+
+    Returns:
+        tuple: (réponse Elasticsearch, métadonnées de pagination)
+
+    Raises:
+        CursorError: Si le curseur est invalide ou appartient à une autre requête
+    """
+    fingerprint = query_fingerprint(es_query.get('query'))
+    if not cursor:
+        response = es_client.search(index=index, body=first_page_body(es_query, page_size))
+        pit_id = None
+        if response['hits']['total']['value'] > page_size:
+            pit_id = es_client.open_point_in_time(index=index, keep_alive=keep_alive)['id']
+        return response, first_page_metadata(response, pit_id, fingerprint, page_size)
+
+    state = resume_cursor(cursor, fingerprint)
+    response = es_client.search(body=cursor_body(es_query, state, page_size, keep_alive))
+    metadata = cursor_metadata(response, state, page_size)
+    if metadata['next_cursor'] is None:
+        close_pit(es_client, response.get('pit_id', state['pit']))
+    return response, metadata
+
+
+async def async_close_pit(es_client, pit_id):
+    """close_pit pour AsyncElasticsearch"""
+    try:
+        await es_client.close_point_in_time(id=pit_id)
+    except Exception as e:
+        print(f"Error closing point-in-time: {e}")
+
+
+async def async_search_cursor(es_client, index, es_query, cursor=None, page_size=PAGE_SIZE, keep_alive=PIT_KEEP_ALIVE):
+    """search_cursor pour AsyncElasticsearch"""
+    fingerprint = query_fingerprint(es_query.get('query'))
+    if not cursor:
+        response = await es_client.search(index=index, body=first_page_body(es_query, page_size))
+        pit_id = None
+        if response['hits']['total']['value'] > page_size:
+            pit_id = (await es_client.open_point_in_time(index=index, keep_alive=keep_alive))['id']
+        return response, first_page_metadata(response, pit_id, fingerprint, page_size)
+
+    state = resume_cursor(cursor, fingerprint)
+    response = await es_client.search(body=cursor_body(es_query, state, page_size, keep_alive))
+    metadata = cursor_metadata(response, state, page_size)
+    if metadata['next_cursor'] is None:
+        await async_close_pit(es_client, response.get('pit_id', state['pit']))
+    return response, metadata
+
+
+def format_log_hit(hit):
+    """Document Elasticsearch au format attendu par search.html"""
+    source = hit['_source']
+    return {
+        'timestamp': source.get('@timestamp', ''),
+        'level': source.get('status', source.get('level', 'info')),
+        'service': source.get('service', 'unknown'),
+        'message': source.get('message', ''),
+        'product': source.get('product', ''),
+        'customer': source.get('customer_name', ''),
+        'payment_type': source.get('payment_type', ''),
+        'amount': source.get('amount', ''),
+        'category': source.get('category', '')
+    }
@@ -0,0 +1,380 @@
+"""
+LogStream Studio - Moteur de statistiques
+Agrégation Elasticsearch unique (plus un comptage borné des dernières 24h) avec cache partagé (Redis ou mémoire)
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from index_router import iso
+from query_builder import terms_filter
+
+
+# Libère un verrou Redis seulement s'il porte encore notre jeton : GET puis DEL en deux appels
+# supprimerait le verrou d'un autre worker s'il avait expiré entre les deux
+RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+ONE_DAY_MS = 24 * 60 * 60 * 1000
+ONE_HOUR_MS = 60 * 60 * 1000
+
+
+class StatsEngine:
+    """Calcule les statistiques de /api/stats et les partage entre tous les clients"""
+
+    CACHE_KEY = 'logstream:stats:api'
+    LOCK_KEY = 'logstream:stats:lock'
+
+    def __init__(self, es_getter, redis_getter=None, uploads_getter=None, index='logs-*', ttl=None, rollups=None,
+                 router=None):
+        """
+        Args:
+            es_getter (callable): Retourne le client Elasticsearch (ou None)
+            redis_getter (callable): Retourne le client Redis (ou None)
+            uploads_getter (callable): Retourne la collection MongoDB uploads (ou None)
+            index (str): Pattern d'index des logs
+            ttl (int): Durée de vie du cache en secondes
+            rollups (StatsRollups): Source de la timeline pré-agrégée (sinon histogramme sur les logs bruts)
+            router (IndexRouter): Sélection des index des dernières 24h (sinon comptage sur tout le pattern)
+        """
+        self.es_getter = es_getter
+        self.redis_getter = redis_getter or (lambda: None)
+        self.uploads_getter = uploads_getter or (lambda: None)
+        self.rollups = rollups
+        self.router = router
+        self.index = index
+        self.ttl = ttl if ttl is not None else int(os.environ.get('STATS_CACHE_TTL', '10'))
+
+        # Cache local (fallback si Redis indisponible)
+        self._local_cache = None
+        self._local_expires_at = 0
+
+        # Un seul calcul à la fois par processus (single-flight)
+        self._refresh_lock = threading.Lock()
+
+        # Compteurs exposés via /api/stats/metrics
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'es_queries': 0,
+            'es_errors': 0,
+            'es_latency_ms_total': 0.0,
+            'es_latency_ms_last': 0.0,
+            'es_latency_ms_max': 0.0,
+            'last_refresh': None,
+            'timeline_source': None,
+            'recent_indices_last': None
+        }
+
+    # ------------------------------------------
+    #  Requête Elasticsearch
+    # ------------------------------------------
+
+    @staticmethod
+    def build_query(timeline=True):
+        """
+        Construit la requête unique qui remplace les appels historiques
+        (count, min/max, erreurs, timeline) ; les logs des dernières 24h sont
+        comptés ensuite par count_recent, une fois la date maximale connue
+
+        Args:
+            timeline (bool): Inclure l'histogramme journalier (inutile si la timeline vient des rollups)
+
+        Returns:
+            dict: Corps de la requête _search
+        """
+        query = {
+            'size': 0,
+            'track_total_hits': True,
+            'aggs': {
+                'max_date': {'max': {'field': '@timestamp'}},
+                'errors': {
+                    'filter': terms_filter('level', 'failed')
+                },
+                'logs_over_time': {
+                    'date_histogram': {
+                        'field': '@timestamp',
+                        'calendar_interval': 'day',
+                        'format': 'yyyy-MM-dd'
+                    }
+                }
+            }
+        }
+        if not timeline:
+            del query['aggs']['logs_over_time']
+        return query
+
+    @staticmethod
+    def recent_window(max_date_ms):
+        """
+        Plage des « logs des dernières 24h » avant le log le plus récent
+        (l'heure contenant max - 24h est comptée entièrement)
+
+        Returns:
+            tuple: (début, fin) en datetime UTC
+        """
+        end = datetime.utcfromtimestamp(max_date_ms / 1000)
+        threshold = datetime.utcfromtimestamp((max_date_ms - ONE_DAY_MS - ONE_HOUR_MS) / 1000)
+        return threshold.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1), end
+
+    @staticmethod
+    def recent_query(start, end):
+        """Filtre de la plage recent_window (requête _count)"""
+        return {'range': {'@timestamp': {'gte': iso(start), 'lte': iso(end)}}}
+
+    @staticmethod
+    def parse_response(response):
+        """
+        Transforme la réponse Elasticsearch au format attendu par index.html
+
+        Args:
+            response (dict): Réponse de la requête build_query()
+
+        Returns:
+            dict: total_logs, errors, timeline (logs_today est calculé par count_recent)
+        """
+        aggs = response.get('aggregations', {})
+        total = response.get('hits', {}).get('total', {})
+        if isinstance(total, dict):
+            total = total.get('value', 0)
+
+        buckets = aggs.get('logs_over_time', {}).get('buckets', [])
+
+        return {
+            'total_logs': total or 0,
+            'errors': aggs.get('errors', {}).get('doc_count', 0),
+            # Limiter à 30 derniers jours de données pour ne pas surcharger le graphe
+            'timeline': [{'date': b['key_as_string'], 'count': b['doc_count']} for b in buckets[-30:]]
+        }
+
+    # ------------------------------------------
+    #  Cache
+    # ------------------------------------------
+
+    def _cache_get(self):
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                cached = redis_client.get(self.CACHE_KEY)
+                if cached:
+                    return json.loads(cached)
+                return None
+            except Exception as e:
+                print(f"Stats cache read error (Redis): {e}")
+
+        if self._local_cache is not None and time.time() < self._local_expires_at:
+            return self._local_cache
+        return None
+
+    def _cache_set(self, stats):
+        self._local_cache = stats
+        self._local_expires_at = time.time() + self.ttl
+
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                redis_client.setex(self.CACHE_KEY, self.ttl, json.dumps(stats))
+            except Exception as e:
+                print(f"Stats cache write error (Redis): {e}")
+
+    def _acquire_shared_lock(self):
+        """
+        Verrou Redis entre workers : un seul processus interroge Elasticsearch
+
+        Returns:
+            str: Jeton du verrou, '' si Redis indisponible, None si déjà pris
+        """
+        redis_client = self.redis_getter()
+        if redis_client is None:
+            return ''
+        token = uuid.uuid4().hex
+        try:
+            if redis_client.set(self.LOCK_KEY, token, nx=True, px=max(self.ttl, 5) * 1000):
+                return token
+            return None
+        except Exception:
+            return ''
+
+    def _release_shared_lock(self, token):
+        redis_client = self.redis_getter()
+        if not token or redis_client is None:
+            return
+        try:
+            redis_client.eval(RELEASE_LOCK_SCRIPT, 1, self.LOCK_KEY, token)
+        except Exception:
+            pass
+
+    def _wait_for_peer(self, timeout=5.0, interval=0.1):
+        """Attend qu'un autre worker publie le résultat dans le cache"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            time.sleep(interval)
+            cached = self._cache_get()
+            if cached is not None:
+                return cached
+        return None
+
+    # ------------------------------------------
+    #  Calcul
+    # ------------------------------------------
+
+    def _record(self, **values):
+        with self._metrics_lock:
+            for key, value in values.items():
+                self._metrics[key] += value
+
+    def compute(self):
+        """
+        Calcule les statistiques sans passer par le cache
+
+        Returns:
+            dict: Statistiques au format de /api/stats
+        """
+        stats = {
+            'total_logs': 0,
+            'logs_today': 0,
+            'errors': 0,
+            'files_uploaded': 0,
+            'timeline': []
+        }
+
+        es_client = self.es_getter()
+        if es_client is not None:
+            timeline = None
+            if self.rollups is not None:
+                try:
+                    timeline = self.rollups.timeline()
+                except Exception as e:
+                    print(f"Error reading stats rollups: {e}")
+
+            start = time.perf_counter()
+            try:
+                response = es_client.search(index=self.index, body=self.build_query(timeline=timeline is None))
+                stats.update(self.parse_response(response))
+                stats['logs_today'] = self.count_recent(es_client, response)
+                if timeline is not None:
+                    stats['timeline'] = timeline
+                with self._metrics_lock:
+                    self._metrics['timeline_source'] = 'raw' if timeline is None else 'rollups'
+            except Exception as e:
+                self._record(es_errors=1)
+                print(f"Error fetching Elasticsearch stats: {e}")
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                with self._metrics_lock:
+                    self._metrics['es_queries'] += 1
+                    self._metrics['es_latency_ms_total'] += elapsed_ms
+                    self._metrics['es_latency_ms_last'] = round(elapsed_ms, 2)
+                    self._metrics['es_latency_ms_max'] = max(self._metrics['es_latency_ms_max'], round(elapsed_ms, 2))
+
+        # Fichiers uploadés depuis MongoDB
+        uploads_col = self.uploads_getter()
+        if uploads_col is not None:
+            try:
+                stats['files_uploaded'] = uploads_col.count_documents({})
+            except Exception as e:
+                print(f"Error fetching MongoDB stats: {e}")
+
+        with self._metrics_lock:
+            self._metrics['last_refresh'] = datetime.utcnow().isoformat() + 'Z'
+
+        return stats
+
+    def count_recent(self, es_client, response):
+        """
+        Compte les logs des dernières 24h (avant le plus récent) : requête bornée à la plage,
+        sur les seuls index qui la couvrent si un routeur est configuré
+
+        Returns:
+            int: Nombre de logs
+        """
+        max_date_ms = response.get('aggregations', {}).get('max_date', {}).get('value')
+        if not max_date_ms:
+            return 0
+        start, end = self.recent_window(max_date_ms)
+        target = self.router.target(start, end) if self.router is not None else self.index
+        with self._metrics_lock:
+            self._metrics['recent_indices_last'] = target
+        if target is None:
+            return 0
+        return es_client.count(index=target, query=self.recent_query(start, end))['count']
+
+    def get_stats(self):
+        """
+        Retourne les statistiques depuis le cache, ou les recalcule une seule fois
+        pour tous les appelants concurrents
+
+        Returns:
+            dict: Statistiques au format de /api/stats
+        """
+        cached = self._cache_get()
+        if cached is not None:
+            self._record(cache_hits=1)
+            return cached
+
+        with self._refresh_lock:
+            # Un autre thread a peut-être rafraîchi pendant l'attente
+            cached = self._cache_get()
+            if cached is not None:
+                self._record(cache_hits=1)
+                return cached
+
+            token = self._acquire_shared_lock()
+            if token is None:
+                cached = self._wait_for_peer()
+                if cached is not None:
+                    self._record(cache_hits=1)
+                    return cached
+
+            self._record(cache_misses=1)
+            try:
+                stats = self.compute()
+                self._cache_set(stats)
+            finally:
+                self._release_shared_lock(token)
+            return stats
+
+    def invalidate(self):
+        """Vide le cache (local et Redis)"""
+        self._local_cache = None
+        self._local_expires_at = 0
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                redis_client.delete(self.CACHE_KEY)
+            except Exception:
+                pass
+
+    def get_metrics(self):
+        """
+        Compteurs du cache et latence Elasticsearch
+
+        Returns:
+            dict: Métriques courantes
+        """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+
+        lookups = metrics['cache_hits'] + metrics['cache_misses']
+        metrics['hit_ratio'] = round(metrics['cache_hits'] / lookups, 4) if lookups else 0.0
+        metrics['es_latency_ms_avg'] = round(metrics['es_latency_ms_total'] / metrics['es_queries'], 2) if metrics['es_queries'] else 0.0
+        metrics['es_latency_ms_total'] = round(metrics['es_latency_ms_total'], 2)
+        metrics['ttl_seconds'] = self.ttl
+        metrics['backend'] = 'redis' if self.redis_getter() is not None else 'memory'
+        return metrics
+
+
+# Instance globale (sera initialisée dans app.py avec les clients)
+stats_engine = None
+
+
+def init_stats_engine(es_getter, redis_getter=None, uploads_getter=None, **kwargs):
+    """Initialise le moteur de statistiques avec les accesseurs de clients"""
+    global stats_engine
+    stats_engine = StatsEngine(es_getter, redis_getter, uploads_getter, **kwargs)
+    return stats_engine
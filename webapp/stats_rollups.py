@@ -0,0 +1,587 @@
+"""
+LogStream Studio - Agrégats pré-calculés des logs (rollups)
+Documents de synthèse horaires et journaliers (nombre, échecs, montant par service) dans un index dédié,
+mis à jour en arrière-plan : la timeline de /api/stats ne relit les logs bruts que pour l'heure en cours
+"""
+
+import atexit
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from query_builder import terms_filter
+from stats_engine import RELEASE_LOCK_SCRIPT
+
+
+ONE_DAY = timedelta(days=1)
+# Borne de fin des plages ouvertes (logs horodatés dans le futur compris)
+FAR_FUTURE = datetime(2100, 1, 1)
+
+# Le nom ne doit pas correspondre à logs-* : les rollups seraient comptés comme des logs
+ROLLUP_INDEX = os.environ.get('STATS_ROLLUP_INDEX', 'rollup-logs-stats')
+
+ROLLUP_MAPPINGS = {
+    'properties': {
+        '@timestamp': {'type': 'date'},
+        'granularity': {'type': 'keyword'},
+        'count': {'type': 'long'},
+        'failed': {'type': 'long'},
+        'amount_sum': {'type': 'double'},
+        # Détail par service : conservé dans _source, non indexé (pas d'explosion du mapping)
+        'services': {'type': 'object', 'enabled': False},
+        'watermark': {'type': 'date'},
+        'updated_at': {'type': 'date'}
+    }
+}
+
+# service et amount sont lus dans _source : leur mapping diffère selon les index
+# (keyword dans logs-saas-*, text + .keyword ou chaîne CSV ailleurs)
+RUNTIME_MAPPINGS = {
+    'rollup_service': {
+        'type': 'keyword',
+        'script': "def s = params._source.service; if (s != null) { emit(s.toString()); }"
+    },
+    'rollup_amount': {
+        'type': 'double',
+        'script': (
+            "def a = params._source.amount; "
+            "if (a instanceof Number) { emit(((Number) a).doubleValue()); } "
+            "else if (a != null) { try { emit(Double.parseDouble(a.toString())); } catch (Exception e) {} }"
+        )
+    }
+}
+
+
+def iso(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parse_iso(value):
+    return datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+
+
+def floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def day_windows(start, end):
+    """Découpe [start, end) en fenêtres alignées sur les jours"""
+    day = floor_day(start)
+    while day < end:
+        yield max(start, day), min(day + ONE_DAY, end)
+        day += ONE_DAY
+
+
+# Prolonge le verrou seulement s'il porte encore notre jeton
+EXTEND_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+
+
+class LockLost(RuntimeError):
+    """Le verrou Redis a expiré ou a été repris par un autre worker pendant l'agrégation"""
+
+
+class StatsRollups:
+    """Maintient les rollups horaires/journaliers et construit la timeline de /api/stats"""
+
+    STATE_ID = '_state'
+    LOCK_KEY = 'logstream:rollups:lock'
+
+    def __init__(self, es_getter, redis_getter=None, source_index='logs-*', index=None, interval=None,
+                 lookback_hours=None, verify_interval=None, verify_days=None, router=None):
+        """
+        Args:
+            es_getter (callable): Retourne le client Elasticsearch (ou None)
+            redis_getter (callable): Retourne le client Redis (ou None), verrou entre workers
+            source_index (str): Pattern d'index des logs bruts
+            index (str): Index des rollups
+            interval (float): Période de mise à jour en secondes
+            lookback_hours (int): Heures déjà agrégées recalculées à chaque passage (logs en retard)
+            verify_interval (float): Période de la vérification des jours récents (secondes)
+            verify_days (int): Nombre de jours comparés aux logs bruts lors de la vérification
+            router (IndexRouter): Sélection des index bruts couvrant chaque plage (sinon source_index)
+        """
+        self.es_getter = es_getter
+        self.redis_getter = redis_getter or (lambda: None)
+        self.source_index = source_index
+        self.router = router
+        self.index = index or ROLLUP_INDEX
+        self.interval = interval if interval is not None else float(os.environ.get('ROLLUP_INTERVAL', '60'))
+        self.lookback = timedelta(hours=lookback_hours if lookback_hours is not None
+                                  else int(os.environ.get('ROLLUP_LOOKBACK_HOURS', '2')))
+        self.verify_interval = verify_interval if verify_interval is not None else float(os.environ.get('ROLLUP_VERIFY_INTERVAL', '600'))
+        self.verify_days = verify_days if verify_days is not None else int(os.environ.get('ROLLUP_VERIFY_DAYS', '7'))
+
+        self._index_ready = False
+        # Dernier watermark connu : la timeline ne relit pas le document d'état à chaque appel
+        self._watermark = None
+        self._last_verify = 0.0
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'passes': 0,
+            'errors': 0,
+            'buckets_written': 0,
+            'days_repaired': 0,
+            'timelines_from_rollups': 0,
+            'last_pass': None,
+            'last_pass_ms': 0.0,
+            'last_error': None
+        }
+
+    def _record(self, **values):
+        with self._metrics_lock:
+            for key, value in values.items():
+                self._metrics[key] += value
+
+    # ------------------------------------------
+    #  Index et état
+    # ------------------------------------------
+
+    def ensure_index(self, es_client):
+        """Crée l'index des rollups s'il n'existe pas"""
+        if self._index_ready:
+            return
+        if not es_client.indices.exists(index=self.index):
+            es_client.indices.create(index=self.index, mappings=ROLLUP_MAPPINGS,
+                                     settings={'number_of_shards': 1, 'number_of_replicas': 0})
+        self._index_ready = True
+
+    def get_state(self, es_client):
+        """
+        Document d'état : 'watermark' = fin de la dernière heure close agrégée
+
+        Returns:
+            dict: État, ou None si les rollups n'ont pas encore été construits
+        """
+        try:
+            return es_client.get(index=self.index, id=self.STATE_ID)['_source']
+        except Exception:
+            return None
+
+    def _save_state(self, es_client, **fields):
+        state = dict(self.get_state(es_client) or {}, granularity='state', updated_at=iso(datetime.utcnow()))
+        state.update(fields)
+        es_client.index(index=self.index, id=self.STATE_ID, document=state)
+
+    # ------------------------------------------
+    #  Agrégation des logs bruts
+    # ------------------------------------------
+
+    def source_target(self, start, end=None):
+        """Index bruts à interroger pour [start, end] (None : aucun index ne couvre la plage)"""
+        if self.router is None:
+            return self.source_index
+        return self.router.target(start, end or FAR_FUTURE)
+
+    @staticmethod
+    def bucket_aggs():
+        """Sous-agrégations d'un bucket : échecs et montant, au total et par service"""
+        metrics = {
+            'failed': {'filter': terms_filter('level', 'failed')},
+            'amount': {'sum': {'field': 'rollup_amount'}}
+        }
+        return dict(metrics, services={
+            'terms': {'field': 'rollup_service', 'size': 100},
+            'aggs': metrics
+        })
+
+    def build_rollup_query(self, start, end):
+        """
+        Agrège [start, end) par heure, et par jour depuis le début du premier jour
+
+        Returns:
+            dict: Corps de la requête _search sur les logs bruts
+        """
+        day_start = floor_day(start)
+        return {
+            'size': 0,
+            'runtime_mappings': RUNTIME_MAPPINGS,
+            'query': {'range': {'@timestamp': {'gte': iso(day_start), 'lt': iso(end)}}},
+            'aggs': {
+                'hours': {
+                    'filter': {'range': {'@timestamp': {'gte': iso(start)}}},
+                    'aggs': {'buckets': {
+                        'date_histogram': {'field': '@timestamp', 'fixed_interval': '1h', 'min_doc_count': 1},
+                        'aggs': self.bucket_aggs()
+                    }}
+                },
+                'days': {
+                    'date_histogram': {'field': '@timestamp', 'calendar_interval': 'day', 'min_doc_count': 1},
+                    'aggs': self.bucket_aggs()
+                }
+            }
+        }
+
+    @staticmethod
+    def bucket_doc(bucket, granularity):
+        """Document de rollup d'un bucket date_histogram"""
+        services = {
+            service['key']: {
+                'count': service['doc_count'],
+                'failed': service['failed']['doc_count'],
+                'amount_sum': round(service['amount']['value'] or 0.0, 2)
+            }
+            for service in bucket.get('services', {}).get('buckets', [])
+        }
+        return {
+            '@timestamp': iso(datetime.utcfromtimestamp(bucket['key'] / 1000)),
+            'granularity': granularity,
+            'count': bucket['doc_count'],
+            'failed': bucket['failed']['doc_count'],
+            'amount_sum': round(bucket['amount']['value'] or 0.0, 2),
+            'services': services,
+            'updated_at': iso(datetime.utcnow())
+        }
+
+    def roll_range(self, es_client, start, end, token=None):
+        """
+        Recalcule les rollups horaires de [start, end) et journaliers des jours concernés
+        (identifiants déterministes : un recalcul remplace les documents existants)
+
+        Args:
+            token (str): Jeton du verrou, prolongé avant chaque jour (premier passage et
+                reconstruction parcourent tout l'historique)
+
+        Returns:
+            int: Nombre de documents écrits
+
+        Raises:
+            LockLost: Si le verrou a été perdu (un autre worker a pris le relais)
+        """
+        operations = []
+        for window_start, window_end in day_windows(start, end):
+            if not self._extend_lock(token):
+                raise LockLost('Rollup lock lost')
+            target = self.source_target(floor_day(window_start), window_end)
+            if target is None:
+                continue
+            response = es_client.search(index=target, body=self.build_rollup_query(window_start, window_end))
+            aggs = response.get('aggregations', {})
+            docs = [self.bucket_doc(b, 'hour') for b in aggs.get('hours', {}).get('buckets', {}).get('buckets', [])]
+            docs += [self.bucket_doc(b, 'day') for b in aggs.get('days', {}).get('buckets', [])]
+            for doc in docs:
+                operations.append({'index': {'_index': self.index, '_id': f"{doc['granularity']}-{doc['@timestamp']}"}})
+                operations.append(doc)
+        if operations:
+            es_client.bulk(operations=operations, refresh='wait_for')
+        self._record(buckets_written=len(operations) // 2)
+        return len(operations) // 2
+
+    # ------------------------------------------
+    #  Mise à jour incrémentale
+    # ------------------------------------------
+
+    def run_pass(self, now=None):
+        """
+        Agrège les heures closes depuis le dernier passage (premier passage : tout l'historique)
+
+        Returns:
+            bool: True si un passage a été effectué
+        """
+        es_client = self.es_getter()
+        if es_client is None:
+            return False
+        token = self._acquire_lock()
+        if token is None:
+            return False
+
+        started = time.perf_counter()
+        try:
+            self.ensure_index(es_client)
+            watermark = floor_hour(now or datetime.utcnow())
+            state = self.get_state(es_client)
+
+            if state is None:
+                # Premier passage : depuis le plus ancien log
+                response = es_client.search(index=self.source_index, body={
+                    'size': 0, 'aggs': {'first': {'min': {'field': '@timestamp'}}}
+                })
+                first_ms = response.get('aggregations', {}).get('first', {}).get('value')
+                start = datetime.utcfromtimestamp(first_ms / 1000) if first_ms else watermark
+            else:
+                start = min(parse_iso(state['watermark']), watermark) - self.lookback
+
+            if start < watermark:
+                self.roll_range(es_client, start, watermark, token)
+            self._save_state(es_client, watermark=iso(watermark))
+            self._watermark = iso(watermark)
+
+            if time.time() - self._last_verify >= self.verify_interval:
+                self._last_verify = time.time()
+                self.verify(es_client, watermark, token)
+
+            with self._metrics_lock:
+                self._metrics['passes'] += 1
+                self._metrics['last_pass'] = datetime.utcnow().isoformat() + 'Z'
+                self._metrics['last_pass_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            return True
+        except Exception as e:
+            self._record(errors=1)
+            with self._metrics_lock:
+                self._metrics['last_error'] = str(e)
+            print(f"Stats rollup error: {e}")
+            return False
+        finally:
+            self._release_lock(token)
+
+    def verify(self, es_client, watermark, token=None):
+        """
+        Compare les jours récents aux logs bruts et recalcule ceux qui diffèrent
+        (logs arrivés après le passage de leur heure, au-delà de la fenêtre lookback)
+
+        Returns:
+            list: Jours recalculés (YYYY-MM-DD)
+        """
+        since = floor_day(watermark) - timedelta(days=self.verify_days)
+        bounds = {'gte': iso(since), 'lt': iso(watermark)}
+        target = self.source_target(since, watermark)
+        if target is None:
+            return []
+        raw = es_client.search(index=target, body={
+            'size': 0,
+            'query': {'range': {'@timestamp': bounds}},
+            'aggs': {'days': {'date_histogram': {'field': '@timestamp', 'calendar_interval': 'day',
+                                                 'min_doc_count': 1, 'format': 'yyyy-MM-dd'}}}
+        })
+        rolled = self._day_counts(es_client, bounds, self.verify_days + 1)
+
+        repaired = []
+        for bucket in raw.get('aggregations', {}).get('days', {}).get('buckets', []):
+            if rolled.get(bucket['key_as_string']) != bucket['doc_count']:
+                day = datetime.strptime(bucket['key_as_string'], '%Y-%m-%d')
+                self.roll_range(es_client, day, min(day + ONE_DAY, watermark), token)
+                repaired.append(bucket['key_as_string'])
+        self._record(days_repaired=len(repaired))
+        return repaired
+
+    def rebuild(self):
+        """
+        Reconstruit tous les rollups depuis le plus ancien log (tout de suite si le verrou
+        est libre, sinon au prochain passage du worker qui le détient)
+
+        Returns:
+            bool: False si Elasticsearch est indisponible
+        """
+        es_client = self.es_getter()
+        if es_client is None:
+            return False
+        try:
+            es_client.delete(index=self.index, id=self.STATE_ID, refresh='wait_for')
+        except Exception:
+            pass
+        self._watermark = None
+        self.run_pass()
+        return True
+
+    def _acquire_lock(self):
+        """Un seul worker agrège à la fois : '' sans Redis, None si le verrou est déjà pris"""
+        redis_client = self.redis_getter()
+        if redis_client is None:
+            return ''
+        token = uuid.uuid4().hex
+        try:
+            if redis_client.set(self.LOCK_KEY, token, nx=True, px=self.lock_ttl_ms):
+                return token
+            return None
+        except Exception:
+            return ''
+
+    @property
+    def lock_ttl_ms(self):
+        """Durée du verrou, renouvelée à chaque jour agrégé"""
+        return int(max(self.interval, 30) * 2000)
+
+    def _extend_lock(self, token):
+        """
+        Prolonge le verrou pendant une agrégation longue
+
+        Returns:
+            bool: False si le verrou n'appartient plus à ce worker
+        """
+        redis_client = self.redis_getter()
+        if not token or redis_client is None:
+            return True
+        try:
+            return bool(redis_client.eval(EXTEND_LOCK_SCRIPT, 1, self.LOCK_KEY, token, self.lock_ttl_ms))
+        except Exception as e:
+            # Redis injoignable : le verrou ne peut pas être vérifié, l'agrégation continue
+            print(f"Rollup lock extension error (Redis): {e}")
+            return True
+
+    def _release_lock(self, token):
+        redis_client = self.redis_getter()
+        if not token or redis_client is None:
+            return
+        try:
+            redis_client.eval(RELEASE_LOCK_SCRIPT, 1, self.LOCK_KEY, token)
+        except Exception:
+            pass
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.run_pass()
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """Démarre le thread de mise à jour (sans effet s'il tourne déjà)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='stats-rollups', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    # ------------------------------------------
+    #  Lecture
+    # ------------------------------------------
+
+    def _day_counts(self, es_client, bounds, size):
+        response = es_client.search(index=self.index, body={
+            'size': size,
+            '_source': ['@timestamp', 'count'],
+            'query': {'bool': {'filter': [
+                {'term': {'granularity': 'day'}},
+                {'range': {'@timestamp': bounds}}
+            ]}},
+            'sort': [{'@timestamp': 'desc'}]
+        })
+        return {hit['_source']['@timestamp'][:10]: hit['_source']['count']
+                for hit in response.get('hits', {}).get('hits', [])}
+
+    def _timeline_searches(self, es_client, watermark, days):
+        """
+        Rollups journaliers, document d'état et logs bruts depuis le watermark en un seul msearch
+
+        Returns:
+            list: Réponses (jours, état, heure en cours si un index la couvre), None en cas d'erreur
+        """
+        searches = [
+            {'index': self.index},
+            {
+                'size': days,
+                '_source': ['@timestamp', 'count'],
+                'query': {'term': {'granularity': 'day'}},
+                'sort': [{'@timestamp': 'desc'}]
+            },
+            # Watermark courant : vérifie que celui gardé en mémoire est toujours à jour
+            {'index': self.index},
+            {'size': 1, '_source': ['watermark'], 'query': {'ids': {'values': [self.STATE_ID]}}}
+        ]
+        # Heure en cours : seuls les index couvrant la période après le watermark
+        target = self.source_target(parse_iso(watermark))
+        if target is not None:
+            searches += [
+                {'index': target},
+                {
+                    'size': 0,
+                    'query': {'range': {'@timestamp': {'gte': watermark}}},
+                    'aggs': {'days': {'date_histogram': {'field': '@timestamp', 'calendar_interval': 'day',
+                                                         'min_doc_count': 1, 'format': 'yyyy-MM-dd'}}}
+                }
+            ]
+        responses = es_client.msearch(searches=searches)['responses']
+        if any('error' in response for response in responses):
+            return None
+        return responses
+
+    def timeline(self, days=30):
+        """
+        Timeline journalière de /api/stats : rollups des heures closes + logs bruts depuis le watermark
+        (mêmes bornes que l'ancien histogramme : les 'days' derniers jours jusqu'au dernier log)
+
+        Le watermark est gardé en mémoire entre deux passages ; le document d'état n'est lu
+        séparément qu'au premier appel, puis vérifié dans le msearch de la timeline
+
+        Returns:
+            list: [{'date': 'YYYY-MM-DD', 'count': n}], ou None si les rollups ne sont pas prêts
+        """
+        self.start()
+        es_client = self.es_getter()
+        if es_client is None:
+            return None
+        watermark = self._watermark
+        if watermark is None:
+            state = self.get_state(es_client)
+            if state is None:
+                return None
+            watermark = self._watermark = state['watermark']
+
+        responses = self._timeline_searches(es_client, watermark, days)
+        if responses is None:
+            return None
+        hits = responses[1].get('hits', {}).get('hits', [])
+        current = hits[0]['_source'].get('watermark') if hits else None
+        if current != watermark:
+            # Passage d'un autre worker (ou reconstruction) : les rollups couvrent une autre
+            # période que celle du watermark en mémoire, relecture avec le watermark courant
+            self._watermark = current
+            if current is None:
+                return None
+            responses = self._timeline_searches(es_client, current, days)
+            if responses is None:
+                return None
+
+        counts = {}
+        for hit in responses[0].get('hits', {}).get('hits', []):
+            date = hit['_source']['@timestamp'][:10]
+            counts[date] = counts.get(date, 0) + hit['_source']['count']
+        open_buckets = responses[2].get('aggregations', {}).get('days', {}).get('buckets', []) if len(responses) > 2 else []
+        for bucket in open_buckets:
+            counts[bucket['key_as_string']] = counts.get(bucket['key_as_string'], 0) + bucket['doc_count']
+        if not counts:
+            return []
+
+        # Jours consécutifs (les jours sans log valent 0, comme le date_histogram brut)
+        last = datetime.strptime(max(counts), '%Y-%m-%d')
+        first = max(datetime.strptime(min(counts), '%Y-%m-%d'), last - timedelta(days=days - 1))
+        timeline = []
+        day = first
+        while day <= last:
+            date = day.strftime('%Y-%m-%d')
+            timeline.append({'date': date, 'count': counts.get(date, 0)})
+            day += ONE_DAY
+        self._record(timelines_from_rollups=1)
+        return timeline
+
+    def get_metrics(self):
+        """
+        Compteurs des passages de mise à jour
+
+        Returns:
+            dict: passes, errors, buckets_written, days_repaired, watermark...
+        """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics['index'] = self.index
+        metrics['interval_seconds'] = self.interval
+        metrics['lookback_hours'] = int(self.lookback.total_seconds() // 3600)
+        metrics['running'] = self._thread is not None and self._thread.is_alive()
+        es_client = self.es_getter()
+        state = self.get_state(es_client) if es_client is not None else None
+        metrics['watermark'] = state.get('watermark') if state else None
+        return metrics
+
+
+# Instance globale (sera initialisée dans app.py avec les clients)
+stats_rollups = None
+
+
+def init_stats_rollups(es_getter, redis_getter=None, **kwargs):
+    """Initialise les rollups de la timeline et les arrête à la sortie du processus"""
+    global stats_rollups
+    stats_rollups = StatsRollups(es_getter, redis_getter, **kwargs)
+    atexit.register(stats_rollups.stop)
+    return stats_rollups
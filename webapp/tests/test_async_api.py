@@ -0,0 +1,220 @@
+# ============================================
+# Tests API asynchrone (/api/search, /api/stats, /api/health)
+# ============================================
+import pytest
+import asyncio
+import json
+import time
+
+from async_api import AsyncAPI
+from auth import AuthManager
+from database import db_manager
+
+
+class FakeAsyncES:
+    """Elasticsearch asynchrone simulé : chaque appel attend 'delay' secondes"""
+
+    def __init__(self, delay=0.0, hits=None):
+        self.delay = delay
+        self.hits = hits or []
+        self.calls = []
+        self.counts = []
+
+    async def search(self, index=None, body=None):
+        self.calls.append(body)
+        await asyncio.sleep(self.delay)
+        return {
+            'hits': {'total': {'value': len(self.hits)}, 'hits': self.hits},
+            'aggregations': {'errors': {'doc_count': 3}, 'max_date': {'value': 1767434400000}}
+        }
+
+    async def count(self, index=None, query=None):
+        self.counts.append((index, query))
+        return {'count': 15}
+
+    async def ping(self):
+        await asyncio.sleep(self.delay)
+        return True
+
+    @property
+    def cluster(self):
+        es = self
+
+        class Cluster:
+            async def health(self):
+                await asyncio.sleep(es.delay)
+                return {'status': 'green', 'number_of_nodes': 1}
+        return Cluster()
+
+
+class FakeAsyncCollection:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def count_documents(self, query):
+        await asyncio.sleep(self.delay)
+        return 7
+
+
+class FakeAsyncDB:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def __getitem__(self, name):
+        return FakeAsyncCollection(self.delay)
+
+    async def command(self, name):
+        await asyncio.sleep(self.delay)
+        return {'collections': 2, 'dataSize': 10}
+
+
+class FakeClients:
+    pool_config = db_manager.pool_config
+
+    def __init__(self, es=None, mongo=None):
+        self._es = es
+        self._mongo = mongo
+        self.errors = {}
+
+    def es(self):
+        return self._es
+
+    def mongo_db(self):
+        return self._mongo
+
+    def redis(self):
+        return None
+
+    def http(self):
+        return None
+
+    async def close(self):
+        pass
+
+
+def call(api, path, token=None, query=b''):
+    """Exécute une requête ASGI et retourne (statut, corps JSON)"""
+    sent = []
+    headers = [(b'authorization', f'Bearer {token}'.encode())] if token else []
+    scope = {'type': 'http', 'path': path, 'method': 'GET', 'headers': headers,
+             'query_string': query, 'client': ('127.0.0.1', 1234)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(api(scope, None, send))
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+@pytest.fixture
+def auth():
+    return AuthManager(None)
+
+
+@pytest.fixture
+def token(auth):
+    return auth.generate_token({'_id': 'u1', 'username': 'alice', 'email': 'a@example.com', 'role': 'admin'})
+
+
+class TestAsyncAPI:
+    """Tests de l'application ASGI"""
+
+    def test_stats_subqueries_run_concurrently(self):
+        """Test: L'agrégation Elasticsearch et le comptage MongoDB sont lancés en même temps"""
+        api = AsyncAPI(clients=FakeClients(es=FakeAsyncES(delay=0.2), mongo=FakeAsyncDB(delay=0.2)))
+
+        started = time.perf_counter()
+        stats = asyncio.run(api.compute_stats())
+
+        assert time.perf_counter() - started < 0.35
+        assert stats['errors'] == 3
+        assert stats['files_uploaded'] == 7
+
+    def test_stats_match_flask_query(self):
+        """Test: Même requête que les workers Flask, résultat écrit sous une clé distincte"""
+        from async_api import STATS_CACHE_KEY
+        from stats_engine import StatsEngine
+
+        class FakeAsyncRedis:
+            def __init__(self):
+                self.writes = {}
+
+            async def mget(self, keys):
+                return [None for _ in keys]
+
+            async def setex(self, key, ttl, value):
+                self.writes[key] = value
+
+        es = FakeAsyncES()
+        redis_client = FakeAsyncRedis()
+        clients = FakeClients(es=es)
+        clients.redis = lambda: redis_client
+        api = AsyncAPI(clients=clients)
+
+        status, stats = asyncio.run(api.stats({}))
+
+        assert status == 200 and stats['logs_today'] == 15
+        assert es.calls[0] == StatsEngine.build_query(timeline=True)
+        index, query = es.counts[0]
+        assert index == 'logs-*'
+        assert query['range']['@timestamp'] == {'gte': '2026-01-02T10:00:00.000Z', 'lte': '2026-01-03T10:00:00.000Z'}
+        assert list(redis_client.writes) == [STATS_CACHE_KEY]
+
+    def test_concurrent_stats_share_one_computation(self):
+        """Test: Les requêtes simultanées attendent le même calcul (single-flight)"""
+        es = FakeAsyncES(delay=0.1)
+        api = AsyncAPI(clients=FakeClients(es=es))
+
+        async def burst():
+            return await asyncio.gather(*(api.stats({}) for _ in range(50)))
+
+        results = asyncio.run(burst())
+
+        assert len(es.calls) == 1
+        assert all(status == 200 for status, _ in results)
+
+    def test_health_probes_in_parallel(self):
+        """Test: Les sondes s'exécutent en parallèle et les services absents sont signalés"""
+        api = AsyncAPI(clients=FakeClients(es=FakeAsyncES(delay=0.2), mongo=FakeAsyncDB(delay=0.2)))
+
+        started = time.perf_counter()
+        health = asyncio.run(api.check_health())
+
+        # ping + cluster.health (ES) en série, en parallèle de MongoDB
+        assert time.perf_counter() - started < 0.6
+        assert health['services']['elasticsearch']['status'] == 'healthy'
+        assert health['services']['mongodb']['status'] == 'healthy'
+        assert health['services']['redis']['status'] == 'unhealthy'
+        assert health['overall_status'] == 'degraded'
+
+    def test_requires_token(self, auth):
+        """Test: Les endpoints nécessitent un token valide"""
+        api = AsyncAPI(clients=FakeClients(), auth_manager=auth)
+
+        status, body = call(api, '/api/stats')
+        assert status == 401
+        assert body['code'] == 'AUTH_REQUIRED'
+
+        status, body = call(api, '/api/stats', token='invalid')
+        assert status == 401
+        assert body['code'] == 'TOKEN_INVALID'
+
+    def test_search_formats_hits(self, auth, token):
+        """Test: La recherche retourne le même format que la route Flask"""
+        hits = [{'_source': {'@timestamp': '2026-01-01T00:00:00Z', 'status': 'failed',
+                             'service': 'payment', 'message': 'boom'}}]
+        api = AsyncAPI(clients=FakeClients(es=FakeAsyncES(hits=hits)), auth_manager=auth)
+
+        status, body = call(api, '/api/search', token=token, query=b'query=boom&level=failed')
+
+        assert status == 200
+        assert body['success'] is True
+        assert body['total'] == 1
+        assert body['logs'][0]['level'] == 'failed'
+        assert body['query_params']['level'] == 'failed'
+
+    def test_unknown_route(self, auth, token):
+        """Test: Les autres chemins restent servis par Flask"""
+        api = AsyncAPI(clients=FakeClients(), auth_manager=auth)
+        status, _ = call(api, '/api/upload', token=token)
+        assert status == 404
@@ -0,0 +1,511 @@
+# ============================================
+# Tests Authentification
+# ============================================
+import pytest
+import time
+
+import jwt
+
+
+@pytest.fixture
+def manager():
+    """AuthManager sans MongoDB"""
+    from auth import AuthManager
+    return AuthManager(None)
+
+
+class TestTokenCache:
+    """Tests du cache de vérification des tokens JWT"""
+
+    def test_token_is_decoded_once(self, manager, monkeypatch):
+        """Test: Un token déjà vérifié ne repasse pas par jwt.decode"""
+        token = manager.generate_token({'username': 'alice', 'role': 'user'})
+        calls = []
+        original = jwt.decode
+        monkeypatch.setattr(jwt, 'decode', lambda *a, **k: calls.append(1) or original(*a, **k))
+
+        for _ in range(5):
+            assert manager.verify_token(token)['username'] == 'alice'
+
+        assert len(calls) == 1
+        metrics = manager.get_token_cache_metrics()
+        assert metrics['misses'] == 1
+        assert metrics['hits'] == 4
+
+    def test_request_memo(self, manager, app):
+        """Test: Le même token n'est vérifié qu'une fois par requête"""
+        token = manager.generate_token({'username': 'alice', 'role': 'user'})
+        with app.test_request_context('/'):
+            manager.verify_token(token)
+            manager.verify_token(token)
+            manager.verify_token(token)
+
+        metrics = manager.get_token_cache_metrics()
+        assert metrics['memo_hits'] == 2
+        assert metrics['misses'] == 1
+
+    def test_invalid_token_is_not_cached(self, manager):
+        """Test: Un token invalide n'entre pas dans le cache"""
+        assert manager.verify_token('not.a.token') is None
+        assert manager.verify_token('not.a.token') is None
+        metrics = manager.get_token_cache_metrics()
+        assert metrics['misses'] == 2
+        assert metrics['entries'] == 0
+
+    def test_cache_entry_expires_with_token(self, manager):
+        """Test: Une entrée n'est pas servie après l'expiration du token"""
+        payload = {'username': 'alice', 'role': 'user', 'exp': int(time.time()) + 1}
+        token = jwt.encode(payload, manager.secret_key, algorithm=manager.algorithm)
+        assert manager.verify_token(token) is not None
+
+        time.sleep(1.1)
+        assert manager.verify_token(token) is None
+        assert manager.get_token_cache_metrics()['expired'] == 1
+
+    def test_cache_is_bounded(self, manager):
+        """Test: Le cache évince les tokens les moins récemment utilisés"""
+        manager.token_cache_size = 3
+        for i in range(5):
+            manager.verify_token(manager.generate_token({'username': f'user{i}'}))
+
+        metrics = manager.get_token_cache_metrics()
+        assert metrics['entries'] == 3
+        assert metrics['evictions'] == 2
+
+    def test_returned_payload_is_a_copy(self, manager):
+        """Test: Modifier le payload retourné ne modifie pas le cache"""
+        token = manager.generate_token({'username': 'alice', 'role': 'user'})
+        manager.verify_token(token)['role'] = 'admin'
+        assert manager.verify_token(token)['role'] == 'user'
+
+    def test_invalidate_token(self, manager):
+        """Test: Un token invalidé est de nouveau décodé"""
+        token = manager.generate_token({'username': 'alice'})
+        manager.verify_token(token)
+        manager.invalidate_token(token)
+        manager.verify_token(token)
+        assert manager.get_token_cache_metrics()['misses'] == 2
+
+
+class FakeUsersCollection:
+    """Collection users minimale : enregistre les appels bulk_write"""
+
+    def __init__(self):
+        self.batches = []
+
+    def bulk_write(self, operations, ordered=True):
+        self.batches.append(operations)
+
+
+class TestLastLoginWriter:
+    """Tests des mises à jour différées de last_login"""
+
+    def test_logins_are_coalesced_per_user(self):
+        """Test: Plusieurs connexions du même utilisateur ne font qu'une écriture"""
+        from datetime import datetime, timedelta
+        from login_activity import LastLoginWriter
+
+        collection = FakeUsersCollection()
+        writer = LastLoginWriter(lambda: collection, flush_interval=60)
+        first = datetime(2026, 1, 3, 10, 0)
+        writer.record('u1', first)
+        writer.record('u1', first + timedelta(minutes=5))
+        writer.record('u1', first + timedelta(minutes=1))
+        writer.record('u2', first)
+
+        assert writer.flush() == 2
+        operations = collection.batches[0]
+        assert len(operations) == 2
+        update = next(op for op in operations if op._filter == {'_id': 'u1'})
+        assert update._doc == {'$max': {'last_login': first + timedelta(minutes=5)}}
+        assert writer.get_metrics()['coalesced'] == 2
+
+    def test_pending_updates_are_bounded(self):
+        """Test: Au-delà de max_pending, les nouvelles mises à jour sont abandonnées"""
+        from login_activity import LastLoginWriter
+
+        writer = LastLoginWriter(lambda: FakeUsersCollection(), max_pending=2, flush_interval=60)
+        assert writer.record('u1')
+        assert writer.record('u2')
+        assert not writer.record('u3')
+        # Un utilisateur déjà en attente est toujours accepté
+        assert writer.record('u1')
+        assert writer.get_metrics()['dropped'] == 1
+
+    def test_batch_size_triggers_background_flush(self):
+        """Test: Le thread écrit dès que batch_size utilisateurs sont en attente"""
+        from login_activity import LastLoginWriter
+
+        collection = FakeUsersCollection()
+        writer = LastLoginWriter(lambda: collection, batch_size=3, flush_interval=60)
+        for user_id in ('u1', 'u2', 'u3'):
+            writer.record(user_id)
+
+        deadline = time.time() + 5
+        while not collection.batches and time.time() < deadline:
+            time.sleep(0.02)
+        writer.stop()
+        assert sum(len(batch) for batch in collection.batches) == 3
+
+    def test_stop_flushes_pending_updates(self):
+        """Test: L'arrêt écrit les mises à jour restantes"""
+        from login_activity import LastLoginWriter
+
+        collection = FakeUsersCollection()
+        writer = LastLoginWriter(lambda: collection, flush_interval=60)
+        writer.record('u1')
+        writer.stop()
+        assert writer.get_metrics()['written'] == 1
+
+
+class FakeCredentialsCollection:
+    """Collection users minimale pour verify_credentials"""
+
+    def __init__(self, user):
+        self.user = user
+        self.updates = []
+
+    def find_one(self, query):
+        return self.user if query.get('username') == self.user['username'] else None
+
+    def update_one(self, query, update):
+        self.updates.append((query, update))
+        self.user.update(update['$set'])
+
+
+class TestPasswordHasher:
+    """Tests du service de hachage des mots de passe"""
+
+    def test_hash_and_verify_in_process_pool(self):
+        """Test: Hachage et vérification exécutés dans le pool de processus"""
+        from password_hashing import PasswordHasher
+
+        hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1)
+        try:
+            password_hash = hasher.hash('secret')
+            assert password_hash.startswith('pbkdf2:sha256:1000$')
+            assert hasher.verify(password_hash, 'secret')
+            assert not hasher.verify(password_hash, 'wrong')
+        finally:
+            hasher.shutdown()
+        assert hasher.get_metrics()['verifications'] == 2
+
+    def test_needs_rehash(self):
+        """Test: Un hachage produit avec d'autres paramètres doit être mis à niveau"""
+        from password_hashing import PasswordHasher
+        from werkzeug.security import generate_password_hash
+
+        hasher = PasswordHasher(method='pbkdf2', workers=0)
+        assert not hasher.needs_rehash(generate_password_hash('x', method='pbkdf2:sha256:600000'))
+        assert hasher.needs_rehash(generate_password_hash('x', method='pbkdf2:sha256:1000'))
+
+    def test_concurrency_cap(self):
+        """Test: Au-delà de la limite de concurrence, HashingBusy est levée"""
+        from password_hashing import PasswordHasher, HashingBusy
+
+        hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=0, max_concurrency=1, wait_timeout=0.01)
+        hasher._slots.acquire()
+        with pytest.raises(HashingBusy):
+            hasher.verify('pbkdf2:sha256:1000$salt$hash', 'x')
+        assert hasher.get_metrics()['rejected'] == 1
+
+    def test_rehash_on_login(self):
+        """Test: Une connexion réussie met à niveau un ancien hachage"""
+        from auth import AuthManager
+        from password_hashing import PasswordHasher
+        from werkzeug.security import generate_password_hash
+
+        user = {'_id': 1, 'username': 'alice', 'password_hash': generate_password_hash('secret', method='pbkdf2:sha256:1000')}
+        users = FakeCredentialsCollection(user)
+        manager = AuthManager(users, hasher=PasswordHasher(method='pbkdf2:sha256:2000', workers=0))
+
+        assert manager.verify_credentials('alice', 'secret')['valid']
+        assert user['password_hash'].startswith('pbkdf2:sha256:2000$')
+        assert manager.hasher.get_metrics()['rehashes'] == 1
+
+        # Plus de mise à niveau une fois le hachage à jour
+        manager.verify_credentials('alice', 'secret')
+        assert len([u for u in users.updates if 'password_hash' in u[1]['$set']]) == 1
+
+    def test_admin_hash_is_cached(self):
+        """Test: Le hachage admin n'est calculé qu'une fois par processus"""
+        from auth import AuthManager
+        from password_hashing import PasswordHasher
+
+        hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=0)
+        first = AuthManager(None, hasher=hasher)
+        second = AuthManager(None, hasher=hasher)
+        assert first.admin_password_hash == second.admin_password_hash
+        assert second.verify_credentials('admin', 'admin123')['valid']
+
+    def test_admin_hash_cache_holds_no_plaintext(self):
+        """Test: Seul le hachage admin est conservé, indexé par méthode"""
+        import password_hashing
+
+        password_hashing.admin_password_hash('pbkdf2:sha256:1000')
+        assert 'pbkdf2:sha256:1000' in password_hashing._admin_hashes
+        assert 'admin123' not in repr(password_hashing._admin_hashes)
+
+
+class FakeIndexCollection:
+    """Collection minimale : enregistre les appels create_index"""
+
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def create_index(self, keys, **options):
+        if self.name in self.db.failing:
+            from pymongo.errors import OperationFailure
+            raise OperationFailure('E11000 duplicate key error')
+        self.db.created.append((self.name, keys, options))
+        return options['name']
+
+
+class FakeIndexDatabase:
+    def __init__(self, failing=()):
+        self.created = []
+        self.failing = failing
+
+    def __getitem__(self, name):
+        return FakeIndexCollection(self, name)
+
+
+class TestIndexBootstrap:
+    """Tests de la création des index MongoDB au démarrage"""
+
+    def test_all_indexes_are_requested(self):
+        """Test: Les index unique users et les index uploads/search_history sont créés"""
+        from database import DatabaseManager
+
+        db = FakeIndexDatabase()
+        results = DatabaseManager().ensure_indexes(db)
+
+        assert all(r['status'] == 'ok' for r in results)
+        created = {(collection, options['name']): options for collection, _, options in db.created}
+        assert created[('users', 'username_unique')]['unique'] is True
+        assert created[('users', 'email_unique')]['unique'] is True
+        assert ('search_history', 'timestamp_desc') in created
+        assert ('uploads', 'status') in created
+        assert ('uploads', 'uploaded_at_desc') in created
+
+    def test_failing_index_is_reported(self):
+        """Test: Un index impossible à créer (doublons) est signalé sans bloquer les autres"""
+        from database import DatabaseManager
+
+        db = FakeIndexDatabase(failing=('users',))
+        results = DatabaseManager().ensure_indexes(db)
+
+        errors = [r for r in results if r['status'] == 'error']
+        assert {r['collection'] for r in errors} == {'users'}
+        assert len(db.created) == len(results) - len(errors)
+
+    def test_plan_stages(self):
+        """Test: Les étapes d'un plan d'exécution sont extraites récursivement"""
+        from database import plan_stages
+
+        plan = {'stage': 'SUBPLAN', 'inputStage': {'stage': 'FETCH', 'inputStage': {
+            'stage': 'OR', 'inputStages': [{'stage': 'IXSCAN'}, {'stage': 'IXSCAN'}]}}}
+        assert plan_stages(plan) == ['SUBPLAN', 'FETCH', 'OR', 'IXSCAN', 'IXSCAN']
+
+    def test_duplicate_signup_race(self):
+        """Test: Un doublon refusé par l'index unique donne un message clair"""
+        from auth import AuthManager
+        from password_hashing import PasswordHasher
+        from pymongo.errors import DuplicateKeyError
+
+        class RacingUsers:
+            def find_one(self, query):
+                return None
+
+            def insert_one(self, doc):
+                raise DuplicateKeyError('E11000 duplicate key error index: email_unique')
+
+        manager = AuthManager(RacingUsers(), hasher=PasswordHasher(method='pbkdf2:sha256:1000', workers=0))
+        result = manager.create_user('bob', 'bob@example.com', 'secret1')
+        assert not result['success']
+        assert 'email' in result['message']
+
+
+class FakeRedis:
+    """Sous-ensemble de Redis (decode_responses=True) utilisé par le cache des profils"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        target = self.hashes.setdefault(key, {})
+        if mapping:
+            target.update({k: str(v) for k, v in mapping.items()})
+        if field is not None:
+            target[field] = str(value)
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def expire(self, key, seconds):
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.zsets.pop(key, None)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if score <= high]:
+            del zset[member]
+
+    def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        return [getattr(self.redis_client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class CountingUsers:
+    """Collection users comptant les lectures MongoDB"""
+
+    def __init__(self, users):
+        self.users = {user['username']: user for user in users}
+        self.reads = 0
+
+    def find_one(self, query, projection=None):
+        self.reads += 1
+        user = self.users.get(query.get('username'))
+        if user and query.get('is_active') and not user.get('is_active'):
+            return None
+        return dict(user) if user else None
+
+    def update_one(self, query, update):
+        pass
+
+
+class TestUserCacheAndRevocation:
+    """Tests du cache Redis des profils et de la révocation des tokens"""
+
+    @pytest.fixture
+    def setup(self):
+        from auth import AuthManager
+        from password_hashing import PasswordHasher
+        from user_cache import UserCache, TokenRevocations
+        from werkzeug.security import generate_password_hash
+        from bson import ObjectId
+
+        redis_client = FakeRedis()
+        users = CountingUsers([{
+            '_id': ObjectId(), 'username': 'alice', 'email': 'alice@example.com', 'role': 'user',
+            'is_active': True, 'password_hash': generate_password_hash('secret', method='pbkdf2:sha256:1000')
+        }])
+        manager = AuthManager(users, hasher=PasswordHasher(method='pbkdf2:sha256:1000', workers=0))
+        manager.user_cache = UserCache(lambda: redis_client, lambda: users)
+        manager.revocations = TokenRevocations(lambda: redis_client)
+        return manager, users, redis_client
+
+    def test_login_reads_mongodb_once(self, setup):
+        """Test: Une connexion réussie ne fait qu'une lecture MongoDB, sans profil copié dans Redis"""
+        manager, users, redis_client = setup
+        for _ in range(3):
+            assert manager.verify_credentials('alice', 'secret')['valid']
+        assert users.reads == 3
+        assert redis_client.hgetall('logstream:user:alice') == {}
+
+    def test_profile_read_from_redis(self, setup):
+        """Test: Un profil déjà lu est servi par Redis"""
+        manager, users, _ = setup
+        for _ in range(3):
+            assert manager.user_cache.get_user('alice')['username'] == 'alice'
+        assert users.reads == 1
+        assert manager.user_cache.get_metrics()['hits'] == 2
+
+    def test_password_hash_is_not_cached(self, setup):
+        """Test: Le hachage du mot de passe n'est jamais copié dans Redis"""
+        manager, _, redis_client = setup
+        manager.user_cache.get_user('alice')
+        cached = redis_client.hgetall('logstream:user:alice')
+        assert cached['username'] == 'alice'
+        assert 'password_hash' not in cached
+
+    def test_unknown_user_is_negatively_cached(self, setup):
+        """Test: Un identifiant inconnu n'interroge MongoDB qu'une fois"""
+        manager, users, _ = setup
+        assert not manager.verify_credentials('mallory', 'x')
+        assert not manager.verify_credentials('mallory', 'x')
+        assert users.reads == 1
+        assert manager.user_cache.get_metrics()['negative_hits'] == 1
+
+    def test_invalidate_reloads_profile(self, setup):
+        """Test: Un profil invalidé est relu depuis MongoDB"""
+        manager, users, _ = setup
+        manager.user_cache.get_user('alice')
+        manager.user_cache.invalidate('alice')
+        manager.user_cache.get_user('alice')
+        assert manager.user_cache.get_metrics()['misses'] == 2
+
+    def test_revoked_token_is_rejected(self, setup):
+        """Test: Un token révoqué (déconnexion) est refusé même s'il est en cache"""
+        manager, _, _ = setup
+        token = manager.generate_token({'username': 'alice', 'role': 'user'})
+        other = manager.generate_token({'username': 'alice', 'role': 'user'})
+        assert manager.verify_token(token) is not None
+
+        assert manager.revoke_token(token)
+        assert manager.verify_token(token) is None
+        assert manager.verify_token(other) is not None
+
+    def test_revoke_user_rejects_existing_tokens(self, setup):
+        """Test: Révoquer un utilisateur invalide tous ses tokens déjà émis"""
+        manager, _, _ = setup
+        token = manager.generate_token({'username': 'alice', 'role': 'user'})
+        manager.verify_token(token)
+        manager.revoke_user('alice')
+        assert manager.verify_token(token) is None
+
+    def test_user_revocations_expire_with_tokens(self):
+        """Test: Les révocations d'utilisateurs plus anciennes que la durée des tokens sont purgées"""
+        import time
+        from user_cache import TokenRevocations
+
+        redis_client = FakeRedis()
+        revocations = TokenRevocations(lambda: redis_client, token_ttl=3600)
+        redis_client.zadd(revocations.USERS_KEY, {'old': time.time() - 7200})
+        revocations.revoke_user('alice')
+
+        assert set(redis_client.zsets[revocations.USERS_KEY]) == {'alice'}
+        assert revocations.is_revoked('t1', 'alice', issued_at=time.time() - 60)
+        assert not revocations.is_revoked('t2', 'old', issued_at=time.time() - 60)
+
+    def test_revocation_without_redis(self):
+        """Test: Les révocations restent effectives en mémoire sans Redis"""
+        import time
+        from user_cache import TokenRevocations
+
+        revocations = TokenRevocations(lambda: None)
+        revocations.revoke_token('abc', time.time() + 60)
+        assert revocations.is_revoked('abc')
+        assert not revocations.is_revoked('def')
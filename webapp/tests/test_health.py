@@ -216,3 +216,267 @@ class TestErrorHandling:
         
         # Devrait gérer proprement
         assert response.status_code in [400, 401, 415, 500]
+
+
+class TestHealthProber:
+    """Tests pour l'exécution parallèle des sondes de santé"""
+    
+    def test_probes_run_concurrently(self):
+        """Test: La durée totale est bornée par la sonde la plus lente"""
+        import time
+        from health_probes import HealthProber
+        
+        prober = HealthProber(deadline=2, ttl=0)
+        for name in ['a', 'b', 'c', 'd', 'e']:
+            prober.register(name, lambda: (time.sleep(0.3), {'status': 'healthy'})[1], f'http://{name}')
+        
+        started = time.time()
+        result = prober.check_all()
+        elapsed = time.time() - started
+        
+        assert result['healthy_services'] == 5
+        assert elapsed < 1.0
+        assert all(s['latency_ms'] >= 300 for s in result['services'].values())
+    
+    def test_global_deadline(self):
+        """Test: Une sonde bloquée est signalée en timeout sans bloquer les autres"""
+        import time
+        from health_probes import HealthProber
+        
+        prober = HealthProber(deadline=0.2, ttl=0)
+        prober.register('slow', lambda: (time.sleep(2), {'status': 'healthy'})[1], 'http://slow')
+        prober.register('fast', lambda: {'status': 'healthy'}, 'http://fast')
+        
+        started = time.time()
+        result = prober.check_all()
+        
+        assert time.time() - started < 1.0
+        assert result['services']['fast']['status'] == 'healthy'
+        assert result['services']['slow']['status'] == 'error'
+        assert 'Timeout' in result['services']['slow']['error']
+        assert result['overall_status'] == 'degraded'
+    
+    def test_probe_exception_and_cache(self):
+        """Test: Une exception devient un statut 'error' et le résultat est mis en cache"""
+        from health_probes import HealthProber
+        
+        calls = []
+        
+        def failing():
+            calls.append(1)
+            raise ConnectionError('refused')
+        
+        prober = HealthProber(deadline=1, ttl=60)
+        prober.register('redis', failing, 'redis://localhost:6379')
+        
+        first = prober.check()
+        second = prober.check()
+        
+        assert first['redis']['status'] == 'error'
+        assert first['redis']['url'] == 'redis://localhost:6379'
+        assert second['redis']['cached'] is True
+        assert len(calls) == 1
+
+
+class TestHealthMonitor:
+    """Tests pour le moniteur de santé et son historique"""
+    
+    def test_ring_buffer_keeps_last_samples(self):
+        """Test: Le tampon circulaire conserve uniquement les N derniers échantillons"""
+        from health_monitor import SampleRing
+        
+        ring = SampleRing(3)
+        for i in range(5):
+            ring.append(1767434400 + i, float(i), 'healthy' if i % 2 == 0 else 'error')
+        
+        samples = ring.last()
+        assert [s['latency_ms'] for s in samples] == [2.0, 3.0, 4.0]
+        assert [s['status'] for s in samples] == ['healthy', 'error', 'healthy']
+        assert [s['latency_ms'] for s in ring.last(2)] == [3.0, 4.0]
+    
+    def test_latest_served_from_memory(self):
+        """Test: latest() n'interroge les services qu'une fois puis répond depuis la mémoire"""
+        from health_monitor import HealthMonitor
+        
+        calls = []
+        
+        def sampler():
+            calls.append(1)
+            return {'services': {'redis': {'status': 'healthy', 'latency_ms': 1.5}}}
+        
+        monitor = HealthMonitor(sampler, interval=3600, history_size=10)
+        for _ in range(5):
+            monitor.latest()
+        monitor.stop()
+        
+        # Échantillon synchrone initial + premier tour du thread
+        assert len(calls) <= 2
+        history = monitor.get_history('redis')
+        assert history['redis'][0]['latency_ms'] == 1.5
+    
+    def test_database_manager_sampler(self):
+        """Test: Compatible avec DatabaseManager.health_check (pas de latence)"""
+        from health_monitor import HealthMonitor
+        from database import DatabaseManager
+        
+        monitor = HealthMonitor(DatabaseManager().health_check, interval=3600, history_size=5)
+        monitor.sample()
+        
+        history = monitor.get_history()
+        assert history['mongodb'][0]['status'] == 'disconnected'
+        assert history['mongodb'][0]['latency_ms'] is None
+    
+    def test_health_history_requires_auth(self, client):
+        """Test: /api/health/history nécessite une authentification"""
+        response = client.get('/api/health/history')
+        assert response.status_code in [401, 302]
+
+
+class TestConnectionPools:
+    """Tests du gestionnaire de connexions partagé (reconnexion paresseuse, statistiques)"""
+    
+    def test_reconnect_respects_backoff(self):
+        """Test: Après un échec, aucune nouvelle tentative avant l'échéance du backoff"""
+        from database import DatabaseManager
+        
+        manager = DatabaseManager()
+        attempts = []
+        
+        def connect():
+            attempts.append(1)
+            manager.redis_connected = len(attempts) >= 2
+            return manager.redis_connected
+        
+        manager.connect_redis = connect
+        assert manager.get_redis_client() is None
+        assert manager.get_redis_client() is None
+        assert len(attempts) == 1
+        assert manager.pool_stats()['redis']['reconnect']['failures'] == 1
+        
+        # Échéance passée : la connexion est retentée (lazy reconnect)
+        manager._reconnect_state['redis']['next_attempt'] = 0
+        assert manager.ensure_connected('redis') is True
+        assert len(attempts) == 2
+        assert manager.pool_stats()['redis']['reconnect']['failures'] == 0
+    
+    def test_backoff_grows_and_is_capped(self):
+        """Test: Le délai double à chaque échec, borné par le maximum configuré"""
+        import time
+        from database import DatabaseManager
+        
+        manager = DatabaseManager()
+        manager.pool_config['reconnect'] = {'min_backoff': 1, 'max_backoff': 4}
+        manager.connect_elasticsearch = lambda: False
+        
+        delays = []
+        for _ in range(4):
+            manager._attempt('elasticsearch')
+            delays.append(round(manager._reconnect_state['elasticsearch']['next_attempt'] - time.time()))
+        assert delays == [1, 2, 4, 4]
+    
+    def test_mark_unavailable(self):
+        """Test: Une panne signalée coupe l'accès jusqu'à la prochaine tentative"""
+        from database import DatabaseManager
+        
+        manager = DatabaseManager()
+        manager.redis_connected = True
+        manager.redis_client = object()
+        manager.mark_unavailable('redis')
+        
+        assert manager.redis_connected is False
+        assert manager.get_redis_client() is None
+    
+    def test_pool_stats_structure(self):
+        """Test: Les statistiques couvrent tous les pools, HTTP compris"""
+        from database import DatabaseManager
+        
+        manager = DatabaseManager()
+        session = manager.get_http_session()
+        assert manager.get_http_session() is session
+        
+        stats = manager.pool_stats()
+        assert set(stats) == {'mongodb', 'redis', 'elasticsearch', 'http', 'startup'}
+        assert stats['mongodb']['open'] == 0
+        assert stats['http']['config']['pool_size'] == manager.pool_config['http']['pool_size']
+        assert stats['http']['pools'] == 0
+    
+    def test_mongo_pool_listener(self):
+        """Test: Les connexions MongoDB utilisées et ouvertes sont comptées"""
+        from database import MongoPoolStats
+        
+        listener = MongoPoolStats()
+        for _ in range(3):
+            listener.connection_created(None)
+            listener.connection_checked_out(None)
+        listener.connection_checked_in(None)
+        listener.connection_closed(None)
+        
+        stats = listener.snapshot()
+        assert stats['open'] == 2
+        assert stats['checked_out'] == 2
+        assert stats['max_checked_out'] == 3
+        assert stats['checkouts'] == 3
+    
+    def test_pools_requires_auth(self, client):
+        """Test: /api/admin/pools nécessite une authentification"""
+        response = client.get('/api/admin/pools')
+        assert response.status_code in [401, 302]
+    
+    def test_background_warmup_never_blocks(self):
+        """Test: Avec le préchauffage, un getter répond immédiatement et le thread connecte le service"""
+        import threading
+        import time
+        from database import DatabaseManager
+        
+        manager = DatabaseManager()
+        release = threading.Event()
+        
+        def slow_connect():
+            release.wait(2)
+            manager.redis_connected = True
+            return True
+        
+        manager.connect_redis = slow_connect
+        manager.start_warmup(['redis'])
+        
+        started = time.time()
+        assert manager.get_redis_client() is None
+        assert time.time() - started < 0.1
+        
+        release.set()
+        assert manager.wait_until_ready(['redis'], timeout=2)
+        assert manager.startup_stats()['services']['redis']['ready_after_seconds'] is not None
+        manager.stop_warmup()
+    
+    def test_reset_after_fork(self):
+        """Test: Un processus fils n'hérite d'aucun client ni verrou du parent"""
+        from database import DatabaseManager
+        
+        manager = DatabaseManager()
+        manager.redis_client = object()
+        manager.redis_connected = True
+        manager._reconnect_locks['redis'].acquire()
+        
+        manager.reset_after_fork()
+        
+        assert manager.redis_client is None
+        assert manager.redis_connected is False
+        assert manager._reconnect_locks['redis'].acquire(blocking=False)
+    
+    def test_gunicorn_config(self, monkeypatch):
+        """Test: La configuration gunicorn se charge et respecte les variables d'environnement"""
+        import importlib.util
+        import os
+        
+        monkeypatch.setenv('WEB_WORKERS', '3')
+        monkeypatch.setenv('WEB_KEEPALIVE', '7')
+        monkeypatch.setenv('WEB_RELOAD', '1')
+        path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py')
+        spec = importlib.util.spec_from_file_location('gunicorn_conf', path)
+        config = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(config)
+        
+        assert config.workers == 3
+        assert config.keepalive == 7
+        assert config.preload_app is False
+        assert callable(config.post_fork)
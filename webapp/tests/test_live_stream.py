@@ -0,0 +1,103 @@
+# ============================================
+# Tests Flux temps réel (Server-Sent Events)
+# ============================================
+import json
+import itertools
+
+from live_stream import LiveStreamHub
+
+
+def parse_event(chunk):
+    """Extrait (nom, données) d'un événement SSE"""
+    lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+    return lines['event'], json.loads(lines['data'])
+
+
+class TestLiveStreamHub:
+    """Tests pour la diffusion des statistiques aux abonnés"""
+
+    def test_producer_runs_once_for_all_subscribers(self):
+        """Test: Le producteur est partagé entre les abonnés"""
+        counter = itertools.count()
+        calls = []
+
+        def producer():
+            calls.append(1)
+            return {'static': 'x', 'tick': next(counter) // 100}
+
+        hub = LiveStreamHub(keepalive=1)
+        hub.register('stats', producer, interval=60)
+
+        streams = [hub.subscribe(['stats']) for _ in range(3)]
+        for stream in streams:
+            assert next(stream).startswith('retry')
+            name, data = parse_event(next(stream))
+            assert name == 'stats'
+            assert data == {'static': 'x', 'tick': 0}
+
+        assert len(calls) == 1
+        assert hub.subscriber_count == 3
+
+        for stream in streams:
+            stream.close()
+        assert hub.subscriber_count == 0
+        hub.stop()
+
+    def test_only_changed_fields_are_sent(self):
+        """Test: Seules les clés modifiées sont envoyées après l'état initial"""
+        hub = LiveStreamHub(keepalive=1)
+        hub.register('stats', lambda: {'total_logs': 1, 'errors': 0}, interval=60)
+
+        stream = hub.subscribe(['stats'])
+        next(stream)
+        parse_event(next(stream))
+
+        hub.publish('stats', {'total_logs': 2, 'errors': 0})
+        name, data = parse_event(next(stream))
+
+        assert data == {'total_logs': 2}
+        stream.close()
+        hub.stop()
+
+    def test_keepalive_when_idle(self):
+        """Test: Un commentaire keepalive est envoyé en l'absence de changement"""
+        hub = LiveStreamHub(keepalive=0.1)
+        hub.register('stats', lambda: {'total_logs': 1}, interval=60)
+
+        stream = hub.subscribe(['stats'])
+        next(stream)
+        next(stream)
+
+        assert next(stream) == ': keepalive\n\n'
+        stream.close()
+        hub.stop()
+
+    def test_stream_requires_auth(self, client):
+        """Test: /api/stream nécessite une authentification"""
+        response = client.get('/api/stream')
+        assert response.status_code in [401, 302]
+
+    def test_subscribers_are_capped_per_worker(self):
+        """Test: Au-delà du plafond, reserve() refuse et les places libérées sont réutilisables"""
+        hub = LiveStreamHub(keepalive=1, max_subscribers=2)
+
+        assert hub.reserve() and hub.reserve()
+        assert not hub.reserve()
+        hub.release()
+        assert hub.reserve()
+        assert hub.get_metrics() == {'subscribers': 2, 'max_subscribers': 2, 'rejected': 1}
+        hub.stop()
+
+    def test_stream_limit_returns_503(self, client, monkeypatch):
+        """Test: /api/stream répond 503 quand le worker a atteint son plafond de flux"""
+        from app import auth_manager, live_hub
+
+        monkeypatch.setattr(live_hub, 'max_subscribers', 1)
+        monkeypatch.setattr(live_hub, '_subscribers', 1)
+        token = auth_manager.generate_token({'username': 'tester', 'role': 'user'})
+
+        response = client.get('/api/stream', headers={'Authorization': f'Bearer {token}'})
+
+        assert response.status_code == 503
+        assert response.get_json()['code'] == 'STREAM_LIMIT'
+        assert response.headers['Retry-After'] == '30'
@@ -246,3 +246,66 @@ class TestRedisCachePatterns:
         
         # Cleanup
         redis_client.delete('test:rate_limit:user123')
+
+
+class TestRateLimiter:
+    """Tests du limiteur de débit (scripts Lua Redis et fallback mémoire)"""
+
+    def test_sliding_window_local(self):
+        """Test: La fenêtre glissante bloque au-delà de la limite"""
+        from rate_limiter import RateLimiter, RateLimitRule
+
+        limiter = RateLimiter(lambda: None)
+        rule = RateLimitRule('test_window', '3/60', lambda: 'client')
+        results = [limiter.hit(rule, 'client') for _ in range(4)]
+
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert results[2].remaining == 0
+        assert 1 <= results[3].retry_after <= 60
+        # Une autre identité a son propre compteur
+        assert limiter.hit(rule, 'other').allowed
+
+    def test_token_bucket_local_refills(self):
+        """Test: Le seau à jetons autorise une rafale puis se recharge"""
+        from rate_limiter import RateLimiter, RateLimitRule
+
+        limiter = RateLimiter(lambda: None)
+        rule = RateLimitRule('test_bucket', '5/0.5', lambda: 'client', 'token_bucket')
+        burst = [limiter.hit(rule, 'client').allowed for _ in range(6)]
+        assert burst == [True] * 5 + [False]
+
+        time.sleep(0.15)
+        assert limiter.hit(rule, 'client').allowed
+
+    def test_lua_scripts_with_redis(self, redis_client):
+        """Test: Les scripts Lua appliquent les mêmes limites dans Redis"""
+        if redis_client is None:
+            pytest.skip("Redis non disponible")
+        from rate_limiter import RateLimiter, RateLimitRule
+
+        limiter = RateLimiter(lambda: redis_client)
+        limiter.KEY_PREFIX = 'test:ratelimit:'
+        window = RateLimitRule('window', '3/60', lambda: 'client')
+        bucket = RateLimitRule('bucket', '3/60', lambda: 'client', 'token_bucket')
+
+        assert [limiter.hit(window, 'client').allowed for _ in range(4)] == [True, True, True, False]
+        assert [limiter.hit(bucket, 'client').allowed for _ in range(4)] == [True, True, True, False]
+
+    def test_login_is_rate_limited(self, client):
+        """Test: /api/login répond 429 avec Retry-After au-delà de la limite par compte"""
+        from app import rate_limiter, LOGIN_RATE_LIMITS
+
+        rate_limiter.reset()
+        limit = next(rule.limit for rule in LOGIN_RATE_LIMITS if rule.name == 'login_user')
+        try:
+            statuses = []
+            for _ in range(limit + 1):
+                response = client.post('/api/login', json={'username': 'ratelimited', 'password': 'wrong'})
+                statuses.append(response.status_code)
+            if rate_limiter.get_metrics()['backend'] == 'redis':
+                pytest.skip("Compteurs Redis partagés : résultat dépendant de l'état du serveur")
+            assert statuses[:limit] == [401] * limit
+            assert statuses[-1] == 429
+            assert int(response.headers['Retry-After']) >= 1
+        finally:
+            rate_limiter.reset()
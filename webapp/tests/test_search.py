@@ -123,3 +123,291 @@ class TestElasticsearchConnection:
         except Exception as e:
             # Index peut ne pas exister en test
             pytest.skip(f"Index logs-* non disponible: {e}")
+
+
+class FakePitES:
+    """Client Elasticsearch minimal simulant point-in-time + search_after"""
+    
+    def __init__(self, total=120):
+        self.docs = [{'_source': {'@timestamp': f'ts{i}'}, 'sort': [1000 - i, i]} for i in range(total)]
+        self.bodies = []
+        self.opened = []
+        self.closed = []
+    
+    def open_point_in_time(self, index, keep_alive):
+        self.opened.append(index)
+        return {'id': 'pit-1'}
+    
+    def close_point_in_time(self, id):
+        self.closed.append(id)
+    
+    def search(self, index=None, body=None):
+        self.bodies.append(body)
+        after = body.get('search_after')
+        if after is None:
+            start = body.get('from', 0)
+        else:
+            start = next(i for i, d in enumerate(self.docs) if d['sort'] == after) + 1
+        hits = self.docs[start:start + body['size']]
+        # Comme Elasticsearch : total plafonné à 10 000 sans track_total_hits
+        if body.get('track_total_hits') is True:
+            total = {'value': len(self.docs), 'relation': 'eq'}
+        else:
+            total = {'value': min(len(self.docs), 10000), 'relation': 'gte' if len(self.docs) > 10000 else 'eq'}
+        return {'pit_id': 'pit-1', 'hits': {'total': total, 'hits': hits}}
+
+
+class TestCursorPagination:
+    """Tests pour la pagination par curseur (point-in-time + search_after)"""
+    
+    def test_cursor_roundtrip(self):
+        """Test: Un curseur encodé est décodé à l'identique"""
+        from search_pagination import encode_cursor, decode_cursor
+        
+        state = {'pit': 'abc', 'after': [1767434400000, 42], 'page': 3, 'total': 500, 'q': 'x'}
+        assert decode_cursor(encode_cursor(state)) == state
+    
+    def test_invalid_cursor(self):
+        """Test: Un curseur invalide lève CursorError"""
+        from search_pagination import decode_cursor, CursorError
+        
+        with pytest.raises(CursorError):
+            decode_cursor('not-a-cursor')
+    
+    def test_walk_all_pages(self):
+        """Test: Parcours complet sans offset, total calculé une seule fois"""
+        from search_pagination import search_cursor
+        
+        es = FakePitES(total=120)
+        query = {'query': {'match_all': {}}}
+        
+        seen = []
+        cursor = None
+        while True:
+            response, meta = search_cursor(es, 'logs-*', query, cursor, page_size=50)
+            seen.extend(h['_source']['@timestamp'] for h in response['hits']['hits'])
+            cursor = meta['next_cursor']
+            if cursor is None:
+                break
+        
+        assert seen == [f'ts{i}' for i in range(120)]
+        assert meta['page'] == 3 and meta['total_pages'] == 3
+        # Une recherche par page : recherche simple (total exact), puis pages du point-in-time sans recomptage
+        assert len(es.bodies) == 3
+        assert 'pit' not in es.bodies[0] and es.bodies[0]['track_total_hits'] is True
+        assert [body['track_total_hits'] for body in es.bodies[1:]] == [False, False]
+        assert es.bodies[1]['from'] == 50 and 'from' not in es.bodies[2]
+        # Point-in-time fermé à la dernière page
+        assert es.opened == ['logs-*'] and es.closed == ['pit-1']
+    
+    def test_walk_past_10000_hits(self):
+        """Test: Le parcours continue au-delà de 10 000 résultats (page 200)"""
+        from search_pagination import search_cursor
+        
+        es = FakePitES(total=10120)
+        query = {'query': {'match_all': {}}}
+        
+        count = 0
+        cursor = None
+        while True:
+            response, meta = search_cursor(es, 'logs-*', query, cursor, page_size=50)
+            count += len(response['hits']['hits'])
+            cursor = meta['next_cursor']
+            if cursor is None:
+                break
+        
+        assert meta['total'] == 10120
+        assert meta['page'] == 203 and meta['total_pages'] == 203
+        assert count == 10120 and len(es.bodies) == 203
+    
+    def test_single_page_opens_no_pit(self):
+        """Test: Une première page contenant tous les résultats n'ouvre pas de point-in-time"""
+        from search_pagination import search_cursor
+        
+        es = FakePitES(total=30)
+        response, meta = search_cursor(es, 'logs-*', {'query': {'match_all': {}}}, None, page_size=50)
+        
+        assert len(response['hits']['hits']) == 30
+        assert meta['mode'] == 'cursor' and meta['total_pages'] == 1
+        assert meta['next_cursor'] is None
+        assert es.opened == [] and es.closed == []
+    
+    def test_cursor_bound_to_query(self):
+        """Test: Un curseur ne peut pas être réutilisé avec une autre requête"""
+        from search_pagination import search_cursor, CursorError
+        
+        es = FakePitES()
+        _, meta = search_cursor(es, 'logs-*', {'query': {'match_all': {}}}, None, page_size=50)
+        
+        with pytest.raises(CursorError):
+            search_cursor(es, 'logs-*', {'query': {'match': {'status': 'failed'}}}, meta['next_cursor'])
+
+
+class TestQueryBuilder:
+    """Tests pour la construction des requêtes (contexte filter)"""
+    
+    def test_no_filter_match_all(self):
+        """Test: Sans critère, tous les logs sont retournés"""
+        from query_builder import build_search_query
+        
+        assert build_search_query() == {'query': {'match_all': {}}}
+    
+    def test_filters_are_not_scored(self):
+        """Test: Les filtres exacts sont en bool.filter, seul le texte est scoré"""
+        from query_builder import build_search_query
+        
+        query = build_search_query('timeout', ['failed'], ['payment-api'], '2026-01-01', '2026-01-31')['query']
+        
+        assert len(query['bool']['must']) == 1
+        assert 'multi_match' in query['bool']['must'][0]
+        assert len(query['bool']['filter']) == 3
+        assert {'range': {'@timestamp': {'gte': '2026-01-01', 'lte': '2026-01-31'}}} in query['bool']['filter']
+    
+    def test_multi_value_filter(self):
+        """Test: Plusieurs services à la fois, sur le champ keyword"""
+        from query_builder import terms_filter, parse_multi
+        
+        assert parse_multi(['payment-api,order-service', 'payment-api', '']) == ['payment-api', 'order-service']
+        
+        clause = terms_filter('service', ['payment-api', 'order-service'])
+        should = clause['bool']['should']
+        assert {'terms': {'service.keyword': ['payment-api', 'order-service']}} in should
+        assert clause['bool']['minimum_should_match'] == 1
+    
+    def test_empty_filter_ignored(self):
+        """Test: Un filtre vide ne génère aucune clause"""
+        from query_builder import terms_filter, range_filter
+        
+        assert terms_filter('level', '') is None
+        assert range_filter() is None
+
+
+class TestSearchCache:
+    """Tests pour le cache des résultats de recherche"""
+    
+    CLOSED_RANGE = {'date_from': '2026-01-01T00:00', 'date_to': '2026-01-02T00:00'}
+    
+    def test_normalized_key(self):
+        """Test: Casse, espaces et ordre des filtres n'influencent pas la clé"""
+        from search_cache import SearchCache
+        
+        cache = SearchCache()
+        key1 = cache.key_for(query_text='Payment  Timeout', levels=['failed', 'error'], **self.CLOSED_RANGE)
+        key2 = cache.key_for(query_text='payment timeout', levels=['error', 'failed'], **self.CLOSED_RANGE)
+        key3 = cache.key_for(query_text='payment timeout', levels=['error'], **self.CLOSED_RANGE)
+        
+        assert key1 == key2
+        assert key1 != key3
+    
+    def test_bypass_ranges_touching_now(self):
+        """Test: Les recherches sans borne de fin ou jusqu'à maintenant ne sont pas cachées"""
+        from search_cache import SearchCache
+        
+        cache = SearchCache()
+        
+        assert cache.key_for(query_text='x') is None
+        assert cache.key_for(query_text='x', date_to='now') is None
+        assert cache.key_for(query_text='x', date_to='2999-01-01T00:00') is None
+        assert cache.key_for(query_text='x', cursor='abc', mode='cursor') is not None
+        assert cache.get_metrics()['bypassed'] == 3
+    
+    def test_hit_ratio_and_lru_eviction(self):
+        """Test: Les entrées les moins récemment lues sont évincées"""
+        from search_cache import SearchCache
+        
+        cache = SearchCache(max_entries=2)
+        keys = [cache.key_for(query_text=f'q{i}', **self.CLOSED_RANGE) for i in range(3)]
+        
+        cache.set(keys[0], {'total': 0})
+        cache.set(keys[1], {'total': 1})
+        assert cache.get(keys[0]) == {'total': 0}
+        cache.set(keys[2], {'total': 2})
+        
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) is not None
+        metrics = cache.get_metrics()
+        assert metrics['evictions'] == 1
+        assert metrics['hit_ratio'] == round(2 / 3, 4)
+    
+    def test_flush(self):
+        """Test: Le flush vide le cache"""
+        from search_cache import SearchCache
+        
+        cache = SearchCache()
+        key = cache.key_for(query_text='x', **self.CLOSED_RANGE)
+        cache.set(key, {'total': 1})
+        
+        assert cache.flush() == 1
+        assert cache.get(key) is None
+    
+    def test_flush_requires_admin(self, client):
+        """Test: Le flush du cache est réservé aux administrateurs"""
+        from app import auth_manager
+        
+        token = auth_manager.generate_token({'username': 'operator', 'role': 'user'})
+        response = client.post('/api/admin/search-cache/flush', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 403
+        
+        token = auth_manager.generate_token({'username': 'admin', 'role': 'admin'})
+        response = client.post('/api/admin/search-cache/flush', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
+        assert response.get_json()['success'] is True
+
+
+class FakeHistoryCollection:
+    """Collection MongoDB minimale enregistrant les appels insert_many"""
+    
+    def __init__(self, delay=0.0):
+        self.batches = []
+        self.delay = delay
+    
+    def insert_many(self, docs, ordered=True):
+        import time
+        time.sleep(self.delay)
+        self.batches.append(list(docs))
+
+
+class TestSearchHistoryWriter:
+    """Tests pour l'écriture différée de l'historique de recherche"""
+    
+    def test_batched_writes(self):
+        """Test: Les entrées sont écrites par lots avec insert_many"""
+        import time
+        from search_history import SearchHistoryWriter
+        
+        collection = FakeHistoryCollection()
+        writer = SearchHistoryWriter(lambda: collection, max_queue=100, batch_size=10, flush_interval=0.1)
+        
+        for i in range(25):
+            assert writer.record({'query_text': f'q{i}'}) is True
+        time.sleep(0.5)
+        writer.stop()
+        
+        assert sum(len(b) for b in collection.batches) == 25
+        assert max(len(b) for b in collection.batches) <= 10
+        assert writer.get_metrics()['written'] == 25
+    
+    def test_drop_when_queue_full(self):
+        """Test: File pleine -> entrée abandonnée sans bloquer"""
+        import time
+        from search_history import SearchHistoryWriter
+        
+        collection = FakeHistoryCollection(delay=0.5)
+        writer = SearchHistoryWriter(lambda: collection, max_queue=5, batch_size=1, flush_interval=0.05)
+        
+        started = time.time()
+        accepted = [writer.record({'i': i}) for i in range(50)]
+        
+        assert time.time() - started < 0.2
+        assert accepted.count(False) > 0
+        assert writer.get_metrics()['dropped'] == accepted.count(False)
+    
+    def test_mongo_unavailable(self):
+        """Test: Sans MongoDB, les entrées sont comptées comme abandonnées"""
+        from search_history import SearchHistoryWriter
+        
+        writer = SearchHistoryWriter(lambda: None, batch_size=10, flush_interval=0.05)
+        writer.record({'i': 1})
+        writer.stop()
+        
+        assert writer.get_metrics()['dropped'] == 1
@@ -0,0 +1,550 @@
+# ============================================
+# Tests Moteur de statistiques (/api/stats)
+# ============================================
+import threading
+import time
+from datetime import datetime, timezone
+
+from stats_engine import StatsEngine
+
+
+class FakeES:
+    """Client Elasticsearch minimal qui compte les appels"""
+
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self.counts = []
+
+    def search(self, index=None, body=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        max_ms = 1767434400000  # 2026-01-03T10:00:00Z
+        return {
+            'hits': {'total': {'value': 120}},
+            'aggregations': {
+                'max_date': {'value': max_ms},
+                'min_date': {'value': max_ms - 3 * 86400000},
+                'errors': {'doc_count': 7},
+                'logs_over_time': {'buckets': [
+                    {'key_as_string': '2026-01-01', 'doc_count': 40},
+                    {'key_as_string': '2026-01-02', 'doc_count': 80},
+                ]}
+            }
+        }
+
+    def count(self, index=None, query=None):
+        self.counts.append((index, query))
+        return {'count': 15}
+
+
+class FakeLockRedis:
+    """Redis simulé pour les verrous : SET NX PX et scripts Lua de comparaison (del / pexpire)"""
+
+    def __init__(self):
+        self.keys = {}
+        self.ttls = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = value
+        self.ttls[key] = px
+        return True
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def expire_now(self, key):
+        """Simule l'expiration du verrou"""
+        self.keys.pop(key, None)
+
+    def eval(self, script, numkeys, key, token, *args):
+        if self.keys.get(key) != token:
+            return 0
+        if 'pexpire' in script:
+            self.ttls[key] = int(args[0])
+        else:
+            del self.keys[key]
+        return 1
+
+
+class TestStatsEngine:
+    """Tests pour l'agrégation unique et le cache des statistiques"""
+
+    def test_single_es_request(self):
+        """Test: Une seule agrégation produit les statistiques, les 24h sont un comptage borné"""
+        es = FakeES()
+        engine = StatsEngine(lambda: es, ttl=60)
+
+        stats = engine.get_stats()
+
+        assert es.calls == 1
+        # Sans routeur : comptage sur le pattern complet, limité à la plage des 24h
+        index, query = es.counts[0]
+        assert index == 'logs-*'
+        assert query['range']['@timestamp'] == {'gte': '2026-01-02T10:00:00.000Z', 'lte': '2026-01-03T10:00:00.000Z'}
+        assert stats['total_logs'] == 120
+        assert stats['errors'] == 7
+        assert stats['logs_today'] == 15
+        assert stats['timeline'] == [
+            {'date': '2026-01-01', 'count': 40},
+            {'date': '2026-01-02', 'count': 80},
+        ]
+
+    def test_cache_hit(self):
+        """Test: Les appels suivants sont servis depuis le cache"""
+        es = FakeES()
+        engine = StatsEngine(lambda: es, ttl=60)
+
+        for _ in range(5):
+            engine.get_stats()
+
+        metrics = engine.get_metrics()
+        assert es.calls == 1
+        assert metrics['cache_hits'] == 4
+        assert metrics['cache_misses'] == 1
+        assert metrics['backend'] == 'memory'
+
+    def test_single_flight(self):
+        """Test: Des appels concurrents ne déclenchent qu'un seul calcul"""
+        es = FakeES(delay=0.2)
+        engine = StatsEngine(lambda: es, ttl=60)
+
+        threads = [threading.Thread(target=engine.get_stats) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert es.calls == 1
+
+    def test_es_unavailable(self):
+        """Test: Statistiques vides si Elasticsearch est indisponible"""
+        engine = StatsEngine(lambda: None, ttl=60)
+
+        stats = engine.get_stats()
+
+        assert stats['total_logs'] == 0
+        assert stats['timeline'] == []
+
+    def test_lock_release_keeps_other_worker_lock(self):
+        """Test: Un verrou expiré puis repris par un autre worker n'est pas supprimé"""
+        redis_client = FakeLockRedis()
+        engine = StatsEngine(lambda: None, redis_getter=lambda: redis_client, ttl=60)
+
+        token = engine._acquire_shared_lock()
+        redis_client.expire_now(engine.LOCK_KEY)
+        redis_client.set(engine.LOCK_KEY, 'other-worker', nx=True)
+        engine._release_shared_lock(token)
+        assert redis_client.get(engine.LOCK_KEY) == 'other-worker'
+
+        engine._release_shared_lock('other-worker')
+        assert redis_client.get(engine.LOCK_KEY) is None
+
+    def test_stats_metrics_requires_auth(self, client):
+        """Test: /api/stats/metrics nécessite une authentification"""
+        response = client.get('/api/stats/metrics')
+        assert response.status_code in [401, 302]
+
+
+class FakeFacetCollection:
+    """Collection uploads simulée : retourne un résultat $facet et compte les agrégations"""
+
+    def __init__(self, result):
+        self.result = result
+        self.pipelines = []
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        self.pipelines.append(pipeline)
+        return iter([self.result])
+
+
+FACET_RESULT = {
+    'by_extension': [{'_id': 'csv', 'count': 4, 'bytes': 4096}, {'_id': '', 'count': 2, 'bytes': 2048}],
+    'by_day': [{'_id': '2026-01-01', 'count': 6, 'errors': 2, 'bytes': 6144}]
+}
+
+
+class TestDashboardStats:
+    """Tests de l'agrégation $facet du tableau de bord"""
+
+    def test_pipeline_is_bounded_to_period(self):
+        """Test: L'agrégation filtre la période (index uploaded_at) avant $project et $facet"""
+        from dashboard_stats import DashboardStats
+
+        pipeline = DashboardStats(lambda: None, days=7).build_pipeline(now=datetime(2026, 1, 10))
+
+        assert pipeline[0] == {'$match': {'uploaded_at': {'$gte': '2026-01-04'}}}
+        assert 'ingest' not in pipeline[1]['$project']
+        # Totaux et derniers uploads : compteurs matérialisés, pas l'agrégation
+        assert set(pipeline[2]['$facet']) == {'by_extension', 'by_day'}
+
+    def test_parse_result(self):
+        """Test: Le résultat $facet est converti au format du tableau de bord"""
+        from dashboard_stats import DashboardStats
+
+        stats = DashboardStats.parse_result(FACET_RESULT)
+
+        assert stats['by_extension'][1]['extension'] == ''
+        assert stats['by_day'] == [{'date': '2026-01-01', 'count': 6, 'errors': 2, 'bytes': 6144}]
+
+    def test_result_is_cached(self):
+        """Test: Les appels suivants sont servis par le cache jusqu'à invalidation"""
+        from dashboard_stats import DashboardStats
+
+        collection = FakeFacetCollection(FACET_RESULT)
+        service = DashboardStats(lambda: collection, ttl=60)
+
+        for _ in range(5):
+            assert service.get_stats()['by_extension'][0]['count'] == 4
+        assert len(collection.pipelines) == 1
+
+        service.invalidate()
+        service.get_stats()
+        assert len(collection.pipelines) == 2
+        assert service.get_metrics()['cache_hits'] == 4
+
+    def test_mongo_unavailable_is_not_cached(self):
+        """Test: Sans MongoDB, des graphes vides sont retournés sans être mis en cache"""
+        from dashboard_stats import DashboardStats
+
+        service = DashboardStats(lambda: None, ttl=60)
+
+        assert service.get_stats() == {'by_extension': [], 'by_day': []}
+        assert service._local_cache is None
+
+
+def to_ms(value):
+    return int(datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class FakeRollupES:
+    """Elasticsearch simulé : logs bruts en mémoire et index des rollups"""
+
+    def __init__(self, logs):
+        self.logs = logs
+        self.docs = {}
+        self.raw_searches = []
+        self.gets = 0
+        self.indices = self
+
+    # Index des rollups
+    def exists(self, index):
+        return True
+
+    def get(self, index, id):
+        self.gets += 1
+        if id not in self.docs:
+            raise KeyError(id)
+        return {'_source': dict(self.docs[id])}
+
+    def index(self, index, id, document):
+        self.docs[id] = document
+
+    def delete(self, index, id, refresh=None):
+        self.docs.pop(id, None)
+
+    def bulk(self, operations, refresh=None):
+        for action, doc in zip(operations[::2], operations[1::2]):
+            self.docs[action['index']['_id']] = doc
+
+    # Agrégations
+    def _select(self, body):
+        bounds = body.get('query', {}).get('range', {}).get('@timestamp', {})
+        return [log for log in self.logs
+                if log['@timestamp'] >= bounds.get('gte', '') and log['@timestamp'] < bounds.get('lt', '9999')]
+
+    @staticmethod
+    def _buckets(logs, width, with_metrics=True):
+        groups = {}
+        for log in logs:
+            groups.setdefault(log['@timestamp'][:width], []).append(log)
+        buckets = []
+        for key, group in sorted(groups.items()):
+            start = key + ('T00:00:00Z' if width == 10 else ':00:00Z')
+            bucket = {'key': to_ms(start), 'key_as_string': key, 'doc_count': len(group)}
+            if with_metrics:
+                bucket.update(FakeRollupES._metrics(group))
+                services = {}
+                for log in group:
+                    services.setdefault(log['service'], []).append(log)
+                bucket['services'] = {'buckets': [dict(key=name, doc_count=len(items), **FakeRollupES._metrics(items))
+                                                  for name, items in services.items()]}
+            buckets.append(bucket)
+        return buckets
+
+    @staticmethod
+    def _metrics(logs):
+        return {'failed': {'doc_count': sum(1 for log in logs if log['status'] == 'failed')},
+                'amount': {'value': sum(log['amount'] for log in logs)}}
+
+    def search(self, index=None, body=None):
+        if index.startswith('rollup'):
+            if 'ids' in body['query']:
+                ids = body['query']['ids']['values']
+                return {'hits': {'hits': [{'_source': dict(self.docs[i])} for i in ids if i in self.docs]}}
+            days = [doc for doc in self.docs.values() if doc.get('granularity') == 'day']
+            days.sort(key=lambda doc: doc['@timestamp'], reverse=True)
+            return {'hits': {'hits': [{'_source': doc} for doc in days[:body['size']]]}}
+
+        self.raw_searches.append(body)
+        logs = self._select(body)
+        aggs = body['aggs']
+        if 'first' in aggs:
+            return {'aggregations': {'first': {'value': min(to_ms(log['@timestamp']) for log in logs) if logs else None}}}
+        if 'hours' in aggs:
+            since = aggs['hours']['filter']['range']['@timestamp']['gte']
+            return {'aggregations': {
+                'hours': {'buckets': {'buckets': self._buckets([log for log in logs if log['@timestamp'] >= since], 13)}},
+                'days': {'buckets': self._buckets(logs, 10)}
+            }}
+        return {'aggregations': {'days': {'buckets': self._buckets(logs, 10, with_metrics=False)}}}
+
+    def msearch(self, searches):
+        return {'responses': [self.search(header['index'], body) for header, body in zip(searches[::2], searches[1::2])]}
+
+
+def make_log(timestamp, service='payment', status='success', amount=10.0):
+    return {'@timestamp': timestamp, 'service': service, 'status': status, 'amount': amount}
+
+
+class TestStatsRollups:
+    """Tests des rollups de la timeline"""
+
+    NOW = datetime(2026, 1, 3, 10, 30)
+
+    def make_rollups(self, logs, monkeypatch):
+        from stats_rollups import StatsRollups
+
+        es = FakeRollupES(logs)
+        rollups = StatsRollups(lambda: es, interval=60, lookback_hours=2, verify_interval=3600, verify_days=7)
+        # Pas de thread de mise à jour : les passages sont déclenchés par le test
+        monkeypatch.setattr(rollups, 'start', lambda: None)
+        return rollups, es
+
+    def test_first_pass_backfills_closed_hours(self, monkeypatch):
+        """Test: Le premier passage agrège tout l'historique jusqu'à l'heure close"""
+        logs = [make_log('2026-01-01T08:15:00Z', status='failed', amount=5.0),
+                make_log('2026-01-01T08:45:00Z', service='catalog'),
+                make_log('2026-01-03T09:10:00Z'),
+                make_log('2026-01-03T10:05:00Z')]
+        rollups, es = self.make_rollups(logs, monkeypatch)
+
+        assert rollups.run_pass(now=self.NOW)
+
+        hour = es.docs['hour-2026-01-01T08:00:00Z']
+        assert hour['count'] == 2
+        assert hour['failed'] == 1
+        assert hour['amount_sum'] == 15.0
+        assert hour['services']['payment'] == {'count': 1, 'failed': 1, 'amount_sum': 5.0}
+        assert es.docs['day-2026-01-03T00:00:00Z']['count'] == 1
+        # L'heure en cours n'est pas agrégée
+        assert 'hour-2026-01-03T10:00:00Z' not in es.docs
+        assert es.docs['_state']['watermark'] == '2026-01-03T10:00:00Z'
+
+    def test_incremental_pass_reads_only_recent_hours(self, monkeypatch):
+        """Test: Les passages suivants ne relisent que la fenêtre lookback"""
+        logs = [make_log('2026-01-01T08:15:00Z'), make_log('2026-01-03T09:10:00Z')]
+        rollups, es = self.make_rollups(logs, monkeypatch)
+        rollups.run_pass(now=self.NOW)
+        es.raw_searches.clear()
+
+        logs.append(make_log('2026-01-03T10:40:00Z'))
+        rollups.run_pass(now=self.NOW.replace(hour=11))
+
+        assert len(es.raw_searches) == 1
+        assert es.raw_searches[0]['aggs']['hours']['filter']['range']['@timestamp']['gte'] == '2026-01-03T08:00:00Z'
+        assert es.docs['day-2026-01-03T00:00:00Z']['count'] == 2
+
+    def test_timeline_merges_rollups_and_open_bucket(self, monkeypatch):
+        """Test: Timeline = rollups des heures closes + logs bruts de l'heure en cours, jours vides à 0"""
+        logs = [make_log('2026-01-01T08:15:00Z'), make_log('2026-01-03T09:10:00Z')]
+        rollups, es = self.make_rollups(logs, monkeypatch)
+        assert rollups.timeline() is None
+
+        rollups.run_pass(now=self.NOW)
+        logs.append(make_log('2026-01-03T10:20:00Z'))
+        es.raw_searches.clear()
+
+        assert rollups.timeline() == [
+            {'date': '2026-01-01', 'count': 1},
+            {'date': '2026-01-02', 'count': 0},
+            {'date': '2026-01-03', 'count': 2},
+        ]
+        assert es.raw_searches[0]['query']['range']['@timestamp'] == {'gte': '2026-01-03T10:00:00Z'}
+
+    def test_timeline_reuses_watermark(self, monkeypatch):
+        """Test: Le watermark reste en mémoire, la timeline est un seul msearch"""
+        logs = [make_log('2026-01-01T08:15:00Z'), make_log('2026-01-03T09:10:00Z')]
+        rollups, es = self.make_rollups(logs, monkeypatch)
+        rollups.run_pass(now=self.NOW)
+        es.gets = 0
+
+        for _ in range(3):
+            assert rollups.timeline()[-1] == {'date': '2026-01-03', 'count': 1}
+        assert es.gets == 0
+
+    def test_timeline_follows_peer_watermark(self, monkeypatch):
+        """Test: Un watermark avancé par un autre worker est relu, sans compter deux fois l'heure agrégée"""
+        from stats_rollups import StatsRollups
+
+        logs = [make_log('2026-01-03T09:10:00Z')]
+        rollups, es = self.make_rollups(logs, monkeypatch)
+        rollups.run_pass(now=self.NOW)
+        assert rollups.timeline() == [{'date': '2026-01-03', 'count': 1}]
+
+        # Passage suivant exécuté par un autre worker
+        logs.append(make_log('2026-01-03T10:20:00Z'))
+        peer = StatsRollups(lambda: es, interval=60, lookback_hours=2, verify_interval=3600)
+        peer.run_pass(now=self.NOW.replace(hour=11))
+        es.raw_searches.clear()
+
+        assert rollups.timeline() == [{'date': '2026-01-03', 'count': 2}]
+        assert es.raw_searches[-1]['query']['range']['@timestamp'] == {'gte': '2026-01-03T11:00:00Z'}
+
+    def test_verify_repairs_late_days(self, monkeypatch):
+        """Test: Un log arrivé en retard hors de la fenêtre lookback est rattrapé par la vérification"""
+        logs = [make_log('2026-01-01T08:15:00Z')]
+        rollups, es = self.make_rollups(logs, monkeypatch)
+        rollups.run_pass(now=self.NOW)
+
+        logs.append(make_log('2026-01-01T23:00:00Z'))
+        assert rollups.verify(es, self.NOW.replace(minute=0)) == ['2026-01-01']
+        assert es.docs['day-2026-01-01T00:00:00Z']['count'] == 2
+        assert es.docs['hour-2026-01-01T23:00:00Z']['count'] == 1
+
+    def test_long_backfill_extends_and_checks_lock(self, monkeypatch):
+        """Test: Le verrou est prolongé à chaque jour agrégé ; s'il est perdu, le passage s'arrête"""
+        from stats_rollups import StatsRollups
+
+        logs = [make_log('2026-01-01T08:15:00Z'), make_log('2026-01-02T08:15:00Z'), make_log('2026-01-03T09:10:00Z')]
+        es = FakeRollupES(logs)
+        redis_client = FakeLockRedis()
+        rollups = StatsRollups(lambda: es, redis_getter=lambda: redis_client, interval=60)
+        extensions = []
+        original_eval = redis_client.eval
+
+        def eval_(script, numkeys, key, token, *args):
+            if 'pexpire' in script:
+                extensions.append(args[0])
+                # Verrou expiré puis repris par un autre worker après le premier jour
+                if len(extensions) == 2:
+                    redis_client.keys[key] = 'other-worker'
+            return original_eval(script, numkeys, key, token, *args)
+        redis_client.eval = eval_
+
+        assert not rollups.run_pass(now=self.NOW)
+
+        assert extensions == [rollups.lock_ttl_ms] * 2
+        assert len(es.raw_searches) == 2  # min(@timestamp) + premier jour seulement
+        assert '_state' not in es.docs
+        assert redis_client.get(rollups.LOCK_KEY) == 'other-worker'
+        assert 'lock lost' in rollups.get_metrics()['last_error']
+
+    def test_engine_uses_rollup_timeline(self):
+        """Test: Avec des rollups prêts, la requête de statistiques n'inclut plus l'histogramme brut"""
+        class Rollups:
+            def timeline(self):
+                return [{'date': '2026-01-03', 'count': 3}]
+
+        bodies = []
+        es = FakeES()
+        original = es.search
+
+        def search(index=None, body=None):
+            bodies.append(body)
+            return original(index=index, body=body)
+        es.search = search
+
+        stats = StatsEngine(lambda: es, ttl=60, rollups=Rollups()).compute()
+
+        assert 'logs_over_time' not in bodies[0]['aggs']
+        assert stats['timeline'] == [{'date': '2026-01-03', 'count': 3}]
+        assert stats['total_logs'] == 120
+
+
+class FakeCatalogES:
+    """Elasticsearch simulé : index journaliers, un index non journalier et un data stream"""
+
+    def __init__(self):
+        self.indices = self
+        self.field_caps_calls = []
+        self.counts = []
+
+    def resolve_index(self, name):
+        return {
+            'indices': [{'name': f'logs-ecommerce-2026.01.{day:02d}'} for day in range(1, 31)]
+                       + [{'name': 'logs-saas-csv'}],
+            'data_streams': [{'name': 'logs-saas-json', 'backing_indices': ['.ds-logs-saas-json-2026.01.01-000001']}]
+        }
+
+    def field_caps(self, index, fields, index_filter, ignore_unavailable=None):
+        self.field_caps_calls.append((index, index_filter))
+        # Seul l'index CSV contient des documents récents
+        return {'indices': ['logs-saas-csv'] if index_filter['range']['@timestamp']['gte'] >= '2026-01-20' else []}
+
+    def count(self, index, query):
+        self.counts.append((index, query))
+        return {'count': 42}
+
+
+class TestIndexRouter:
+    """Tests de la sélection des index par plage de temps"""
+
+    def test_classify_daily_indices(self):
+        """Test: Le jour des index logs-ecommerce-YYYY.MM.dd est lu dans leur nom"""
+        from index_router import IndexRouter
+
+        catalog = IndexRouter.classify(['logs-ecommerce-2026.01.03', 'logs-saas-json', 'logs-ecommerce-2026.13.40'])
+
+        assert catalog['daily'] == {'logs-ecommerce-2026.01.03': datetime(2026, 1, 3)}
+        assert catalog['other'] == ['logs-ecommerce-2026.13.40', 'logs-saas-json']
+
+    def test_last_24h_touches_two_daily_indices(self):
+        """Test: Une plage de 24h ne cible que deux index journaliers (+ les index non journaliers concernés)"""
+        from index_router import IndexRouter
+
+        es = FakeCatalogES()
+        router = IndexRouter(lambda: es, ttl=60)
+
+        indices = router.resolve(datetime(2026, 1, 22, 11), datetime(2026, 1, 23, 10, 30))
+
+        assert indices == ['logs-ecommerce-2026.01.22', 'logs-ecommerce-2026.01.23', 'logs-saas-csv']
+        assert es.field_caps_calls[0][0] == '.ds-logs-saas-json-2026.01.01-000001,logs-saas-csv'
+
+        # Même plage arrondie à l'heure : résultat _field_caps en cache
+        router.resolve(datetime(2026, 1, 22, 11, 20), datetime(2026, 1, 23, 10, 50))
+        assert len(es.field_caps_calls) == 1
+        assert router.target(datetime(2025, 6, 1), datetime(2025, 6, 2)) is None
+
+    def test_fallback_to_pattern(self):
+        """Test: Sans Elasticsearch, la recherche porte sur le pattern complet"""
+        from index_router import IndexRouter
+
+        assert IndexRouter(lambda: None).target(datetime(2026, 1, 1), datetime(2026, 1, 2)) == 'logs-*'
+
+    def test_engine_counts_recent_logs_on_routed_indices(self):
+        """Test: Les logs des dernières 24h sont comptés sur les seuls index de la plage"""
+        from index_router import IndexRouter
+
+        es = FakeES()
+        catalog = FakeCatalogES()
+        bodies = []
+        original = es.search
+
+        def search(index=None, body=None):
+            bodies.append(body)
+            return original(index=index, body=body)
+        es.search = search
+        es.count = catalog.count
+
+        engine = StatsEngine(lambda: es, ttl=60, router=IndexRouter(lambda: catalog))
+        stats = engine.compute()
+
+        assert 'recent_hours' not in bodies[0]['aggs']
+        assert stats['logs_today'] == 42
+        index, query = catalog.counts[0]
+        # max = 2026-01-03T10:00:00Z : l'heure contenant max - 24h est comptée entièrement
+        assert index == 'logs-ecommerce-2026.01.02,logs-ecommerce-2026.01.03'
+        assert query['range']['@timestamp'] == {'gte': '2026-01-02T10:00:00.000Z', 'lte': '2026-01-03T10:00:00.000Z'}
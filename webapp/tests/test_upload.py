@@ -4,6 +4,8 @@
 import pytest
 import io
 import os
+import json
+import copy
 
 
 class TestFileUpload:
@@ -116,3 +118,430 @@ class TestFileUpload:
         assert allowed_file('data.exe') == False
         assert allowed_file('data.php') == False
         assert allowed_file('noextension') == False
+
+
+class FakeBulkES:
+    """Client Elasticsearch minimal : enregistre les requêtes _bulk"""
+
+    def __init__(self, fail_every=0):
+        self.requests = []
+        self.fail_every = fail_every
+
+    def bulk(self, operations, index):
+        self.requests.append((index, list(operations)))
+        docs = operations[1::2]
+        items = []
+        for i, _ in enumerate(docs):
+            if self.fail_every and (i + 1) % self.fail_every == 0:
+                items.append({'create': {'status': 400, 'error': {'reason': 'mapper_parsing_exception'}}})
+            else:
+                items.append({'create': {'status': 201}})
+        return {'errors': any('error' in item['create'] for item in items), 'items': items}
+
+
+class TestStreamingIngestion:
+    """Tests du parsing incrémental et de l'indexation par lots"""
+
+    @staticmethod
+    def chunked(data, size):
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+    def test_csv_is_parsed_across_chunks(self, sample_csv_file):
+        """Test: Les lignes CSV coupées entre deux blocs sont reconstituées"""
+        from ingestion import StreamingIngestor
+
+        with open(sample_csv_file, 'rb') as f:
+            data = f.read()
+        es = FakeBulkES()
+        result = StreamingIngestor(es, 'csv', source='test.csv').run(self.chunked(data, 7))
+
+        assert result['stats']['rows_parsed'] == 3
+        assert result['stats']['rows_indexed'] == 3
+        assert result['stats']['bytes_read'] == len(data)
+        assert result['preview'][0].startswith('transaction_id,')
+        index, operations = es.requests[0]
+        assert index == 'logs-saas-csv'
+        doc = json.loads(operations[1])
+        assert doc['transaction_id'] == 'TXN001'
+        assert doc['source_file'] == 'test.csv'
+
+    def test_json_array_is_streamed(self, sample_json_file):
+        """Test: Un tableau JSON est parsé élément par élément"""
+        from ingestion import StreamingIngestor
+
+        with open(sample_json_file, 'rb') as f:
+            data = f.read()
+        es = FakeBulkES()
+        result = StreamingIngestor(es, 'json').run(self.chunked(data, 5))
+
+        assert result['stats']['rows_indexed'] == 2
+        assert es.requests[0][0] == 'logs-saas-json'
+
+    def test_ndjson_counts_invalid_lines(self):
+        """Test: Les lignes NDJSON invalides sont comptées sans interrompre l'ingestion"""
+        from ingestion import StreamingIngestor
+
+        data = b'{"timestamp": "2026-01-03T10:00:00Z", "level": "INFO"}\nnot json\n{"level": "ERROR"}\n'
+        es = FakeBulkES()
+        result = StreamingIngestor(es, 'ndjson').run(self.chunked(data, 10))
+
+        assert result['stats']['rows_indexed'] == 2
+        assert result['stats']['parse_errors'] == 1
+        first = json.loads(es.requests[0][1][1])
+        assert first['@timestamp'] == '2026-01-03T10:00:00Z'
+        # Sans timestamp : date d'ingestion (requise par les data streams)
+        second = json.loads(es.requests[0][1][3])
+        assert second['@timestamp'].endswith('Z')
+
+    def test_bulk_batches_by_document_count(self):
+        """Test: Les documents sont envoyés par lots de taille bornée"""
+        from ingestion import StreamingIngestor
+
+        data = ''.join(json.dumps({'n': i}) + '\n' for i in range(25)).encode()
+        es = FakeBulkES(fail_every=10)
+        result = StreamingIngestor(es, 'ndjson', batch_docs=10).run([data])
+
+        assert [len(ops) // 2 for _, ops in es.requests] == [10, 10, 5]
+        assert result['stats']['bulk_requests'] == 3
+        assert result['stats']['index_errors'] == 2
+        assert result['stats']['rows_indexed'] == 23
+
+    def test_truncated_json_array_raises(self):
+        """Test: Un tableau JSON tronqué est signalé comme erreur"""
+        from ingestion import StreamingIngestor, IngestError
+
+        with pytest.raises(IngestError):
+            StreamingIngestor(FakeBulkES(), 'json').run([b'[{"a": 1}, {"b":'])
+
+    def test_stream_endpoint_requires_auth(self, client):
+        """Test: L'upload brut nécessite une authentification"""
+        response = client.post('/api/uploads/stream?filename=data.csv', data=b'a,b\n1,2\n')
+        assert response.status_code == 401
+
+
+def fake_ingest_job(job):
+    """Job exécuté dans le pool de processus pendant les tests"""
+    if job['format'] == 'bad':
+        raise ValueError('boom')
+    return {'status': 'processed', 'ingest': {'rows_indexed': 3}}
+
+
+class FakeQueueRedis:
+    """Redis simulé : listes, sets et clés avec TTL utilisés par UploadJobQueue"""
+
+    def __init__(self):
+        self.lists = {}
+        self.sets = {}
+        self.keys = {}
+
+    def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    def _pop(self, key, side):
+        items = self.lists.get(key)
+        if not items:
+            return None
+        return items.pop(0) if side == 'LEFT' else items.pop()
+
+    def _push(self, key, value, side):
+        items = self.lists.setdefault(key, [])
+        if side == 'LEFT':
+            items.insert(0, value)
+        else:
+            items.append(value)
+
+    def lmove(self, source, destination, src='LEFT', dest='RIGHT'):
+        value = self._pop(source, src)
+        if value is not None:
+            self._push(destination, value, dest)
+        return value
+
+    def blmove(self, source, destination, timeout, src='LEFT', dest='RIGHT'):
+        value = self.lmove(source, destination, src, dest)
+        if value is None:
+            import time
+            time.sleep(0.05)
+        return value
+
+    def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        if value in items:
+            items.remove(value)
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def sadd(self, key, value):
+        self.sets.setdefault(key, set()).add(value)
+
+    def srem(self, key, value):
+        self.sets.get(key, set()).discard(value)
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def setex(self, key, ttl, value):
+        self.keys[key] = value
+
+    def exists(self, key):
+        return int(key in self.keys)
+
+
+class TestUploadJobQueue:
+    """Tests de la file des jobs d'ingestion (fallback local, sans Redis)"""
+
+    @staticmethod
+    def wait_for(queue_, job_id, timeout=10):
+        import time
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = queue_.get_job(job_id)
+            if job and job['status'] in ('processed', 'error'):
+                return job
+            time.sleep(0.05)
+        return queue_.get_job(job_id)
+
+    def test_job_runs_in_process_pool(self, monkeypatch):
+        """Test: Un job mis en file est exécuté et son résultat est conservé"""
+        import upload_jobs
+
+        monkeypatch.setattr(upload_jobs, 'run_ingest_job', fake_ingest_job)
+        completed = []
+        jobs = upload_jobs.UploadJobQueue(workers=1, on_complete=lambda job, result: completed.append(job['job_id']))
+        try:
+            job_id = jobs.submit({'filename': 'a.csv', 'format': 'csv'})
+            job = self.wait_for(jobs, job_id)
+        finally:
+            jobs.stop()
+
+        assert job['status'] == 'processed'
+        assert job['ingest']['rows_indexed'] == 3
+        assert completed == [job_id]
+        assert jobs.get_metrics()['completed'] == 1
+
+    def test_failed_job_is_reported(self, monkeypatch):
+        """Test: Une exception dans le worker marque le job en erreur"""
+        import upload_jobs
+
+        monkeypatch.setattr(upload_jobs, 'run_ingest_job', fake_ingest_job)
+        jobs = upload_jobs.UploadJobQueue(workers=1)
+        try:
+            job_id = jobs.submit({'filename': 'a.csv', 'format': 'bad'})
+            job = self.wait_for(jobs, job_id)
+        finally:
+            jobs.stop()
+
+        assert job['status'] == 'error'
+        assert 'boom' in job['ingest_error']
+        assert jobs.get_metrics()['failed'] == 1
+
+    def test_redis_job_is_acknowledged(self, monkeypatch):
+        """Test: Un job Redis reste dans la liste processing du worker jusqu'à sa fin"""
+        import upload_jobs
+
+        monkeypatch.setattr(upload_jobs, 'run_ingest_job', fake_ingest_job)
+        redis_client = FakeQueueRedis()
+        jobs = upload_jobs.UploadJobQueue(lambda: redis_client, workers=1)
+        try:
+            job_id = jobs.submit({'filename': 'a.csv', 'format': 'csv'})
+            job = self.wait_for(jobs, job_id)
+        finally:
+            jobs.stop()
+
+        assert job['status'] == 'processed'
+        assert redis_client.llen(jobs.QUEUE_KEY) == 0
+        assert redis_client.llen(jobs.processing_key) == 0
+        assert jobs.worker_id in redis_client.smembers(jobs.WORKERS_KEY)
+
+    def test_stale_worker_jobs_are_requeued(self):
+        """Test: Les jobs en cours d'un worker sans signal de présence sont remis en file"""
+        import upload_jobs
+
+        redis_client = FakeQueueRedis()
+        jobs = upload_jobs.UploadJobQueue(lambda: redis_client, workers=1)
+        # Worker arrêté pendant l'ingestion (plus de heartbeat), worker vivant
+        redis_client.sadd(jobs.WORKERS_KEY, 'dead')
+        redis_client.lpush(jobs.PROCESSING_KEY + 'dead', '{"job_id": "j1"}')
+        redis_client.sadd(jobs.WORKERS_KEY, 'alive')
+        redis_client.setex(jobs.HEARTBEAT_KEY + 'alive', 30, '1')
+        redis_client.lpush(jobs.PROCESSING_KEY + 'alive', '{"job_id": "j2"}')
+
+        assert jobs.requeue_stale() == 1
+        assert redis_client.lists[jobs.QUEUE_KEY] == ['{"job_id": "j1"}']
+        assert redis_client.llen(jobs.PROCESSING_KEY + 'alive') == 1
+        assert redis_client.smembers(jobs.WORKERS_KEY) == {'alive'}
+        assert jobs.get_metrics()['requeued'] == 1
+
+    def test_default_start_method_is_not_fork(self):
+        """Test: Le pool n'utilise pas fork (workers gunicorn multi-threadés)"""
+        from upload_jobs import default_start_method
+
+        assert default_start_method() in ('forkserver', 'spawn')
+
+    def test_run_ingest_job_without_mongo(self, monkeypatch, sample_csv_file):
+        """Test: Le worker indexe le fichier et retourne les statistiques finales"""
+        import upload_jobs
+
+        es = FakeBulkES()
+        monkeypatch.setattr(upload_jobs, '_worker_es', lambda host: es)
+        result = upload_jobs.run_ingest_job({
+            'path': sample_csv_file,
+            'filename': 'test.csv',
+            'format': 'csv',
+            'es_host': 'http://localhost:9200'
+        })
+
+        assert result['status'] == 'processed'
+        assert result['ingest']['rows_indexed'] == 3
+        assert len(es.requests) == 1
+
+    def test_progress_unknown_upload(self, client):
+        """Test: La progression d'un upload inconnu retourne 404"""
+        from app import auth_manager
+
+        token = auth_manager.generate_token({'username': 'tester', 'role': 'user'})
+        response = client.get('/api/uploads/unknown/progress', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 404
+
+
+class FakeSummaryCollection:
+    """Document de synthèse simulé (opérateurs utilisés par UploadCounters)"""
+
+    def __init__(self):
+        self.doc = None
+
+    def find_one(self, query):
+        return copy.deepcopy(self.doc)
+
+    def replace_one(self, query, doc, upsert=False):
+        self.doc = copy.deepcopy(doc)
+
+    def update_one(self, query, update):
+        doc = self.doc
+        if doc is None:
+            return
+        position = None
+        if 'recent._id' in query:
+            ids = [item['_id'] for item in doc['recent']]
+            if query['recent._id'] not in ids:
+                return
+            position = ids.index(query['recent._id'])
+        for key, value in update.get('$inc', {}).items():
+            section, _, status = key.partition('.')
+            if status:
+                doc[section][status] = doc[section].get(status, 0) + value
+            else:
+                doc[section] += value
+        for key, push in update.get('$push', {}).items():
+            doc[key] = (push['$each'] + doc[key])[:push['$slice']]
+        for key, value in update.get('$set', {}).items():
+            if key == 'recent.$.status':
+                doc['recent'][position]['status'] = value
+            else:
+                doc[key] = value
+
+
+class FakeUploadsCollection:
+    """Collection des uploads simulée"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def aggregate(self, pipeline):
+        counts = {}
+        for doc in self.docs:
+            counts[doc['status']] = counts.get(doc['status'], 0) + 1
+        return [{'_id': status, 'count': count} for status, count in counts.items()]
+
+    def find(self, query, projection):
+        docs = self.docs
+
+        class Cursor:
+            def sort(self, field, direction):
+                self.docs = sorted(docs, key=lambda doc: doc[field], reverse=True)
+                return self
+
+            def limit(self, n):
+                return self.docs[:n]
+        return Cursor()
+
+    def find_one_and_update(self, query, update, projection=None):
+        for doc in self.docs:
+            if doc['_id'] == query['_id'] and doc['status'] in query.get('status', {}).get('$in', [doc['status']]):
+                before = dict(doc)
+                doc.update(update['$set'])
+                return before
+        return None
+
+
+def make_upload(n, status):
+    from bson import ObjectId
+
+    return {'_id': ObjectId(), 'filename': f'file{n}.csv', 'extension': 'csv', 'size': 1024,
+            'status': status, 'uploaded_at': f'2026-01-{n + 1:02d}T00:00:00Z'}
+
+
+class TestUploadCounters:
+    """Tests des compteurs matérialisés du tableau de bord"""
+
+    def make_counters(self, docs, recent_size=3):
+        from upload_counters import UploadCounters
+
+        uploads, summary = FakeUploadsCollection(docs), FakeSummaryCollection()
+        return UploadCounters(lambda: uploads, lambda: summary, recent_size=recent_size), uploads, summary
+
+    def test_summary_missing_until_reconciled(self):
+        """Test: Sans reconstruction, aucun compteur partiel n'est publié"""
+        counters, _, summary = self.make_counters([])
+        counters.record_insert(make_upload(0, 'saved'))
+
+        assert summary.doc is None
+        assert counters.get_summary() is None
+
+    def test_reconcile_rebuilds_from_uploads(self):
+        """Test: La reconstruction compte chaque statut et garde les derniers uploads"""
+        docs = [make_upload(0, 'saved'), make_upload(1, 'processed'), make_upload(2, 'error'),
+                make_upload(3, 'queued'), make_upload(4, 'processed')]
+        counters, _, _ = self.make_counters(docs)
+
+        summary = counters.reconcile()
+
+        assert summary['total_uploads'] == 5
+        assert summary['success_uploads'] == 3
+        assert summary['error_uploads'] == 1
+        assert [u['filename'] for u in summary['uploads']] == ['file4.csv', 'file3.csv', 'file2.csv']
+        assert counters.get_summary()['total_uploads'] == 5
+
+    def test_insert_and_status_changes_are_incremental(self):
+        """Test: Insertions et changements de statut mettent à jour compteurs et liste bornée"""
+        docs = [make_upload(0, 'saved')]
+        counters, uploads, _ = self.make_counters(docs)
+        counters.reconcile()
+
+        for n in range(1, 4):
+            upload = make_upload(n, 'queued')
+            docs.append(upload)
+            counters.record_insert(upload)
+        latest = docs[-1]['_id']
+        assert counters.update_status(str(latest), {'status': 'processing'}) == 'queued'
+        assert counters.update_status(latest, {'status': 'error'}) == 'processing'
+        # Déjà terminé : la correction du processus parent ne compte pas deux fois
+        assert counters.update_status(latest, {'status': 'error'}, only_from=('queued', 'processing')) is None
+
+        summary = counters.get_summary()
+        assert summary['total_uploads'] == 4
+        assert summary['statuses'] == {'saved': 1, 'queued': 2, 'error': 1}
+        assert summary['error_uploads'] == 1
+        assert len(summary['uploads']) == 3
+        assert summary['uploads'][0]['status'] == 'error'
+        assert summary == {**counters.reconcile(), 'reconciled_at': summary['reconciled_at'],
+                           'updated_at': summary['updated_at']}
+
+    def test_dashboard_without_mongo(self, client):
+        """Test: Le tableau de bord s'affiche avec des compteurs à zéro sans MongoDB"""
+        from app import auth_manager
+
+        token = auth_manager.generate_token({'username': 'tester', 'role': 'user'})
+        response = client.get('/dashboard', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
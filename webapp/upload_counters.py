@@ -0,0 +1,194 @@
+"""
+LogStream Studio - Compteurs matérialisés des uploads
+Document de synthèse MongoDB (totaux par statut + derniers uploads) maintenu à chaque
+insertion et changement de statut : le tableau de bord le lit en une seule requête
+"""
+
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import DESCENDING
+
+
+SUMMARY_COLLECTION = 'upload_summary'
+SUMMARY_ID = 'uploads'
+
+# Statuts comptés comme réussis / en erreur sur le tableau de bord
+SUCCESS_STATUSES = ('saved', 'processed')
+ERROR_STATUSES = ('error',)
+
+# Champs conservés pour la liste des derniers uploads (affichés par dashboard.html)
+RECENT_FIELDS = ('filename', 'extension', 'size', 'status', 'uploaded_at')
+
+
+def recent_item(metadata):
+    """Entrée de la liste des derniers uploads (identifiant en chaîne)"""
+    item = {field: metadata.get(field) for field in RECENT_FIELDS}
+    item['_id'] = str(metadata['_id'])
+    return item
+
+
+class UploadCounters:
+    """Compteurs d'uploads incrémentaux et liste bornée des derniers uploads"""
+
+    def __init__(self, uploads_getter, summary_getter, recent_size=None):
+        """
+        Args:
+            uploads_getter (callable): Retourne la collection des uploads (ou None)
+            summary_getter (callable): Retourne la collection du document de synthèse (ou None)
+            recent_size (int): Nombre de derniers uploads conservés
+        """
+        self.uploads_getter = uploads_getter
+        self.summary_getter = summary_getter
+        self.recent_size = recent_size or int(os.environ.get('UPLOAD_RECENT_SIZE', '10'))
+
+    # ------------------------------------------
+    #  Mises à jour incrémentales
+    # ------------------------------------------
+
+    def _update_summary(self, update, query=None):
+        summary_col = self.summary_getter()
+        if summary_col is None:
+            return
+        # Pas d'upsert : tant que le document n'a pas été reconstruit (reconcile),
+        # les compteurs partiels ne sont pas publiés
+        try:
+            summary_col.update_one(dict(query or {}, _id=SUMMARY_ID), update)
+        except Exception as e:
+            print(f"Error updating upload counters: {e}")
+
+    def record_insert(self, metadata):
+        """
+        Comptabilise un upload qui vient d'être inséré (metadata contient son _id)
+
+        Args:
+            metadata (dict): Métadonnées de l'upload
+        """
+        self._update_summary({
+            '$inc': {'total': 1, f"statuses.{metadata['status']}": 1},
+            '$push': {'recent': {'$each': [recent_item(metadata)], '$position': 0, '$slice': self.recent_size}},
+            '$set': {'updated_at': datetime.utcnow().isoformat() + 'Z'}
+        })
+
+    def record_status_change(self, upload_id, old_status, new_status):
+        """Déplace un upload d'un compteur de statut à l'autre"""
+        if old_status == new_status:
+            return
+        increments = {f'statuses.{new_status}': 1}
+        if old_status:
+            increments[f'statuses.{old_status}'] = -1
+        self._update_summary({'$inc': increments, '$set': {'updated_at': datetime.utcnow().isoformat() + 'Z'}})
+        # Statut affiché dans la liste, si l'upload en fait encore partie
+        self._update_summary({'$set': {'recent.$.status': new_status}}, {'recent._id': str(upload_id)})
+
+    def update_status(self, upload_id, fields, only_from=None):
+        """
+        Modifie un upload et ses compteurs : l'ancien statut est lu atomiquement par
+        find_one_and_update, deux écritures concurrentes ne comptent donc pas deux fois
+
+        Args:
+            upload_id (str|ObjectId): Identifiant de l'upload
+            fields (dict): Champs à modifier (dont 'status')
+            only_from (tuple): Ne modifie l'upload que s'il est dans l'un de ces statuts
+
+        Returns:
+            str: Ancien statut, ou None si l'upload n'a pas été modifié
+        """
+        uploads_col = self.uploads_getter()
+        if uploads_col is None:
+            return None
+        query = {'_id': ObjectId(upload_id) if isinstance(upload_id, str) else upload_id}
+        if only_from:
+            query['status'] = {'$in': list(only_from)}
+        try:
+            before = uploads_col.find_one_and_update(query, {'$set': fields}, projection={'status': 1})
+        except Exception as e:
+            print(f"Error updating upload status: {e}")
+            return None
+        if before is None:
+            return None
+        self.record_status_change(upload_id, before.get('status'), fields.get('status', before.get('status')))
+        return before.get('status')
+
+    # ------------------------------------------
+    #  Lecture et reconstruction
+    # ------------------------------------------
+
+    @staticmethod
+    def _format(doc):
+        statuses = {status: count for status, count in doc.get('statuses', {}).items() if count}
+        return {
+            'total_uploads': doc.get('total', 0),
+            'success_uploads': sum(statuses.get(status, 0) for status in SUCCESS_STATUSES),
+            'error_uploads': sum(statuses.get(status, 0) for status in ERROR_STATUSES),
+            'uploads': doc.get('recent', []),
+            'statuses': statuses,
+            'reconciled_at': doc.get('reconciled_at'),
+            'updated_at': doc.get('updated_at')
+        }
+
+    def get_summary(self):
+        """
+        Compteurs du tableau de bord (une seule lecture, quel que soit le nombre d'uploads)
+
+        Returns:
+            dict: total_uploads, success_uploads, error_uploads, uploads, statuses...
+                  ou None si le document de synthèse n'existe pas encore
+        """
+        summary_col = self.summary_getter()
+        if summary_col is None:
+            return None
+        try:
+            doc = summary_col.find_one({'_id': SUMMARY_ID})
+        except Exception as e:
+            print(f"Error reading upload counters: {e}")
+            return None
+        if not doc or not doc.get('reconciled_at'):
+            return None
+        return self._format(doc)
+
+    def reconcile(self):
+        """
+        Reconstruit le document de synthèse à partir de la collection des uploads
+        (premier démarrage, ou correction d'une dérive après une écriture interrompue)
+
+        Returns:
+            dict: Compteurs reconstruits (voir get_summary), ou None si MongoDB est indisponible
+        """
+        uploads_col = self.uploads_getter()
+        summary_col = self.summary_getter()
+        if uploads_col is None or summary_col is None:
+            return None
+
+        try:
+            statuses = {}
+            for row in uploads_col.aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]):
+                statuses[str(row['_id'])] = row['count']
+            recent = [recent_item(doc) for doc in uploads_col.find({}, {field: 1 for field in RECENT_FIELDS})
+                      .sort('uploaded_at', DESCENDING).limit(self.recent_size)]
+            now = datetime.utcnow().isoformat() + 'Z'
+            doc = {
+                '_id': SUMMARY_ID,
+                'total': sum(statuses.values()),
+                'statuses': statuses,
+                'recent': recent,
+                'reconciled_at': now,
+                'updated_at': now
+            }
+            summary_col.replace_one({'_id': SUMMARY_ID}, doc, upsert=True)
+        except Exception as e:
+            print(f"Error rebuilding upload counters: {e}")
+            return None
+        return self._format(doc)
+
+
+# Instance globale (sera initialisée dans app.py avec les collections)
+upload_counters = None
+
+
+def init_upload_counters(uploads_getter, summary_getter, **kwargs):
+    """Initialise les compteurs matérialisés des uploads"""
+    global upload_counters
+    upload_counters = UploadCounters(uploads_getter, summary_getter, **kwargs)
+    return upload_counters
@@ -0,0 +1,419 @@
+"""
+LogStream Studio - File de traitement des uploads
+Jobs d'ingestion en arrière-plan (file Redis ou locale) exécutés dans un pool de processus.
+Avec Redis, un job pris en charge reste dans la liste « processing » de son worker jusqu'à
+la fin de son exécution : les jobs d'un worker arrêté en cours d'ingestion sont remis en file
+"""
+
+import atexit
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from ingestion import StreamingIngestor, IngestError, iter_chunks
+from upload_counters import UploadCounters, SUMMARY_COLLECTION
+
+
+# Intervalle minimal entre deux écritures de progression dans MongoDB
+PROGRESS_INTERVAL = float(os.environ.get('UPLOAD_PROGRESS_INTERVAL', '0.5'))
+
+# Durée de vie du signal de présence d'un worker : au-delà, ses jobs en cours sont remis en file
+WORKER_HEARTBEAT_TTL = int(os.environ.get('UPLOAD_WORKER_HEARTBEAT_TTL', '30'))
+
+# Clients réutilisés par chaque processus du pool (créés après le fork)
+_worker_clients = {}
+
+
+def _worker_es(es_host):
+    from elasticsearch import Elasticsearch
+
+    key = ('es', es_host)
+    if key not in _worker_clients:
+        _worker_clients[key] = Elasticsearch([es_host], request_timeout=30)
+    return _worker_clients[key]
+
+
+def _worker_collection(mongo_uri, mongo_db, collection):
+    import pymongo
+
+    key = ('mongo', mongo_uri)
+    if key not in _worker_clients:
+        _worker_clients[key] = pymongo.MongoClient(mongo_uri, serverSelectionTimeoutMS=2000)
+    return _worker_clients[key][mongo_db][collection]
+
+
+def run_ingest_job(job):
+    """
+    Exécuté dans un processus du pool : parse et indexe le fichier,
+    et publie la progression dans les métadonnées de l'upload (MongoDB)
+
+    Args:
+        job (dict): job_id, upload_id, path, filename, format, es_host, mongo_uri, mongo_db, collection
+
+    Returns:
+        dict: Champs finaux de l'upload (status, ingest, ingest_error)
+    """
+    collection = None
+    upload_id = None
+    counters = None
+    if job.get('upload_id') and job.get('mongo_uri'):
+        from bson import ObjectId
+
+        collection = _worker_collection(job['mongo_uri'], job['mongo_db'], job['collection'])
+        upload_id = ObjectId(job['upload_id'])
+        counters = UploadCounters(lambda: collection,
+                                  lambda: _worker_collection(job['mongo_uri'], job['mongo_db'], SUMMARY_COLLECTION))
+
+    def publish(fields):
+        if collection is None:
+            return
+        try:
+            collection.update_one({'_id': upload_id}, {'$set': fields})
+        except Exception as e:
+            print(f"Error saving upload progress: {e}")
+
+    def publish_status(fields):
+        # Changement de statut : compteurs du tableau de bord mis à jour avec l'upload
+        if counters is not None:
+            counters.update_status(upload_id, fields)
+
+    last_publish = [0.0]
+
+    def on_progress(stats):
+        now = time.time()
+        if now - last_publish[0] >= PROGRESS_INTERVAL:
+            last_publish[0] = now
+            publish({'status': 'processing', 'ingest': stats})
+
+    publish_status({'status': 'processing', 'started_at': datetime.utcnow().isoformat() + 'Z'})
+
+    ingestor = StreamingIngestor(_worker_es(job['es_host']), job['format'], source=job['filename'],
+                                 on_progress=on_progress)
+    fields = {}
+    try:
+        with open(job['path'], 'rb') as f:
+            stats = ingestor.run(iter_chunks(f))['stats']
+        fields['status'] = 'processed'
+    except (IngestError, OSError) as e:
+        stats = ingestor.stats()
+        fields['status'] = 'error'
+        fields['ingest_error'] = str(e)
+
+    fields['ingest'] = stats
+    fields['finished_at'] = datetime.utcnow().isoformat() + 'Z'
+    publish_status(fields)
+    return fields
+
+
+def default_start_method():
+    """forkserver si disponible (POSIX), sinon spawn"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return 'forkserver'
+    return 'spawn'
+
+
+class UploadJobQueue:
+    """File des jobs d'ingestion : Redis partagée entre workers, ou file locale en fallback"""
+
+    QUEUE_KEY = 'logstream:uploads:jobs'
+    # Jobs en cours d'un worker (liste), signal de présence (clé avec TTL), workers connus (set)
+    PROCESSING_KEY = 'logstream:uploads:processing:'
+    HEARTBEAT_KEY = 'logstream:uploads:heartbeat:'
+    WORKERS_KEY = 'logstream:uploads:workers'
+
+    def __init__(self, redis_getter=None, workers=None, on_complete=None, heartbeat_ttl=None):
+        """
+        Args:
+            redis_getter (callable): Retourne le client Redis (ou None)
+            workers (int): Nombre de processus d'ingestion
+            on_complete (callable): Appelée avec (job, résultat) à la fin de chaque job
+            heartbeat_ttl (int): Secondes sans signal de présence avant reprise des jobs d'un worker
+        """
+        self.redis_getter = redis_getter or (lambda: None)
+        self.workers = workers or int(os.environ.get('UPLOAD_JOB_WORKERS', '2'))
+        self.on_complete = on_complete
+        self.heartbeat_ttl = heartbeat_ttl or WORKER_HEARTBEAT_TTL
+
+        # Identifiant du worker web (liste processing et signal de présence Redis)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.processing_key = self.PROCESSING_KEY + self.worker_id
+        self._last_heartbeat = 0.0
+        self._last_recovery = 0.0
+
+        self._local_queue = queue.Queue()
+        # Un job n'est retiré de la file que lorsqu'un processus est libre :
+        # les autres workers web peuvent ainsi le prendre
+        self._slots = threading.Semaphore(self.workers)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+        # État des jobs de ce processus (fallback si MongoDB indisponible)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._metrics = {'enqueued': 0, 'started': 0, 'completed': 0, 'failed': 0, 'requeued': 0}
+
+    def _record(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self._metrics[key] += value
+
+    def _set_state(self, job_id, **fields):
+        with self._lock:
+            state = self._jobs.setdefault(job_id, {'job_id': job_id})
+            state.update(fields)
+            # Borne la mémoire : seuls les 1000 derniers jobs sont conservés
+            while len(self._jobs) > 1000:
+                self._jobs.pop(next(iter(self._jobs)))
+
+    # ------------------------------------------
+    #  File
+    # ------------------------------------------
+
+    def submit(self, job):
+        """
+        Ajoute un job à la file
+
+        Args:
+            job (dict): Description du job (voir run_ingest_job)
+
+        Returns:
+            str: Identifiant du job
+        """
+        job_id = job.setdefault('job_id', job.get('upload_id') or uuid.uuid4().hex)
+        self._set_state(job_id, status='queued', filename=job.get('filename'),
+                        queued_at=datetime.utcnow().isoformat() + 'Z')
+
+        redis_client = self.redis_getter()
+        queued = False
+        if redis_client is not None:
+            try:
+                redis_client.lpush(self.QUEUE_KEY, json.dumps(job))
+                queued = True
+            except Exception as e:
+                print(f"Upload queue error (Redis), using local queue: {e}")
+        if not queued:
+            self._local_queue.put(job)
+
+        self._record(enqueued=1)
+        self._ensure_started()
+        return job_id
+
+    def _next_job(self, timeout):
+        """
+        Prochain job à exécuter
+
+        Returns:
+            tuple: (job, entrée Redis à retirer de la liste processing en fin de job, ou None)
+        """
+        try:
+            return self._local_queue.get_nowait(), None
+        except queue.Empty:
+            pass
+
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                # Déplacement atomique vers la liste processing du worker (pas de perte si le worker s'arrête)
+                raw = redis_client.blmove(self.QUEUE_KEY, self.processing_key, max(int(timeout), 1), 'RIGHT', 'LEFT')
+                return (json.loads(raw), raw) if raw else (None, None)
+            except Exception as e:
+                print(f"Upload queue read error (Redis): {e}")
+                time.sleep(timeout)
+                return None, None
+
+        try:
+            return self._local_queue.get(timeout=timeout), None
+        except queue.Empty:
+            return None, None
+
+    # ------------------------------------------
+    #  Reprise des jobs (Redis)
+    # ------------------------------------------
+
+    def _heartbeat(self):
+        """Signale la présence du worker et reprend régulièrement les jobs des workers disparus"""
+        now = time.time()
+        redis_client = self.redis_getter()
+        if redis_client is None or now - self._last_heartbeat < self.heartbeat_ttl / 3:
+            return
+        self._last_heartbeat = now
+        try:
+            redis_client.sadd(self.WORKERS_KEY, self.worker_id)
+            redis_client.setex(self.HEARTBEAT_KEY + self.worker_id, self.heartbeat_ttl, '1')
+        except Exception as e:
+            print(f"Upload worker heartbeat error (Redis): {e}")
+            return
+        if now - self._last_recovery >= self.heartbeat_ttl:
+            self._last_recovery = now
+            self.requeue_stale()
+
+    def requeue_stale(self):
+        """
+        Remet en tête de file les jobs en cours des workers sans signal de présence
+        (arrêt ou crash pendant l'ingestion)
+
+        Returns:
+            int: Nombre de jobs remis en file
+        """
+        redis_client = self.redis_getter()
+        if redis_client is None:
+            return 0
+        requeued = 0
+        try:
+            for worker_id in redis_client.smembers(self.WORKERS_KEY):
+                if worker_id == self.worker_id or redis_client.exists(self.HEARTBEAT_KEY + worker_id):
+                    continue
+                # LMOVE est atomique : deux workers qui reprennent la même liste ne dupliquent pas les jobs
+                while redis_client.lmove(self.PROCESSING_KEY + worker_id, self.QUEUE_KEY, 'RIGHT', 'RIGHT'):
+                    requeued += 1
+                redis_client.srem(self.WORKERS_KEY, worker_id)
+        except Exception as e:
+            print(f"Upload job recovery error (Redis): {e}")
+        if requeued:
+            print(f"🔁 {requeued} upload job(s) requeued from stopped workers")
+            self._record(requeued=requeued)
+        return requeued
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='upload-job-dispatcher', daemon=True)
+            self._thread.start()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # Pas de fork depuis un worker gunicorn multi-threadé : un verrou copié
+                # pendant son utilisation bloquerait le processus enfant
+                context = multiprocessing.get_context(os.environ.get('UPLOAD_JOB_START_METHOD', default_start_method()))
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _run(self):
+        self._heartbeat()
+        while not self._stop_event.is_set():
+            # Attente d'un processus libre sans interrompre le signal de présence
+            while not self._slots.acquire(timeout=1.0):
+                self._heartbeat()
+                if self._stop_event.is_set():
+                    return
+            job = raw = None
+            while job is None and not self._stop_event.is_set():
+                self._heartbeat()
+                job, raw = self._next_job(1.0)
+            if job is None:
+                self._slots.release()
+                break
+            self._dispatch(job, raw)
+
+    def _dispatch(self, job, raw=None):
+        job_id = job['job_id']
+        self._set_state(job_id, status='processing', started_at=datetime.utcnow().isoformat() + 'Z')
+        self._record(started=1)
+        try:
+            future = self._get_pool().submit(run_ingest_job, job)
+        except Exception as e:
+            self._finish(job, {'status': 'error', 'ingest_error': str(e)}, raw)
+            return
+        future.add_done_callback(lambda f: self._done(job, f, raw))
+
+    def _done(self, job, future, raw=None):
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # Processus tué (mémoire, signal) : le pool sera recréé au prochain job
+            with self._pool_lock:
+                self._pool = None
+            result = {'status': 'error', 'ingest_error': f'Worker crashed: {e}'}
+        except Exception as e:
+            result = {'status': 'error', 'ingest_error': str(e)}
+        self._finish(job, result, raw)
+
+    def _finish(self, job, result, raw=None):
+        if raw is not None:
+            redis_client = self.redis_getter()
+            try:
+                if redis_client is not None:
+                    redis_client.lrem(self.processing_key, 1, raw)
+            except Exception as e:
+                print(f"Upload queue ack error (Redis): {e}")
+        self._set_state(job['job_id'], **result)
+        self._record(completed=1 if result.get('status') == 'processed' else 0,
+                     failed=0 if result.get('status') == 'processed' else 1)
+        self._slots.release()
+        if self.on_complete:
+            try:
+                self.on_complete(job, result)
+            except Exception as e:
+                print(f"Upload job callback error: {e}")
+
+    # ------------------------------------------
+    #  Consultation
+    # ------------------------------------------
+
+    def get_job(self, job_id):
+        """
+        État d'un job connu de ce processus
+
+        Returns:
+            dict: État du job ou None
+        """
+        with self._lock:
+            state = self._jobs.get(job_id)
+            return dict(state) if state else None
+
+    def get_metrics(self):
+        """
+        Compteurs de la file
+
+        Returns:
+            dict: enqueued, started, completed, failed, queue_depth...
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics['workers'] = self.workers
+        metrics['worker_id'] = self.worker_id
+        metrics['local_queue_depth'] = self._local_queue.qsize()
+        redis_client = self.redis_getter()
+        metrics['backend'] = 'redis' if redis_client is not None else 'memory'
+        if redis_client is not None:
+            try:
+                metrics['queue_depth'] = redis_client.llen(self.QUEUE_KEY)
+                metrics['processing'] = redis_client.llen(self.processing_key)
+            except Exception:
+                pass
+        return metrics
+
+    def stop(self):
+        self._stop_event.set()
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+# Instance globale (sera initialisée dans app.py)
+upload_jobs = None
+
+
+def init_upload_jobs(redis_getter=None, **kwargs):
+    """Initialise la file des jobs d'ingestion et l'arrête proprement à la sortie"""
+    global upload_jobs
+    upload_jobs = UploadJobQueue(redis_getter, **kwargs)
+    atexit.register(upload_jobs.stop)
+    return upload_jobs
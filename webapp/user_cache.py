@@ -0,0 +1,296 @@
+"""
+LogStream Studio - Cache des profils utilisateurs et révocation des tokens
+Hash Redis par utilisateur (avec TTL) devant la collection users, et liste compacte
+de révocations consultée à chaque vérification de token. Les hachages de mots de passe
+ne sont jamais copiés dans Redis : la connexion les lit dans MongoDB et n'utilise que
+le cache des utilisateurs inconnus
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from bson import ObjectId
+
+
+class UserCache:
+    """Profils utilisateurs servis depuis Redis, MongoDB seulement en cas d'absence"""
+
+    KEY_PREFIX = 'logstream:user:'
+    FIELDS = ('_id', 'username', 'email', 'role', 'is_active')
+    MISSING = '__missing__'
+
+    def __init__(self, redis_getter, users_getter, ttl=None, negative_ttl=None):
+        """
+        Args:
+            redis_getter (callable): Retourne le client Redis (ou None)
+            users_getter (callable): Retourne la collection users (ou None)
+            ttl (int): Durée de vie d'un profil en cache (secondes)
+            negative_ttl (int): Durée de vie d'un « utilisateur inconnu » en cache
+        """
+        self.redis_getter = redis_getter or (lambda: None)
+        self.users_getter = users_getter
+        self.ttl = ttl if ttl is not None else int(os.environ.get('USER_CACHE_TTL', '300'))
+        self.negative_ttl = negative_ttl if negative_ttl is not None else int(os.environ.get('USER_CACHE_NEGATIVE_TTL', '30'))
+
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+
+    def _record(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def _key(self, username):
+        return self.KEY_PREFIX + username
+
+    @staticmethod
+    def _to_hash(user):
+        return {
+            '_id': str(user['_id']),
+            'username': user['username'],
+            'email': user.get('email', '') or '',
+            'role': user.get('role', 'user'),
+            'is_active': '1' if user.get('is_active', True) else '0'
+        }
+
+    @staticmethod
+    def _from_hash(data):
+        user = dict(data)
+        user['_id'] = ObjectId(user['_id']) if ObjectId.is_valid(user['_id']) else user['_id']
+        user['is_active'] = user.get('is_active') == '1'
+        return user
+
+    def get_user(self, username):
+        """
+        Profil d'un utilisateur (actif ou non)
+
+        Returns:
+            dict: Profil utilisateur (_id, username, email, role, is_active), sans hachage, ou None
+        """
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                data = redis_client.hgetall(self._key(username))
+                if data.get(self.MISSING):
+                    self._record('negative_hits')
+                    return None
+                if data:
+                    self._record('hits')
+                    return self._from_hash(data)
+            except Exception as e:
+                self._record('errors')
+                print(f"User cache read error (Redis): {e}")
+                redis_client = None
+
+        self._record('misses')
+        users_col = self.users_getter()
+        if users_col is None:
+            return None
+        user = users_col.find_one({'username': username}, {field: 1 for field in self.FIELDS})
+
+        if redis_client is not None:
+            try:
+                key = self._key(username)
+                pipe = redis_client.pipeline()
+                pipe.delete(key)
+                if user:
+                    pipe.hset(key, mapping=self._to_hash(user))
+                    pipe.expire(key, self.ttl)
+                else:
+                    # Évite qu'une rafale d'identifiants inconnus n'atteigne MongoDB
+                    pipe.hset(key, self.MISSING, '1')
+                    pipe.expire(key, self.negative_ttl)
+                pipe.execute()
+            except Exception as e:
+                self._record('errors')
+                print(f"User cache write error (Redis): {e}")
+        return user
+
+    def is_unknown(self, username):
+        """Indique si l'utilisateur est en cache comme inconnu (un seul aller-retour Redis)"""
+        redis_client = self.redis_getter()
+        if redis_client is None:
+            return False
+        try:
+            if redis_client.hget(self._key(username), self.MISSING):
+                self._record('negative_hits')
+                return True
+        except Exception as e:
+            self._record('errors')
+            print(f"User cache read error (Redis): {e}")
+        return False
+
+    def remember_unknown(self, username):
+        """Met en cache un utilisateur inconnu (ou désactivé) pendant negative_ttl"""
+        redis_client = self.redis_getter()
+        if redis_client is None:
+            return
+        try:
+            key = self._key(username)
+            pipe = redis_client.pipeline()
+            pipe.delete(key)
+            pipe.hset(key, self.MISSING, '1')
+            pipe.expire(key, self.negative_ttl)
+            pipe.execute()
+        except Exception as e:
+            self._record('errors')
+            print(f"User cache write error (Redis): {e}")
+
+    def invalidate(self, username):
+        """Retire un profil du cache (à appeler après toute modification de l'utilisateur)"""
+        self._record('invalidations')
+        redis_client = self.redis_getter()
+        if redis_client is None:
+            return
+        try:
+            redis_client.delete(self._key(username))
+        except Exception as e:
+            self._record('errors')
+            print(f"User cache invalidation error (Redis): {e}")
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        lookups = metrics['hits'] + metrics['negative_hits'] + metrics['misses']
+        metrics['hit_ratio'] = round((metrics['hits'] + metrics['negative_hits']) / lookups, 4) if lookups else 0.0
+        metrics['ttl_seconds'] = self.ttl
+        metrics['backend'] = 'redis' if self.redis_getter() is not None else 'none'
+        return metrics
+
+
+class TokenRevocations:
+    """
+    Révocations de tokens : un ZSET (identifiant de token -> expiration) et un ZSET
+    (utilisateur -> date de révocation de tous ses tokens), en mémoire si Redis est indisponible
+    """
+
+    TOKENS_KEY = 'logstream:auth:revoked'
+    USERS_KEY = 'logstream:auth:revoked_users_at'
+
+    def __init__(self, redis_getter, token_ttl=None):
+        """
+        Args:
+            redis_getter (callable): Retourne le client Redis (ou None)
+            token_ttl (int): Durée de vie des tokens (secondes) : une révocation d'utilisateur
+                plus ancienne ne concerne plus aucun token valide
+        """
+        self.redis_getter = redis_getter or (lambda: None)
+        self.token_ttl = token_ttl or int(os.environ.get('JWT_EXPIRATION_HOURS', '24')) * 3600
+        self._local_tokens = {}
+        self._local_users = {}
+        self._lock = threading.Lock()
+        self._metrics = {'checks': 0, 'rejected': 0, 'revoked_tokens': 0, 'revoked_users': 0, 'errors': 0}
+
+    def _record(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    @staticmethod
+    def token_id(token, payload):
+        """Identifiant du token : claim jti, ou empreinte du token pour les anciens tokens"""
+        return payload.get('jti') or hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+
+    def revoke_token(self, token_id, expires_at):
+        """
+        Révoque un token jusqu'à son expiration
+
+        Args:
+            token_id (str): Identifiant du token (voir token_id)
+            expires_at (float): Expiration du token (timestamp)
+        """
+        self._record('revoked_tokens')
+        now = time.time()
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline()
+                pipe.zadd(self.TOKENS_KEY, {token_id: expires_at})
+                # Les tokens expirés n'ont plus besoin d'être révoqués
+                pipe.zremrangebyscore(self.TOKENS_KEY, '-inf', now)
+                pipe.execute()
+                return
+            except Exception as e:
+                self._record('errors')
+                print(f"Token revocation error (Redis): {e}")
+
+        with self._lock:
+            self._local_tokens[token_id] = expires_at
+            for expired in [k for k, v in self._local_tokens.items() if v <= now]:
+                del self._local_tokens[expired]
+
+    def revoke_user(self, username):
+        """Révoque tous les tokens émis jusqu'à maintenant pour un utilisateur"""
+        self._record('revoked_users')
+        revoked_at = time.time()
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline()
+                pipe.zadd(self.USERS_KEY, {username: revoked_at})
+                # Tous les tokens émis avant ces révocations ont expiré
+                pipe.zremrangebyscore(self.USERS_KEY, '-inf', revoked_at - self.token_ttl)
+                pipe.execute()
+                return
+            except Exception as e:
+                self._record('errors')
+                print(f"User revocation error (Redis): {e}")
+
+        with self._lock:
+            self._local_users[username] = revoked_at
+            for expired in [k for k, v in self._local_users.items() if v <= revoked_at - self.token_ttl]:
+                del self._local_users[expired]
+
+    def is_revoked(self, token_id, username=None, issued_at=None):
+        """
+        Indique si un token est révoqué (un seul aller-retour Redis)
+
+        Args:
+            token_id (str): Identifiant du token
+            username (str): Utilisateur du token
+            issued_at (float): Date d'émission (claim iat)
+        """
+        self._record('checks')
+        revoked_at = None
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline()
+                pipe.zscore(self.TOKENS_KEY, token_id)
+                pipe.zscore(self.USERS_KEY, username or '')
+                token_expiry, revoked_at = pipe.execute()
+                if token_expiry is not None:
+                    self._record('rejected')
+                    return True
+            except Exception as e:
+                self._record('errors')
+                print(f"Token revocation check error (Redis): {e}")
+                redis_client = None
+
+        if redis_client is None:
+            with self._lock:
+                if token_id in self._local_tokens:
+                    self._metrics['rejected'] += 1
+                    return True
+                revoked_at = self._local_users.get(username)
+
+        if revoked_at is not None and issued_at is not None and issued_at <= float(revoked_at):
+            self._record('rejected')
+            return True
+        return False
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics['backend'] = 'redis' if self.redis_getter() is not None else 'memory'
+        redis_client = self.redis_getter()
+        if redis_client is not None:
+            try:
+                metrics['revoked_tokens_active'] = redis_client.zcard(self.TOKENS_KEY)
+                metrics['revoked_users_active'] = redis_client.zcard(self.USERS_KEY)
+            except Exception:
+                pass
+        else:
+            metrics['revoked_tokens_active'] = len(self._local_tokens)
+            metrics['revoked_users_active'] = len(self._local_users)
+        return metrics
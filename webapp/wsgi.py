@@ -0,0 +1,8 @@
+"""
+LogStream Studio - Point d'entrée WSGI (production)
+Usage: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import app
+
+application = app